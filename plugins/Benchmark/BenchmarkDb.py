@@ -16,7 +16,10 @@ class ActionsPlugin:
             {"func": self.testDbInsert, "num": 10, "time_standard": 0.91},
             {"func": self.testDbInsertMultiuser, "num": 1, "time_standard": 0.57},
             {"func": self.testDbQueryIndexed, "num": 1000, "time_standard": 0.84},
-            {"func": self.testDbQueryNotIndexed, "num": 1000, "time_standard": 1.30}
+            {"func": self.testDbQueryNotIndexed, "num": 1000, "time_standard": 1.30},
+            {"func": self.testDbOptionalEviction, "kwargs": {"num_files": 100000}, "num": 10, "time_standard": 2.0},
+            {"func": self.testDbOptionalEviction, "kwargs": {"num_files": 1000000}, "num": 1, "time_standard": 14.0},
+            {"func": self.testDbPeerSave, "kwargs": {"num_peers": 10000}, "num": 10, "time_standard": 0.7}
         ])
         return tests
 
@@ -141,3 +144,104 @@ class ActionsPlugin:
                 else:
                     assert found == 100, "%s != 100 (i: %s)" % (found, i)
             yield "Found: %s" % found_total
+
+    def testDbOptionalEviction(self, num_run=1, num_files=100000):
+        from Content.ContentDb import ContentDb
+        if not hasattr(ContentDb, "planOptionalEviction"):
+            yield "(OptionalManager plugin not loaded)"
+            return
+
+        import random
+        s = time.time()
+        path = "%s/benchmark-content.db" % config.data_dir
+        if os.path.isfile(path):
+            os.unlink(path)
+        db = ContentDb(path)
+        db.init()
+        db.timer_check_optional.kill()
+        db.execute("INSERT INTO site ?", {"address": "1BenchmarkSite"})
+        site_id = db.execute("SELECT site_id FROM site").fetchone()[0]
+        rand = random.Random(1234)
+        db.getCursor().executemany(
+            "INSERT INTO file_optional (site_id, inner_path, hash_id, size, peer, uploaded, is_downloaded, is_pinned, time_accessed) " +
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(
+                site_id, "data/users/%s/file.jpg" % i, rand.randint(0, 2 ** 16 - 1), rand.randint(1, 1024 * 1024), rand.randint(0, 30),
+                rand.randint(0, 10 * 1024 * 1024), rand.choice([0, 1]), rand.choice([0, 0, 0, 1]), int(time.time() - rand.randint(0, 60 * 60 * 24 * 30))
+            ) for i in range(num_files)]
+        )
+        db.commit("Benchmark filled")
+        yield "x %s files (Db warmup done in %.3fs) " % (num_files, time.time() - s)
+
+        for i in range(num_run):
+            db.optional_used_bytes = None
+            used_bytes = db.getOptionalUsedBytes()
+            plan = db.planOptionalEviction(used_bytes * 0.1)  # Free up 10%
+            assert sum([row["size"] for row in plan]) >= used_bytes * 0.1
+            yield "."
+        yield "Planned: %s files" % len(plan)
+
+        db.close()
+        os.unlink(path)
+
+    def testDbPeerSave(self, num_run=1, num_peers=10000):
+        from Content.ContentDb import ContentDb
+        if not hasattr(ContentDb, "savePeersChanged"):
+            yield "(PeerDb plugin not loaded)"
+            return
+
+        import random
+        import logging
+        import types
+        from Peer import Peer
+        s = time.time()
+        path = "%s/benchmark-content.db" % config.data_dir
+        if os.path.isfile(path):
+            os.unlink(path)
+        db = ContentDb(path)
+        db.init()
+        if hasattr(db, "timer_check_optional"):
+            db.timer_check_optional.kill()
+        site = types.SimpleNamespace(address="1BenchmarkSite", peers={}, log=logging.getLogger("BenchmarkSite"))
+        db.needSite(site)
+        rand = random.Random(1234)
+
+        def addPeer(i):
+            peer = Peer("10.%s.%s.%s" % (i // 65536 % 256, i // 256 % 256, i % 256), 15441)
+            peer.reputation = rand.randint(-10, 10)
+            for hash_id in rand.sample(range(2 ** 16), 100):
+                peer.hashfield.appendHashId(hash_id)
+            site.peers[peer.key] = peer
+
+        for i in range(num_peers):
+            addPeer(i)
+        db.savePeers(site)
+        db.commit("Benchmark filled")
+        yield "x %s peers (Db warmup done in %.3fs) " % (num_peers, time.time() - s)
+
+        num_written = 0
+        num_changes = num_peers // 100  # 1% of the peers changed since the last save
+        for i in range(num_run):
+            for peer in rand.sample(list(site.peers.values()), num_changes * 2):
+                peer.reputation += 1
+            for peer in rand.sample(list(site.peers.values()), num_changes):
+                peer.hashfield.appendHashId(rand.randint(0, 2 ** 16 - 1))
+            for key in rand.sample(list(site.peers.keys()), num_changes):
+                del site.peers[key]
+            for peer_i in range(num_changes):
+                addPeer(num_peers + i * num_changes + peer_i)
+            num_written += db.savePeers(site)
+            db.commit("Benchmark peers saved")
+            yield "."
+
+        query_rows = "SELECT address, port, hashfield, reputation, time_added, time_found FROM peer ORDER BY address, port"
+        rows = [tuple(row) for row in db.execute(query_rows)]
+        assert len(rows) == len(site.peers)
+        s = time.time()
+        num_written_full = db.savePeers(site, full=True)
+        db.commit("Benchmark peers saved")
+        assert [tuple(row) for row in db.execute(query_rows)] == rows
+        yield "Rows written per save: %s (full rewrite: %s rows in %.3fs)" % (num_written // num_run, num_written_full, time.time() - s)
+
+        db.close()
+        os.unlink(path)
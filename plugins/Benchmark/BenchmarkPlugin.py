@@ -107,6 +107,7 @@ class ActionsPlugin:
             {"func": self.testVerify, "kwargs": {"lib_verify": "sslcrypto_fallback"}, "num": 20, "time_standard": 0.38},
             {"func": self.testVerify, "kwargs": {"lib_verify": "sslcrypto"}, "num": 200, "time_standard": 0.30},
             {"func": self.testVerify, "kwargs": {"lib_verify": "libsecp256k1"}, "num": 200, "time_standard": 0.10},
+            {"func": self.testVerify, "kwargs": {"lib_verify": "sslcrypto", "use_cache": True}, "num": 2000, "time_standard": 0.30},
 
             {"func": self.testPackMsgpack, "num": 100, "time_standard": 0.35},
             {"func": self.testUnpackMsgpackStreaming, "kwargs": {"fallback": False}, "num": 100, "time_standard": 0.35},
@@ -353,9 +354,10 @@ class ActionsPlugin:
             valid = "G1GXaDauZ8vX/N9Jn+MRiGm9h+I94zUhDnNYFaqMGuOiBHB+kp4cRPZOL7l1yqK5BHa6J+W97bMjvTXtxzljp6w="
             assert sign == valid, "%s != %s" % (sign, valid)
 
-    def testVerify(self, num_run=1, lib_verify="sslcrypto"):
+    def testVerify(self, num_run=1, lib_verify="sslcrypto", use_cache=False):
         """
         Test verification of generated signatures
+        With use_cache the same 10 signatures verified repeatedly, like updates received from multiple peers
         """
         from Crypt import CryptBitcoin
         CryptBitcoin.loadLib(lib_verify, silent=True)
@@ -366,12 +368,24 @@ class ActionsPlugin:
         address = CryptBitcoin.privatekeyToAddress(privatekey)
         sign = "G1GXaDauZ8vX/N9Jn+MRiGm9h+I94zUhDnNYFaqMGuOiBHB+kp4cRPZOL7l1yqK5BHa6J+W97bMjvTXtxzljp6w="
 
+        if use_cache:
+            CryptBitcoin.clear_sign_address_cache()
+            signed = []
+            for i in range(10):
+                data_signed = "%s %s" % (data, i)
+                signed.append((data_signed, CryptBitcoin.sign(data_signed, privatekey)))
+        else:
+            signed = [(data, sign)]
+
         for i in range(num_run):
-            ok = CryptBitcoin.verify(data, address, sign, lib_verify=lib_verify)
+            data_signed, sign_signed = signed[i % len(signed)]
+            ok = CryptBitcoin.verify(data_signed, address, sign_signed, lib_verify=lib_verify, use_cache=use_cache)
             yield "."
             assert ok, "does not verify from %s" % address
 
-        if lib_verify == "sslcrypto":
+        if use_cache:
+            yield "(hit rate: %.1f%%)" % (CryptBitcoin.get_sign_address_cache_stats()["hit_rate"] * 100)
+        elif lib_verify == "sslcrypto":
             yield("(%s)" % CryptBitcoin.sslcrypto.ecc.get_backend())
 
     def testPortCheckers(self):
@@ -8,6 +8,8 @@ import warnings
 import base64
 import binascii
 import json
+import mmap
+import weakref
 
 import gevent
 import gevent.lock
@@ -22,8 +24,9 @@ with warnings.catch_warnings():
 from util import helper
 from util import Msgpack
 from util.Flag import flag
+from util import ThreadPool
 import util
-from .BigfilePiecefield import BigfilePiecefield, BigfilePiecefieldPacked
+from .BigfilePiecefield import BigfilePiecefield, BigfilePiecefieldPacked, BigfilePiecefieldBits
 
 
 # We can only import plugin host clases after the plugins are loaded
@@ -36,6 +39,17 @@ def importPluginnedClasses():
 
 if "upload_nonces" not in locals():
     upload_nonces = {}
+if "piecemap_cache" not in locals():
+    piecemap_cache = collections.OrderedDict()  # Key: (sha512, piecemap mtime), Value: piecemap, least recently used first
+piecemap_cache_size = 20
+thread_pool_hash = None  # Created on first use, after the config is parsed
+
+
+def getThreadPoolHash():
+    global thread_pool_hash
+    if not thread_pool_hash:
+        thread_pool_hash = ThreadPool.ThreadPool(config.threads_hash or os.cpu_count() or 1, name="Bigfile hash")
+    return thread_pool_hash
 
 
 @PluginManager.registerTo("UiRequest")
@@ -226,6 +240,10 @@ class UiWebsocketPlugin(object):
         self.site.settings["autodownload_bigfile_size_limit"] = int(limit)
         self.response(to, "ok")
 
+    # Read-ahead state of the currently opened big files of the site
+    def actionBigfileReadaheadStats(self, to):
+        self.response(to, [big_file.getReadAheadStats() for big_file in list(self.site.storage.bigfiles_opened)])
+
     def actionFileDelete(self, to, inner_path):
         piecemap_inner_path = inner_path + ".piecemap.msgpack"
         if self.hasFilePermission(inner_path) and self.site.storage.isFile(piecemap_inner_path):
@@ -320,11 +338,59 @@ class ContentManagerPlugin(object):
             if file_out:
                 file_out.close()
 
+        return self.getMerkleRoot(mt), piece_size, {
+            "sha512_pieces": piece_hashes
+        }
+
+    def getMerkleRoot(self, mt):
         mt.make_tree()
         merkle_root = mt.get_merkle_root()
         if type(merkle_root) is bytes:  # Python <3.5
             merkle_root = merkle_root.decode()
-        return merkle_root, piece_size, {
+        return merkle_root
+
+    # Hash an already stored bigfile: pieces are hashed from the memory-mapped file in
+    # parallel threads (hashlib releases the GIL), the tree is built in piece order
+    # Return: Same as hashBigfile
+    def hashBigfileFile(self, inner_path, size, piece_size=1024 * 1024, pieces_per_job=16):
+        self.site.settings["has_bigfile"] = True
+
+        def hashPieces(mm, pos_from, pos_to):
+            view = memoryview(mm)
+            try:
+                return [
+                    CryptHash.sha512t(view[pos:min(pos + piece_size, pos_to)]).digest()
+                    for pos in range(pos_from, pos_to, piece_size)
+                ]
+            finally:
+                view.release()
+
+        piece_hashes = []
+        with self.site.storage.open(inner_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = min(size, len(mm))
+            job_size = piece_size * pieces_per_job
+            thread_pool = getThreadPoolHash()
+            jobs = []
+            try:
+                for pos in range(0, size, job_size):
+                    jobs.append(thread_pool.spawn(hashPieces, mm, pos, min(pos + job_size, size)))
+                for job in jobs:
+                    piece_hashes += job.get()
+                    if len(piece_hashes) % 100 < pieces_per_job or len(piece_hashes) * piece_size >= size:
+                        recv = min(len(piece_hashes) * piece_size, size)
+                        self.log.info("- [HASHING:%.0f%%] Pieces: %s, %.1fMB/%.1fMB" % (
+                            float(recv) / size * 100, len(piece_hashes), recv / 1024 / 1024, size / 1024 / 1024
+                        ))
+            finally:
+                # The mmap can't be closed while a running job still has a view of it
+                for job in jobs:
+                    job.wait()
+
+        mt = merkletools.MerkleTools()
+        mt.hash_function = CryptHash.sha512t
+        mt.leaves = list(piece_hashes)
+
+        return self.getMerkleRoot(mt), piece_size, {
             "sha512_pieces": piece_hashes
         }
 
@@ -357,7 +423,7 @@ class ContentManagerPlugin(object):
                 return super(ContentManagerPlugin, self).hashFile(dir_inner_path, file_relative_path, optional)
 
             self.log.info("- [HASHING] %s" % file_relative_path)
-            merkle_root, piece_size, piecemap_info = self.hashBigfile(self.site.storage.open(inner_path, "rb").read, file_size)
+            merkle_root, piece_size, piecemap_info = self.hashBigfileFile(inner_path, file_size)
             if not hash:
                 hash = merkle_root
 
@@ -384,8 +450,18 @@ class ContentManagerPlugin(object):
         file_info = self.site.content_manager.getFileInfo(inner_path)
         piecemap_inner_path = helper.getDirname(file_info["content_inner_path"]) + file_info["piecemap"]
         self.site.needFile(piecemap_inner_path, priority=20)
-        piecemap = Msgpack.unpack(self.site.storage.open(piecemap_inner_path, "rb").read())[helper.getFilename(inner_path)]
-        piecemap["piece_size"] = file_info["piece_size"]
+
+        # Parsed piecemaps are cached until the piecemap file changes
+        cache_key = (file_info["sha512"], os.path.getmtime(self.site.storage.getPath(piecemap_inner_path)))
+        piecemap = piecemap_cache.get(cache_key)
+        if piecemap:
+            piecemap_cache.move_to_end(cache_key)
+        else:
+            piecemap = Msgpack.unpack(self.site.storage.open(piecemap_inner_path, "rb").read())[helper.getFilename(inner_path)]
+            piecemap["piece_size"] = file_info["piece_size"]
+            piecemap_cache[cache_key] = piecemap
+            while len(piecemap_cache) > piecemap_cache_size:
+                piecemap_cache.popitem(last=False)
         return piecemap
 
     def verifyPiece(self, inner_path, pos, piece):
@@ -449,7 +525,8 @@ class ContentManagerPlugin(object):
 class SiteStoragePlugin(object):
     def __init__(self, *args, **kwargs):
         super(SiteStoragePlugin, self).__init__(*args, **kwargs)
-        self.piecefields = collections.defaultdict(BigfilePiecefield)
+        self.piecefields = collections.defaultdict(BigfilePiecefieldBits)
+        self.bigfiles_opened = weakref.WeakSet()
         if "piecefields" in self.site.settings.get("cache", {}):
             for sha512, piecefield_packed in self.site.settings["cache"].get("piecefields").items():
                 if piecefield_packed:
@@ -527,10 +604,14 @@ class SiteStoragePlugin(object):
         if not self.checkBigfile(inner_path):
             return False
         self.site.needFile(inner_path, blocking=False)  # Download piecemap
-        return BigFile(self.site, inner_path, prebuffer=prebuffer)
+        big_file = BigFile(self.site, inner_path, prebuffer=prebuffer)
+        self.bigfiles_opened.add(big_file)
+        return big_file
 
 
 class BigFile(object):
+    readahead_max = 64 * 1024 * 1024  # Never request more than this ahead of the read position
+
     def __init__(self, site, inner_path, prebuffer=0):
         self.site = site
         self.inner_path = inner_path
@@ -539,13 +620,31 @@ class BigFile(object):
         self.piece_size = file_info["piece_size"]
         self.sha512 = file_info["sha512"]
         self.size = file_info["size"]
-        self.prebuffer = prebuffer
+        self.prebuffer = prebuffer  # Minimum read-ahead size, 0: no read-ahead
         self.read_bytes = 0
 
+        # Read-ahead scheduling
+        self.read_pos = 0  # End of the last read
+        self.read_started = None  # Time of the first read after open or seek
+        self.read_bytes_since_seek = 0
+        self.read_rate = 0.0  # Bytes/sec of sequential reading
+        self.seeks = 0
+        self.readahead_tasks = {}  # Pieces requested ahead of the read position: {piece inner path: piece_i}
+
         self.piecefield = self.site.storage.piecefields[self.sha512]
         self.f = open(file_path, "rb+")
         self.read_lock = gevent.lock.Semaphore()
 
+    def getPieceInnerPath(self, piece_i):
+        pos_from = piece_i * self.piece_size
+        return "%s|%s-%s" % (self.inner_path, pos_from, pos_from + self.piece_size)
+
+    # Keep the read rate * readahead time buffered ahead of the read position
+    def getReadAheadSize(self):
+        if not self.prebuffer:
+            return 0
+        return int(min(max(self.prebuffer, self.read_rate * config.bigfile_readahead_time), self.readahead_max))
+
     def read(self, buff=64 * 1024):
         with self.read_lock:
             pos = self.f.tell()
@@ -556,46 +655,107 @@ class BigFile(object):
                 piece_i = int(pos / self.piece_size)
                 if piece_i * self.piece_size >= read_until:
                     break
-                pos_from = piece_i * self.piece_size
-                pos_to = pos_from + self.piece_size
                 if not self.piecefield[piece_i]:
-                    requests.append(self.site.needFile("%s|%s-%s" % (self.inner_path, pos_from, pos_to), blocking=False, update=True, priority=10))
+                    requests.append(self.site.needFile(self.getPieceInnerPath(piece_i), blocking=False, update=True, priority=10))
                 pos += self.piece_size
 
             if not all(requests):
                 return None
 
-            # Request prebuffer
-            if self.prebuffer:
-                prebuffer_until = min(self.size, read_until + self.prebuffer)
+            # Request read-ahead
+            self.pruneReadAheadTasks(read_until)
+            readahead_size = self.getReadAheadSize()
+            if readahead_size:
+                readahead_until = min(self.size, read_until + readahead_size)
                 priority = 3
                 while 1:
                     piece_i = int(pos / self.piece_size)
-                    if piece_i * self.piece_size >= prebuffer_until:
+                    if piece_i * self.piece_size >= readahead_until:
                         break
-                    pos_from = piece_i * self.piece_size
-                    pos_to = pos_from + self.piece_size
                     if not self.piecefield[piece_i]:
-                        self.site.needFile("%s|%s-%s" % (self.inner_path, pos_from, pos_to), blocking=False, update=True, priority=max(0, priority))
+                        piece_inner_path = self.getPieceInnerPath(piece_i)
+                        self.site.needFile(piece_inner_path, blocking=False, update=True, priority=max(0, priority))
+                        self.readahead_tasks[piece_inner_path] = piece_i
                     priority -= 1
                     pos += self.piece_size
 
+            if self.read_started is None:
+                self.read_started = time.time()
             gevent.joinall(requests)
-            self.read_bytes += buff
 
-            # Increase buffer for long reads
-            if self.read_bytes > 7 * 1024 * 1024 and self.prebuffer < 5 * 1024 * 1024:
-                self.site.log.debug("%s: Increasing bigfile buffer size to 5MB..." % self.inner_path)
-                self.prebuffer = 5 * 1024 * 1024
+            data = self.f.read(buff)
+            self.read_bytes += buff
+            self.read_bytes_since_seek += len(data)
+            self.read_pos = self.f.tell()
+            read_time = time.time() - self.read_started
+            if read_time > 1:
+                self.read_rate = self.read_bytes_since_seek / read_time
+
+            return data
+
+    # Lower the priority of read-ahead pieces that are not around the new read position
+    def onSeek(self, pos):
+        self.seeks += 1
+        self.read_started = None
+        self.read_bytes_since_seek = 0
+
+        readahead_until = pos + self.piece_size + self.getReadAheadSize()
+        stale_tasks = []
+        for piece_inner_path, piece_i in self.readahead_tasks.items():
+            pos_from = piece_i * self.piece_size
+            if pos_from + self.piece_size <= pos or pos_from >= readahead_until:
+                stale_tasks.append(piece_inner_path)
+
+        num_deprioritized = 0
+        for piece_inner_path in stale_tasks:
+            del self.readahead_tasks[piece_inner_path]
+            if self.site.worker_manager.deprioritizeTask(piece_inner_path):
+                num_deprioritized += 1
+
+        if num_deprioritized:
+            self.site.log.debug("%s: Seek to %s, deprioritized %s read-ahead pieces" % (self.inner_path, pos, num_deprioritized))
+
+    # Forget the read-ahead pieces that are downloaded or already read past
+    def pruneReadAheadTasks(self, read_until):
+        for piece_inner_path, piece_i in list(self.readahead_tasks.items()):
+            if self.piecefield[piece_i] or (piece_i + 1) * self.piece_size <= read_until:
+                del self.readahead_tasks[piece_inner_path]
+
+    def getReadAheadStats(self):
+        # Downloaded bytes after the read position
+        buffered = 0
+        piece_i = int(self.read_pos / self.piece_size)
+        while piece_i * self.piece_size < self.size and self.piecefield[piece_i] and buffered < self.readahead_max:
+            buffered = min(self.size, (piece_i + 1) * self.piece_size) - self.read_pos
+            piece_i += 1
+
+        if self.read_rate:
+            buffered_time = buffered / self.read_rate
+        else:
+            buffered_time = None
 
-            return self.f.read(buff)
+        return {
+            "inner_path": self.inner_path,
+            "pos": self.read_pos,
+            "size": self.size,
+            "read_rate": self.read_rate,
+            "readahead_size": self.getReadAheadSize(),
+            "buffered": buffered,
+            "buffered_time": buffered_time,
+            "seeks": self.seeks,
+            "readahead_tasks": len(self.readahead_tasks)
+        }
 
     def seek(self, pos, whence=0):
         with self.read_lock:
             if whence == 2:  # Relative from file end
                 pos = self.size + pos  # Use the real size instead of size on the disk
                 whence = 0
-            return self.f.seek(pos, whence)
+            back = self.f.seek(pos, whence)
+            pos = self.f.tell()
+            if abs(pos - self.read_pos) > self.piece_size:
+                self.onSeek(pos)
+            return back
 
     def seekable(self):
         return self.f.seekable()
@@ -605,6 +765,7 @@ class BigFile(object):
 
     def close(self):
         self.f.close()
+        self.site.storage.bigfiles_opened.discard(self)
 
     def __enter__(self):
         return self
@@ -615,6 +776,15 @@ class BigFile(object):
 
 @PluginManager.registerTo("WorkerManager")
 class WorkerManagerPlugin(object):
+    # Lower the priority of a not yet started task
+    # Return: True if the priority changed
+    def deprioritizeTask(self, inner_path, priority=-10):
+        task = self.tasks.findTask(inner_path)
+        if not task or task["workers_num"] or task["priority"] <= priority:
+            return False
+        self.tasks.updateItem(task, "priority", priority)
+        return True
+
     def addTask(self, inner_path, *args, **kwargs):
         file_info = kwargs.get("file_info")
         if file_info and "piecemap" in file_info:  # Bigfile
@@ -839,5 +1009,7 @@ class ConfigPlugin(object):
         group = self.parser.add_argument_group("Bigfile plugin")
         group.add_argument('--autodownload-bigfile-size-limit', help='Also download bigfiles smaller than this limit if help distribute option is checked', default=10, metavar="MB", type=int)
         group.add_argument('--bigfile-size-limit', help='Maximum size of downloaded big files', default=False, metavar="MB", type=int)
+        group.add_argument('--bigfile-readahead-time', help='Keep this many seconds of streamed big files downloaded ahead of the read position', default=10, metavar="seconds", type=int)
+        group.add_argument('--threads-hash', help='Number of threads for hashing stored big files (0: number of cpu cores)', default=0, metavar="threads", type=int)
 
         return super(ConfigPlugin, self).createArguments()
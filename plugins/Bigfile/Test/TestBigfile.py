@@ -11,7 +11,7 @@ from File import FileServer
 from File import FileRequest
 from Worker import WorkerManager
 from Peer import Peer
-from Bigfile import BigfilePiecefield, BigfilePiecefieldPacked
+from Bigfile import BigfilePiecefield, BigfilePiecefieldPacked, BigfilePiecefieldBits
 from Test import Spy
 from util import Msgpack
 
@@ -44,6 +44,17 @@ class TestBigfile:
         assert piecemap["sha512_pieces"][0] != piecemap["sha512_pieces"][1]
         assert binascii.hexlify(piecemap["sha512_pieces"][0]) == b"a73abad9992b3d0b672d0c2a292046695d31bebdcb1e150c8410bbe7c972eff3"
 
+    def testHashBigfileFile(self, site):
+        inner_path = self.createBigfile(site)
+        file_size = site.storage.getSize(inner_path)
+
+        with site.storage.open(inner_path, "rb") as f:
+            hash_stream = site.content_manager.hashBigfile(f.read, file_size)
+
+        # Same result as the streaming hashing independent of the job size
+        assert site.content_manager.hashBigfileFile(inner_path, file_size) == hash_stream
+        assert site.content_manager.hashBigfileFile(inner_path, file_size, pieces_per_job=3) == hash_stream
+
     def testVerifyPiece(self, site):
         inner_path = self.createBigfile(site)
 
@@ -218,7 +229,7 @@ class TestBigfile:
             data = f.read(1024 * 1024 * 30)
             assert len(data) == 0
 
-    @pytest.mark.parametrize("piecefield_obj", [BigfilePiecefield, BigfilePiecefieldPacked])
+    @pytest.mark.parametrize("piecefield_obj", [BigfilePiecefield, BigfilePiecefieldPacked, BigfilePiecefieldBits])
     def testPiecefield(self, piecefield_obj, site):
         testdatas = [
             b"\x01" * 100 + b"\x00" * 900 + b"\x01" * 4000 + b"\x00" * 4999 + b"\x01",
@@ -440,6 +451,49 @@ class TestBigfile:
 
             assert len([task for task in site_temp.worker_manager.tasks if task["inner_path"].startswith(inner_path)]) == 0
 
+    def testReadAhead(self, file_server, site, site_temp):
+        inner_path = self.createBigfile(site)
+
+        # Init source server
+        site.connection_server = file_server
+        file_server.sites[site.address] = site
+
+        # Init client server
+        client = ConnectionServer(file_server.ip, 1545)
+        site_temp.connection_server = client
+        site_temp.addPeer(file_server.ip, 1544)
+
+        # Download site
+        site_temp.download(blind_includes=True, retry_bad_files=False).join(timeout=10)
+
+        with site_temp.storage.openBigfile(inner_path, prebuffer=1024 * 1024 * 2) as f:
+            assert list(site_temp.storage.bigfiles_opened) == [f]
+
+            f.seek(5 * 1024 * 1024)
+            assert f.read(7) == b"Test524"
+            time.sleep(0.5)  # Wait read-ahead download
+
+            stats = f.getReadAheadStats()
+            assert stats["seeks"] == 1
+            assert stats["readahead_size"] == 2 * 1024 * 1024
+            assert stats["buffered"] == 3 * 1024 * 1024 - 7  # Piece 5 after the read position, 6 and 7 read-ahead
+            assert stats["readahead_tasks"] == 2
+
+            # Downloaded read-ahead pieces are forgotten on the next read
+            assert f.read(7) == b"---Test"
+            assert not f.readahead_tasks
+
+            # Not yet started read-ahead pieces lose their priority after seeking away
+            task = {"inner_path": f.getPieceInnerPath(8), "priority": 3, "workers_num": 0}
+            with mock.patch.object(site_temp.worker_manager.tasks, "findTask", return_value=task):
+                with mock.patch.object(site_temp.worker_manager.tasks, "updateItem") as update_item:
+                    f.readahead_tasks[task["inner_path"]] = 8
+                    f.seek(0)
+                    assert update_item.call_args == mock.call(task, "priority", -10)
+            assert not f.readahead_tasks
+
+        assert not list(site_temp.storage.bigfiles_opened)
+
     def testDownloadAllPieces(self, file_server, site, site_temp):
         inner_path = self.createBigfile(site)
 
@@ -1,2 +1,2 @@
 from . import BigfilePlugin
-from .BigfilePiecefield import BigfilePiecefield, BigfilePiecefieldPacked
\ No newline at end of file
+from .BigfilePiecefield import BigfilePiecefield, BigfilePiecefieldPacked, BigfilePiecefieldBits
\ No newline at end of file
@@ -1,7 +1,6 @@
 import time
 import sys
 import collections
-import itertools
 import logging
 
 import gevent
@@ -34,12 +33,8 @@ class ChartCollector(object):
 
         # Connection stats
         collectors["connection"] = lambda: len(file_server.connections)
-        collectors["connection_in"] = (
-            lambda: len([1 for connection in file_server.connections if connection.type == "in"])
-        )
-        collectors["connection_onion"] = (
-            lambda: len([1 for connection in file_server.connections if connection.ip.endswith(".onion")])
-        )
+        collectors["connection_in"] = lambda: file_server.num_connections_in
+        collectors["connection_onion"] = lambda: file_server.num_connections_onion
         collectors["connection_ping_avg"] = (
             lambda: round(1000 * helper.avg(
                 [connection.last_ping_delay for connection in file_server.connections if connection.last_ping_delay]
@@ -68,8 +63,8 @@ class ChartCollector(object):
         collectors["optional_downloaded"] = lambda: sum([site.settings.get("optional_downloaded", 0) for site in sites.values()])
 
         # Peers
-        collectors["peer"] = lambda peers: len(peers)
-        collectors["peer_onion"] = lambda peers: len([True for peer in peers if ".onion" in peer])
+        collectors["peer"] = lambda: len(file_server.site_manager.peer_keys)
+        collectors["peer_onion"] = lambda: file_server.site_manager.num_peers_onion
 
         # Size
         collectors["size"] = lambda: sum([site.settings.get("size", 0) for site in sites.values()])
@@ -93,30 +88,17 @@ class ChartCollector(object):
 
         # Peers
         site_collectors["site_peer"] = lambda site: len(site.peers)
-        site_collectors["site_peer_onion"] = lambda site: len(
-            [True for peer in site.peers.values() if peer.ip.endswith(".onion")]
-        )
-        site_collectors["site_peer_connected"] = lambda site: len([True for peer in site.peers.values() if peer.connection])
+        site_collectors["site_peer_onion"] = lambda site: site.peers_onion
+        site_collectors["site_peer_connected"] = lambda site: site.peers_connected
 
         return site_collectors
 
-    def getUniquePeers(self):
-        import main
-        sites = main.file_server.sites
-        return set(itertools.chain.from_iterable(
-            [site.peers.keys() for site in sites.values()]
-        ))
-
     def collectDatas(self, collectors, last_values, site=None):
-        if site is None:
-            peers = self.getUniquePeers()
         datas = {}
         for key, collector in collectors.items():
             try:
                 if site:
                     value = collector(site)
-                elif key.startswith("peer"):
-                    value = collector(peers)
                 else:
                     value = collector()
             except ValueError:
@@ -143,12 +125,11 @@ class ChartCollector(object):
         datas = self.collectDatas(collectors, last_values["global"])
         values = []
         for key, value in datas.items():
-            values.append((self.db.getTypeId(key), value, now))
+            values.append((self.db.getTypeId(key), None, value, now))
         self.log.debug("Global collectors done in %.3fs" % (time.time() - s))
 
         s = time.time()
-        cur = self.db.getCursor()
-        cur.executemany("INSERT INTO data (type_id, value, date_added) VALUES (?, ?, ?)", values)
+        self.db.insertData(values)
         self.log.debug("Global collectors inserted in %.3fs" % (time.time() - s))
 
     def collectSites(self, sites, collectors, last_values):
@@ -163,8 +144,7 @@ class ChartCollector(object):
         self.log.debug("Site collections done in %.3fs" % (time.time() - s))
 
         s = time.time()
-        cur = self.db.getCursor()
-        cur.executemany("INSERT INTO data (type_id, site_id, value, date_added) VALUES (?, ?, ?, ?)", values)
+        self.db.insertData(values)
         self.log.debug("Site collectors inserted in %.3fs" % (time.time() - s))
 
     def collector(self):
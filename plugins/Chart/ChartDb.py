@@ -1,14 +1,24 @@
 from Config import config
 from Db.Db import Db
 import time
+import sqlite3
 
 
 class ChartDb(Db):
+    # Rollup tiers: {name: (bucket size in sec, retention in sec)}
+    tiers = {
+        "hourly": (60 * 60, 60 * 60 * 24 * 30 * 6),
+        "daily": (60 * 60 * 24, 60 * 60 * 24 * 365 * 5)
+    }
+    raw_archive_after = 60 * 60 * 24 * 7  # Raw global data replaced by hourly sums after a week
+
     def __init__(self):
         self.version = 2
         super(ChartDb, self).__init__(self.getSchema(), config.start_dir / 'chart.db')
         self.foreign_keys = True
-        self.checkTables()
+        changed_tables = self.checkTables()
+        if "data_hourly" in changed_tables or "data_daily" in changed_tables:
+            self.fillTiers()
         self.sites = self.loadSites()
         self.types = self.loadTypes()
 
@@ -30,6 +40,24 @@ class ChartDb(Db):
             ],
             "schema_changed": 2
         }
+        # Pre-aggregated data, updated on insert. site_id is 0 for global data
+        for tier_name in self.tiers:
+            schema["tables"]["data_%s" % tier_name] = {
+                "cols": [
+                    ["type_id", "INTEGER NOT NULL"],
+                    ["site_id", "INTEGER NOT NULL"],
+                    ["date_added", "INTEGER NOT NULL"],
+                    ["value", "INTEGER"],
+                    ["value_min", "INTEGER"],
+                    ["value_max", "INTEGER"],
+                    ["num", "INTEGER"]
+                ],
+                "indexes": [
+                    "CREATE UNIQUE INDEX data_%s_key ON data_%s (type_id, site_id, date_added)" % (tier_name, tier_name),
+                    "CREATE INDEX data_%s_date_added ON data_%s (date_added)" % (tier_name, tier_name)
+                ],
+                "schema_changed": 1
+            }
         schema["tables"]["type"] = {
             "cols": [
                 ["type_id", "INTEGER PRIMARY KEY NOT NULL UNIQUE"],
@@ -78,47 +106,143 @@ class ChartDb(Db):
             del self.sites[address]
             self.execute("DELETE FROM site WHERE ?", {"site_id": site_id})
             self.execute("DELETE FROM data WHERE ?", {"site_id": site_id})
+            for tier_name in self.tiers:
+                self.execute("DELETE FROM data_%s WHERE ?" % tier_name, {"site_id": site_id})
 
-    def archive(self):
-        week_back = 1
-        while 1:
-            s = time.time()
-            date_added_from = time.time() - 60 * 60 * 24 * 7 * (week_back + 1)
-            date_added_to = date_added_from + 60 * 60 * 24 * 7
-            res = self.execute("""
+    # Add data rows and update the rollup tiers
+    # values: [(type_id, site_id or None, value, date_added), ...]
+    def insertData(self, values):
+        cur = self.getCursor()
+        cur.executemany("INSERT INTO data (type_id, site_id, value, date_added) VALUES (?, ?, ?, ?)", values)
+        values = [(type_id, site_id or 0, value, date_added) for type_id, site_id, value, date_added in values if value is not None]
+        for tier_name, (bucket_size, retention) in self.tiers.items():
+            rows = [
+                (type_id, site_id, date_added - date_added % bucket_size, value, value, value)
+                for type_id, site_id, value, date_added in values
+            ]
+            if sqlite3.sqlite_version_info >= (3, 24, 0):
+                cur.executemany(
+                    "INSERT INTO data_%s (type_id, site_id, date_added, value, value_min, value_max, num) VALUES (?, ?, ?, ?, ?, ?, 1) " % tier_name +
+                    "ON CONFLICT (type_id, site_id, date_added) DO UPDATE SET " +
+                    "value = value + excluded.value, value_min = MIN(value_min, excluded.value_min), " +
+                    "value_max = MAX(value_max, excluded.value_max), num = num + 1",
+                    rows
+                )
+            else:  # No upsert support in sqlite < 3.24
+                for type_id, site_id, date_added, value, value_min, value_max in rows:
+                    res = cur.execute(
+                        "UPDATE data_%s SET value = value + ?, value_min = MIN(value_min, ?), value_max = MAX(value_max, ?), num = num + 1 " % tier_name +
+                        "WHERE type_id = ? AND site_id = ? AND date_added = ?",
+                        (value, value_min, value_max, type_id, site_id, date_added)
+                    )
+                    if res.rowcount == 0:
+                        cur.execute(
+                            "INSERT INTO data_%s (type_id, site_id, date_added, value, value_min, value_max, num) VALUES (?, ?, ?, ?, ?, ?, 1)" % tier_name,
+                            (type_id, site_id, date_added, value, value_min, value_max)
+                        )
+
+    # Build the rollup tiers from the existing data rows
+    def fillTiers(self):
+        s = time.time()
+        for tier_name, (bucket_size, retention) in self.tiers.items():
+            self.execute("DELETE FROM data_%s" % tier_name)
+            self.execute("""
+                INSERT INTO data_%s (type_id, site_id, date_added, value, value_min, value_max, num)
                 SELECT
-                 MAX(date_added) AS date_added,
-                 SUM(value) AS value,
-                 GROUP_CONCAT(data_id) AS data_ids,
-                 type_id,
-                 site_id,
-                 COUNT(*) AS num
+                 type_id, IFNULL(site_id, 0), date_added - date_added %% :bucket_size AS bucket,
+                 SUM(value), MIN(value), MAX(value), COUNT(value)
                 FROM data
-                WHERE
-                 site_id IS NULL AND
-                 date_added > :date_added_from AND
-                 date_added < :date_added_to
-                GROUP BY strftime('%Y-%m-%d %H', date_added, 'unixepoch', 'localtime'), type_id
-            """, {"date_added_from": date_added_from, "date_added_to": date_added_to})
-
-            num_archived = 0
-            cur = self.getCursor()
-            for row in res:
-                if row["num"] == 1:
-                    continue
-                cur.execute("INSERT INTO data ?", {
-                    "type_id": row["type_id"],
-                    "site_id": row["site_id"],
-                    "value": row["value"],
-                    "date_added": row["date_added"]
-                })
-                cur.execute("DELETE FROM data WHERE data_id IN (%s)" % row["data_ids"])
-                num_archived += row["num"]
-            self.log.debug("Archived %s data from %s weeks ago in %.3fs" % (num_archived, week_back, time.time() - s))
-            week_back += 1
-            time.sleep(0.1)
-            if num_archived == 0:
-                break
+                WHERE value IS NOT NULL AND typeof(date_added) = 'integer'
+                GROUP BY type_id, IFNULL(site_id, 0), bucket
+            """ % tier_name, {"bucket_size": bucket_size})
+        # Data before this is already archived in the raw table
+        self.setArchivedUntil(self.getArchiveLimit())
+        self.log.debug("Filled rollup tiers in %.3fs" % (time.time() - s))
+
+    def getArchiveLimit(self):
+        now = int(time.time())
+        return now - self.raw_archive_after - now % self.tiers["hourly"][0]
+
+    def getArchivedUntil(self):
+        row = self.execute("SELECT value FROM keyvalue WHERE json_id = 0 AND key = 'data.archived_until'").fetchone()
+        if row:
+            return row["value"]
+        else:
+            return None
+
+    def setArchivedUntil(self, date_added):
+        self.execute(
+            "INSERT OR REPLACE INTO keyvalue ?",
+            {"json_id": 0, "key": "data.archived_until", "value": date_added}
+        )
+
+    # Return: Data of the types from the best matching tier {type name: [{date_added, value, value_min, value_max, num}, ...]}
+    def getData(self, type_names, site_address=None, date_added_from=None, date_added_to=None, tier="auto"):
+        now = int(time.time())
+        if date_added_to is None:
+            date_added_to = now
+        if date_added_from is None:
+            date_added_from = date_added_to - 60 * 60 * 24 * 7
+        if tier == "auto":
+            if date_added_from >= now - 60 * 60 * 24 * 2:
+                tier = "raw"
+            elif date_added_to - date_added_from <= 60 * 60 * 24 * 60:
+                tier = "hourly"
+            else:
+                tier = "daily"
+        if tier != "raw" and tier not in self.tiers:
+            raise Exception("Invalid tier: %s" % tier)
+
+        type_ids = {self.types[type_name]: type_name for type_name in type_names if type_name in self.types}
+        back = {type_name: [] for type_name in type_names}
+        if site_address:
+            site_id = self.sites.get(site_address)
+            if not site_id:
+                return back
+        else:
+            site_id = None
+
+        if not type_ids:
+            return back
+
+        wheres = "type_id IN (%s) AND date_added >= ? AND date_added <= ?" % ",".join(["?"] * len(type_ids))
+        params = list(type_ids.keys()) + [date_added_from, date_added_to]
+        if tier == "raw":
+            query = "SELECT type_id, date_added, value, value AS value_min, value AS value_max, 1 AS num FROM data WHERE "
+            if site_id:
+                query += "site_id = ? AND " + wheres
+                params = [site_id] + params
+            else:
+                query += "site_id IS NULL AND " + wheres
+        else:
+            query = "SELECT type_id, date_added, value, value_min, value_max, num FROM data_%s WHERE site_id = ? AND " % tier + wheres
+            params = [site_id or 0] + params
+
+        for row in self.execute(query + " ORDER BY date_added", params):
+            row = dict(row)
+            back[type_ids[row.pop("type_id")]].append(row)
+        return back
+
+    def archive(self):
+        s = time.time()
+        # Replace the raw global data older than a week with hourly sums from the rollup tier
+        archived_until = self.getArchivedUntil()
+        archive_limit = self.getArchiveLimit()
+        num_archived = 0
+        if archived_until is not None and archived_until < archive_limit:
+            res = self.execute(
+                "DELETE FROM data WHERE site_id IS NULL AND date_added >= :date_added_from AND date_added < :date_added_to",
+                {"date_added_from": archived_until, "date_added_to": archive_limit}
+            )
+            num_archived = res.rowcount
+            self.execute(
+                "INSERT INTO data (type_id, site_id, value, date_added) " +
+                "SELECT type_id, NULL, value, date_added FROM data_hourly " +
+                "WHERE site_id = 0 AND date_added >= :date_added_from AND date_added < :date_added_to",
+                {"date_added_from": archived_until, "date_added_to": archive_limit}
+            )
+        self.setArchivedUntil(archive_limit)
+
         # Only keep 6 month of global stats
         self.execute(
             "DELETE FROM data WHERE site_id IS NULL AND date_added < :date_added_limit",
@@ -129,5 +253,11 @@ class ChartDb(Db):
             "DELETE FROM data WHERE site_id IS NOT NULL AND date_added < :date_added_limit",
             {"date_added_limit": time.time() - 60 * 60 * 24 * 30 }
         )
-        if week_back > 1:
-            self.execute("VACUUM")
+        # Fixed retention of the rollup tiers
+        for tier_name, (bucket_size, retention) in self.tiers.items():
+            self.execute(
+                "DELETE FROM data_%s WHERE date_added < :date_added_limit" % tier_name,
+                {"date_added_limit": time.time() - retention}
+            )
+        self.commit("Archived")
+        self.log.debug("Archived %s data in %.3fs" % (num_archived, time.time() - s))
@@ -48,6 +48,15 @@ class UiWebsocketPlugin(object):
             self.log.debug("Slow query: %s (%.3fs)" % (query, time.time() - s))
         return rows
 
+    # Get pre-aggregated data of the types, tier: raw, hourly, daily or auto to pick by the time range
+    @flag.admin
+    def actionChartGetData(self, to, type_names, site_address=None, date_added_from=None, date_added_to=None, tier="auto"):
+        try:
+            return db.getData(type_names, site_address, date_added_from, date_added_to, tier)
+        except Exception as err:
+            self.log.error("ChartGetData error: %s" % err)
+            return {"error": str(err)}
+
     @flag.admin
     def actionChartGetPeerLocations(self, to):
         peers = {}
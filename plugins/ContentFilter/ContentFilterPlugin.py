@@ -212,10 +212,67 @@ class SiteStoragePlugin(object):
     def onUpdated(self, inner_path, file=None):
         file_path = f'{self.site.address}/{inner_path}'
         if file_path in filter_storage.file_content['includes']:
-            self.log.debug('Filter file updated: {inner_path}')
-            filter_storage.includeUpdateAll()
+            self.log.debug(f'Filter file updated: {inner_path}')
+            filter_storage.includeUpdate(file_path)
         return super(SiteStoragePlugin, self).onUpdated(inner_path, file=file)
 
+@PluginManager.registerTo("ContentDb")
+class ContentDbPlugin(object):
+    def getSchema(self):
+        schema = super(ContentDbPlugin, self).getSchema()
+
+        # User directories of content.json files to find an user's content without scanning every path
+        schema["tables"]["content_auth"] = {
+            "cols": [
+                ["content_id", "INTEGER REFERENCES content (content_id) ON DELETE CASCADE"],
+                ["auth_address", "TEXT NOT NULL"]
+            ],
+            "indexes": [
+                "CREATE UNIQUE INDEX content_auth_key ON content_auth (content_id, auth_address)",
+                "CREATE INDEX content_auth_address ON content_auth (auth_address)"
+            ],
+            "schema_changed": 1
+        }
+
+        return schema
+
+    def checkTables(self):
+        changed_tables = super(ContentDbPlugin, self).checkTables()
+        if "content_auth" in changed_tables:
+            self.fillTableContentAuth()
+        return changed_tables
+
+    def fillTableContentAuth(self):
+        rows = []
+        for row in self.execute("SELECT content_id, inner_path FROM content"):
+            for auth_address in set(re.findall("/(1[A-Za-z0-9]{26,35})/", row["inner_path"])):
+                rows.append((row["content_id"], auth_address))
+        self.getCursor().executemany("INSERT OR IGNORE INTO content_auth (content_id, auth_address) VALUES (?, ?)", rows)
+        self.log.debug("Filled content_auth table with %s rows" % len(rows))
+
+    def setContent(self, site, inner_path, content, size=0):
+        super(ContentDbPlugin, self).setContent(site, inner_path, content, size)
+        auth_addresses = set(re.findall("/(1[A-Za-z0-9]{26,35})/", inner_path))
+        if auth_addresses:
+            content_id = self.execute(
+                "SELECT content_id FROM content WHERE ?",
+                {"site_id": self.site_ids.get(site.address, 0), "inner_path": inner_path}
+            ).fetchone()["content_id"]
+            self.getCursor().executemany(
+                "INSERT OR IGNORE INTO content_auth (content_id, auth_address) VALUES (?, ?)",
+                [(content_id, auth_address) for auth_address in auth_addresses]
+            )
+
+    # Return: (site address, content.json inner path) of every content.json under the user's directories
+    def getUserContents(self, auth_address):
+        res = self.execute(
+            "SELECT address, inner_path FROM content_auth " +
+            "JOIN content USING (content_id) JOIN site USING (site_id) WHERE auth_address = :auth_address",
+            {"auth_address": auth_address}
+        )
+        return [(row["address"], row["inner_path"]) for row in res]
+
+
 @PluginManager.registerTo("Site")
 class SitePlugin(object):
     def needFile(self, inner_path, update=False, blocking=True, peer=None, priority=0):
@@ -31,7 +31,8 @@ class ContentFilterStorage(object):
             if key not in self.file_content:
                 self.file_content[key] = {}
 
-        self.include_filters = collections.defaultdict(set)  # Merged list of mutes and blacklists from all include
+        self.include_contents = {}  # Loaded include files {"address/inner_path": {"mutes": {...}, "siteblocks": {...}}}
+        self.include_filters = collections.defaultdict(collections.Counter)  # Merged list of mutes and blacklists from all include with number of includes
         self.includeUpdateAll(update_site_dbs=False)
 
     def load(self):
@@ -48,40 +49,69 @@ class ContentFilterStorage(object):
         else:
             return None
 
+    def loadInclude(self, include_path):
+        address, inner_path = include_path.split("/", 1)
+        try:
+            content = self.site_manager.get(address).storage.loadJson(inner_path)
+        except Exception as err:
+            self.log.warning(
+                "Error loading include %s: %s" %
+                (include_path, Debug.formatException(err))
+            )
+            return None
+        return {key: val for key, val in content.items() if type(val) is dict}
+
+    # Replace the filters of an include file with a new content
+    # Return: Mutes added and removed from the merged filters
+    def includeSetContent(self, include_path, content):
+        content_before = self.include_contents.pop(include_path, {})
+        if content is not None:
+            self.include_contents[include_path] = content
+
+        mutes_added = set()
+        mutes_removed = set()
+        for key in set(content_before.keys()) | set((content or {}).keys()):
+            keys_before = set(content_before.get(key, {}).keys())
+            keys_after = set((content or {}).get(key, {}).keys())
+            counter = self.include_filters[key]
+            for val in keys_after - keys_before:
+                counter[val] += 1
+                if counter[val] == 1 and key == "mutes":
+                    mutes_added.add(val)
+            for val in keys_before - keys_after:
+                counter[val] -= 1
+                if counter[val] <= 0:
+                    del counter[val]
+                    if key == "mutes":
+                        mutes_removed.add(val)
+        return mutes_added, mutes_removed
+
+    def includeChangeDbs(self, mutes_added, mutes_removed):
+        for auth_address in mutes_added:
+            if auth_address not in self.file_content["mutes"]:  # Already removed if muted locally
+                self.changeDbs(auth_address, "remove")
+
+        for auth_address in mutes_removed:
+            if not self.isMuted(auth_address):
+                self.changeDbs(auth_address, "load")
+
     def includeUpdateAll(self, update_site_dbs=True):
         s = time.time()
-        new_include_filters = collections.defaultdict(set)
+        mutes_added = set()
+        mutes_removed = set()
 
         # Load all include files data into a merged set
-        for include_path in self.file_content["includes"]:
-            address, inner_path = include_path.split("/", 1)
-            try:
-                content = self.site_manager.get(address).storage.loadJson(inner_path)
-            except Exception as err:
-                self.log.warning(
-                    "Error loading include %s: %s" %
-                    (include_path, Debug.formatException(err))
-                )
-                continue
-
-            for key, val in content.items():
-                if type(val) is not dict:
-                    continue
-
-                new_include_filters[key].update(val.keys())
-
-        mutes_added = new_include_filters["mutes"].difference(self.include_filters["mutes"])
-        mutes_removed = self.include_filters["mutes"].difference(new_include_filters["mutes"])
-
-        self.include_filters = new_include_filters
+        for include_path in set(self.file_content["includes"]) | set(self.include_contents):
+            if include_path in self.file_content["includes"]:
+                content = self.loadInclude(include_path)
+            else:
+                content = None  # Include removed
+            added, removed = self.includeSetContent(include_path, content)
+            mutes_added = (mutes_added - removed) | added
+            mutes_removed = (mutes_removed - added) | removed
 
         if update_site_dbs:
-            for auth_address in mutes_added:
-                self.changeDbs(auth_address, "remove")
-
-            for auth_address in mutes_removed:
-                if not self.isMuted(auth_address):
-                    self.changeDbs(auth_address, "load")
+            self.includeChangeDbs(mutes_added, mutes_removed)
 
         num_mutes = len(self.include_filters["mutes"])
         num_siteblocks = len(self.include_filters["siteblocks"])
@@ -90,6 +120,23 @@ class ContentFilterStorage(object):
             (num_mutes, num_siteblocks, len(self.file_content["includes"]), time.time() - s)
         )
 
+    # Reload a single include file and apply only the differences
+    def includeUpdate(self, include_path, update_site_dbs=True):
+        s = time.time()
+        if include_path in self.file_content["includes"]:
+            content = self.loadInclude(include_path)
+        else:
+            content = None
+        mutes_added, mutes_removed = self.includeSetContent(include_path, content)
+
+        if update_site_dbs:
+            self.includeChangeDbs(mutes_added, mutes_removed)
+
+        self.log.debug(
+            "Updated include %s in %.3fs: %s mutes added, %s removed" %
+            (include_path, time.time() - s, len(mutes_added), len(mutes_removed))
+        )
+
     def includeAdd(self, address, inner_path, description=None):
         self.file_content["includes"]["%s/%s" % (address, inner_path)] = {
             "date_added": time.time(),
@@ -97,12 +144,12 @@ class ContentFilterStorage(object):
             "description": description,
             "inner_path": inner_path
         }
-        self.includeUpdateAll()
+        self.includeUpdate("%s/%s" % (address, inner_path))
         self.save()
 
     def includeRemove(self, address, inner_path):
         del self.file_content["includes"]["%s/%s" % (address, inner_path)]
-        self.includeUpdateAll()
+        self.includeUpdate("%s/%s" % (address, inner_path))
         self.save()
 
     def save(self):
@@ -131,34 +178,33 @@ class ContentFilterStorage(object):
             details = self.file_content["siteblocks"].get(address_sha256)
 
         if not details:
-            includes = self.file_content.get("includes", {}).values()
-            for include in includes:
-                include_site = self.site_manager.get(include["address"])
-                if not include_site:
-                    continue
-                content = include_site.storage.loadJson(include["inner_path"])
+            includes = self.file_content.get("includes", {})
+            for include_path, content in self.include_contents.items():
                 details = content.get("siteblocks", {}).get(address)
                 if details:
-                    details["include"] = include
+                    details = dict(details)  # Don't modify the loaded include
+                    details["include"] = includes.get(include_path)
                     break
 
         return details
 
     # Search and remove or readd files of an user
     def changeDbs(self, auth_address, action):
-        self.log.debug("Mute action %s on user %s" % (action, auth_address))
-        res = list(self.site_manager.list().values())[0].content_manager.contents.db.execute(
-            "SELECT * FROM content LEFT JOIN site USING (site_id) WHERE inner_path LIKE :inner_path",
-            {"inner_path": "%%/%s/%%" % auth_address}
-        )
-        for row in res:
-            site = self.site_manager.sites.get(row["address"])
+        s = time.time()
+        content_db = list(self.site_manager.list().values())[0].content_manager.contents.db
+        user_contents = content_db.getUserContents(auth_address)
+        for address, content_inner_path in user_contents:
+            site = self.site_manager.sites.get(address)
             if not site:
                 continue
-            dir_inner_path = helper.getDirname(row["inner_path"])
+            dir_inner_path = helper.getDirname(content_inner_path)
             for file_name in site.storage.walk(dir_inner_path):
                 if action == "remove":
                     site.storage.delete(dir_inner_path + file_name)
                 else:
                     site.storage.onUpdated(dir_inner_path + file_name)
                 site.onFileDone(dir_inner_path + file_name)
+        self.log.debug(
+            "Mute action %s on user %s done in %.3fs (%s directories)" %
+            (action, auth_address, time.time() - s, len(user_contents))
+        )
@@ -80,3 +80,27 @@ class TestContentFilter:
         assert site.storage.query(query_num_json).fetchone()["num"] == 0
 
 
+
+    def testUserContents(self, site, filter_storage):
+        content_db = site.content_manager.contents.db
+        user_contents = content_db.getUserContents("1J6UrZMkarjVg5ax9W4qThir3BFUikbW6C")
+        assert (site.address, "data/users/1J6UrZMkarjVg5ax9W4qThir3BFUikbW6C/content.json") in user_contents
+        assert not content_db.getUserContents("1Hello")
+
+    def testIncludeUpdateMultiple(self, site, filter_storage):
+        self.createInclude(site)
+        site.storage.writeJson("filters2.json", {"mutes": {"1J6UrZMkarjVg5ax9W4qThir3BFUikbW6C": {}}})
+        query_num_json = "SELECT COUNT(*) AS num FROM json WHERE directory = 'users/1J6UrZMkarjVg5ax9W4qThir3BFUikbW6C'"
+        filter_storage.includeAdd(site.address, "filters.json")
+        filter_storage.includeAdd(site.address, "filters2.json")
+        assert filter_storage.include_filters["mutes"]["1J6UrZMkarjVg5ax9W4qThir3BFUikbW6C"] == 2
+
+        # Still muted by the other include
+        filter_storage.includeRemove(site.address, "filters.json")
+        assert filter_storage.isMuted("1J6UrZMkarjVg5ax9W4qThir3BFUikbW6C")
+        assert not filter_storage.isSiteblocked(site.address)
+        assert site.storage.query(query_num_json).fetchone()["num"] == 0
+
+        filter_storage.includeRemove(site.address, "filters2.json")
+        assert not filter_storage.isMuted("1J6UrZMkarjVg5ax9W4qThir3BFUikbW6C")
+        assert site.storage.query(query_num_json).fetchone()["num"] == 2
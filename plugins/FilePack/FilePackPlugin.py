@@ -1,14 +1,244 @@
 import os
 import re
-
-import gevent
+import zlib
+import bisect
+import collections
 
 from Plugin import PluginManager
 from Config import config
 from Debug import Debug
 
-# Keep archive open for faster reponse times for large sites
-archive_cache = {}
+# Keep archives open for faster reponse times for large sites
+if "archive_cache" not in locals():
+    archive_cache = collections.OrderedDict()  # Key: archive path, Value: opened archive, least recently used first
+archive_cache_size = 10
+# Member index of tar.gz archives, kept after the archive is closed to avoid scanning the whole gzip stream again
+if "archive_index_cache" not in locals():
+    archive_index_cache = collections.OrderedDict()  # Key: (archive path, mtime), Value: TarGzIndex, least recently used first
+archive_index_cache_seek_points = 250  # Every seek point holds a ~40KB decompressor copy
+
+
+class GzipCursor(object):
+    # Decompression state of a gzip file at pos_raw compressed and pos_out decompressed position
+    def __init__(self, file, pos_raw=0, pos_out=0, decompressor=None):
+        self.file = file
+        self.pos_raw = pos_raw
+        self.pos_out = pos_out
+        self.decompressor = decompressor or zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.is_end = False
+
+    def copy(self):
+        return GzipCursor(self.file, self.pos_raw, self.pos_out, self.decompressor.copy())
+
+    def decompress(self, chunk):
+        datas = []
+        while chunk:
+            if self.decompressor.eof:  # Next member of a multi-member gzip file
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                try:
+                    datas.append(self.decompressor.decompress(chunk))
+                except zlib.error:  # Padding after the last member
+                    self.is_end = True
+                    break
+            else:
+                datas.append(self.decompressor.decompress(chunk))
+            if self.decompressor.eof:
+                chunk = self.decompressor.unused_data
+            else:
+                chunk = b""
+        return b"".join(datas)
+
+    # Return: Next decompressed block, empty at end of the file
+    def readBlock(self, block_size=64 * 1024):
+        while not self.is_end:
+            self.file.seek(self.pos_raw)
+            chunk = self.file.read(block_size)
+            if not chunk:
+                self.is_end = True
+                break
+            self.pos_raw += len(chunk)
+            data = self.decompress(chunk)
+            if data:
+                self.pos_out += len(data)
+                return data
+        return b""
+
+
+class GzipIndexStream(object):
+    # Sequential decompressed stream for tarfile that records seek points while reading
+    def __init__(self, file, seek_point_interval):
+        self.cursor = GzipCursor(file)
+        self.seek_point_interval = seek_point_interval
+        self.seek_points = [self.cursor.copy()]
+        self.buffer = b""
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            data = self.cursor.readBlock()
+            if not data:
+                break
+            self.buffer += data
+            if self.cursor.pos_out - self.seek_points[-1].pos_out >= self.seek_point_interval:
+                self.seek_points.append(self.cursor.copy())
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class TarGzIndex(object):
+    seek_point_interval = 4 * 1024 * 1024
+
+    def __init__(self, members, seek_points):
+        self.members = members  # Key: name, Value: tarfile.TarInfo
+        self.seek_points = seek_points  # GzipCursor at every ~4MB of decompressed data
+        self.seek_points_pos = [seek_point.pos_out for seek_point in seek_points]
+
+    # Scan the archive once and index the member positions
+    @classmethod
+    def build(cls, file):
+        import tarfile
+        stream = GzipIndexStream(file, cls.seek_point_interval)
+        members = {}
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            for member in tar:
+                members[member.name.rstrip("/")] = member
+        return cls(members, stream.seek_points)
+
+    # Return: Copy of the last seek point before pos
+    def getSeekPoint(self, pos):
+        return self.seek_points[bisect.bisect_right(self.seek_points_pos, pos) - 1].copy()
+
+
+class TarGzMemberFile(object):
+    # Random access to a member of a tar.gz archive using the seek points of the index
+    def __init__(self, archive, offset, size):
+        self.archive = archive
+        self.offset = offset
+        self.size = size
+        self.pos = 0
+        self.cursor = None
+        self.buffer = b""
+        self.buffer_pos = 0  # Archive position of the first byte in the buffer
+
+    def seek(self, pos, whence=0):
+        if whence == 1:
+            pos += self.pos
+        elif whence == 2:
+            pos += self.size
+        self.pos = max(0, min(pos, self.size))
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, size=-1):
+        if size is None or size < 0 or self.pos + size > self.size:
+            size = self.size - self.pos
+        if size <= 0:
+            return b""
+        pos_from = self.offset + self.pos
+        pos_to = pos_from + size
+
+        seek_point = self.archive.index.getSeekPoint(pos_from)
+        if not self.cursor or pos_from < self.buffer_pos or seek_point.pos_out > self.cursor.pos_out:
+            # Continue from the nearest seek point instead of the current position
+            self.cursor = seek_point
+            self.buffer = b""
+            self.buffer_pos = seek_point.pos_out
+
+        datas = [self.buffer]
+        while self.cursor.pos_out < pos_to:
+            data = self.cursor.readBlock()
+            if not data:
+                break
+            datas.append(data)
+        buffer = b"".join(datas)
+        data = buffer[pos_from - self.buffer_pos:pos_to - self.buffer_pos]
+        self.buffer = buffer[pos_to - self.buffer_pos:]
+        self.buffer_pos = max(pos_to, self.buffer_pos)
+        self.pos += len(data)
+        return data
+
+    def close(self):
+        self.cursor = None
+        self.buffer = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TarGzArchive(object):
+    def __init__(self, archive_path, mtime, file_obj=None):
+        self.file = file_obj or open(archive_path, "rb")
+        index_key = (archive_path, mtime)
+        self.index = archive_index_cache.get(index_key)
+        if self.index:
+            archive_index_cache.move_to_end(index_key)
+        else:
+            self.index = TarGzIndex.build(self.file)
+            archive_index_cache[index_key] = self.index
+            num_seek_points = sum(len(index.seek_points) for index in archive_index_cache.values())
+            while len(archive_index_cache) > 1 and num_seek_points > archive_index_cache_seek_points:
+                index_removed = archive_index_cache.popitem(last=False)[1]
+                num_seek_points -= len(index_removed.seek_points)
+
+    # Return: Names of members, the directory names without trailing slash
+    def getNames(self, include_dirs=True):
+        return [name for name, member in self.index.members.items() if include_dirs or not member.isdir()]
+
+    def getMember(self, name):
+        member = self.index.members.get(name)
+        for i in range(10):  # Follow links within the archive
+            if not member or not member.issym() and not member.islnk():
+                break
+            if member.islnk():
+                name = member.linkname
+            else:
+                name = os.path.normpath(os.path.join(os.path.dirname(member.name), member.linkname))
+            member = self.index.members.get(name)
+        if not member or not member.isfile():
+            raise KeyError("File not found in archive: %s" % name)
+        return member
+
+    def getSize(self, path_within):
+        return self.getMember(path_within).size
+
+    def open(self, path_within):
+        member = self.getMember(path_within)
+        return TarGzMemberFile(self, member.offset_data, member.size)
+
+
+class ZipArchive(object):
+    def __init__(self, archive_path, mtime, file_obj=None):
+        import zipfile
+        self.zip = zipfile.ZipFile(file_obj or archive_path)
+
+    def getNames(self, include_dirs=True):
+        return [name.rstrip("/") for name in self.zip.namelist() if include_dirs or not name.endswith("/")]
+
+    def getSize(self, path_within):
+        return self.zip.getinfo(path_within).file_size
+
+    def open(self, path_within):
+        return self.zip.open(path_within)
+
+
+def getArchiveMtime(archive_path):
+    try:
+        return os.path.getmtime(archive_path)
+    except OSError:
+        return None
+
+
+# Return: Opened archive if it's in the cache and not modified since
+def getCachedArchive(archive_path):
+    archive = archive_cache.get(archive_path)
+    if archive and archive.mtime != getArchiveMtime(archive_path):
+        del archive_cache[archive_path]
+        archive = None
+    return archive
 
 
 def closeArchive(archive_path):
@@ -17,25 +247,26 @@ def closeArchive(archive_path):
 
 
 def openArchive(archive_path, file_obj=None):
-    if archive_path not in archive_cache:
-        if archive_path.endswith("tar.gz"):
-            import tarfile
-            archive_cache[archive_path] = tarfile.open(archive_path, fileobj=file_obj, mode="r:gz")
-        else:
-            import zipfile
-            archive_cache[archive_path] = zipfile.ZipFile(file_obj or archive_path)
-        gevent.spawn_later(5, lambda: closeArchive(archive_path))  # Close after 5 sec
+    archive = getCachedArchive(archive_path)
+    if archive:
+        archive_cache.move_to_end(archive_path)
+        return archive
 
-    archive = archive_cache[archive_path]
+    mtime = getArchiveMtime(archive_path)
+    if archive_path.endswith("tar.gz"):
+        archive = TarGzArchive(archive_path, mtime, file_obj=file_obj)
+    else:
+        archive = ZipArchive(archive_path, mtime, file_obj=file_obj)
+    archive.mtime = mtime
+    archive_cache[archive_path] = archive
+    while len(archive_cache) > archive_cache_size:
+        archive_cache.popitem(last=False)  # Member files still being read keep their archive alive
     return archive
 
 
 def openArchiveFile(archive_path, path_within, file_obj=None):
     archive = openArchive(archive_path, file_obj=file_obj)
-    if archive_path.endswith(".zip"):
-        return archive.open(path_within)
-    else:
-        return archive.extractfile(path_within)
+    return archive.open(path_within)
 
 
 @PluginManager.registerTo("UiRequest")
@@ -44,10 +275,10 @@ class UiRequestPlugin(object):
         if ".zip/" in path or ".tar.gz/" in path:
             file_obj = None
             path_parts = self.parsePath(path)
-            file_path = config.data_dir / path_parts["address"] / path_parts["inner_path"]
+            file_path = "%s/%s/%s" % (config.data_dir, path_parts["address"], path_parts["inner_path"])
             match = re.match(r"^(.*\.(?:tar.gz|zip))/(.*)", file_path)
             archive_path, path_within = match.groups()
-            if archive_path not in archive_cache:
+            if not getCachedArchive(archive_path):
                 site = self.server.site_manager.get(path_parts["address"])
                 if not site:
                     return self.actionSiteAddPrompt(path)
@@ -72,27 +303,20 @@ class UiRequestPlugin(object):
                     return self.error403("Invalid ajax_key")
 
             try:
-                file = openArchiveFile(archive_path, path_within, file_obj=file_obj)
-                content_type = self.getContentType(file_path)
-                self.sendHeader(200, content_type=content_type, noscript=kwargs.get("header_noscript", False), allow_ajax=header_allow_ajax)
-                return self.streamFile(file)
+                archive = openArchive(archive_path, file_obj=file_obj)
+                file_size = archive.getSize(path_within)
+                file = archive.open(path_within)
             except Exception as err:
                 self.log.debug("Error opening archive file: %s" % Debug.formatException(err))
                 return self.error404(path)
 
-        return super(UiRequestPlugin, self).actionSiteMedia(path, **kwargs)
+            # Served as a regular file for range request support
+            return self.actionFile(
+                path_within, file_size=file_size, file_obj=file,
+                header_noscript=kwargs.get("header_noscript", False), header_allow_ajax=header_allow_ajax
+            )
 
-    def streamFile(self, file):
-        for i in range(100):  # Read max 6MB
-            try:
-                block = file.read(60 * 1024)
-                if block:
-                    yield block
-                else:
-                    raise StopIteration
-            except StopIteration:
-                file.close()
-                break
+        return super(UiRequestPlugin, self).actionSiteMedia(path, **kwargs)
 
 
 @PluginManager.registerTo("SiteStorage")
@@ -108,7 +332,7 @@ class SiteStoragePlugin(object):
     def openArchive(self, inner_path):
         archive_path = self.getPath(inner_path)
         file_obj = None
-        if archive_path not in archive_cache:
+        if not getCachedArchive(archive_path):
             if not os.path.isfile(archive_path):
                 result = self.site.needFile(inner_path, priority=10)
                 self.site.updateWebsocket(file_done=inner_path)
@@ -132,10 +356,7 @@ class SiteStoragePlugin(object):
             archive = self.openArchive(archive_inner_path)
             path_within = path_within.lstrip("/")
 
-            if archive_inner_path.endswith(".zip"):
-                namelist = [name for name in archive.namelist() if not name.endswith("/")]
-            else:
-                namelist = [item.name for item in archive.getmembers() if not item.isdir()]
+            namelist = archive.getNames(include_dirs=False)
 
             namelist_relative = []
             for name in namelist:
@@ -156,10 +377,7 @@ class SiteStoragePlugin(object):
             archive = self.openArchive(archive_inner_path)
             path_within = path_within.lstrip("/")
 
-            if archive_inner_path.endswith(".zip"):
-                namelist = [name for name in archive.namelist()]
-            else:
-                namelist = [item.name for item in archive.getmembers()]
+            namelist = archive.getNames()
 
             namelist_relative = []
             for name in namelist:
@@ -183,10 +401,8 @@ class SiteStoragePlugin(object):
             archive = self.openArchive(archive_inner_path)
             path_within = path_within.lstrip("/")
 
-            if archive_inner_path.endswith(".zip"):
-                return archive.open(path_within).read()
-            else:
-                return archive.extractfile(path_within).read()
+            with archive.open(path_within) as file:
+                return file.read()
 
         else:
             return super(SiteStoragePlugin, self).read(inner_path, mode, **kwargs)
@@ -0,0 +1,131 @@
+import io
+import gzip
+import random
+import tarfile
+import zipfile
+
+import pytest
+import mock
+
+from FilePack import FilePackPlugin
+from Ui import UiRequest
+from Site import SiteManager
+
+
+def createTar(files):
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return data.getvalue()
+
+
+@pytest.fixture
+def files():
+    rand = random.Random(1234)
+    return {
+        "index.html": b"Hello archive",
+        "data/big.bin": rand.getrandbits(8 * 300 * 1024).to_bytes(300 * 1024, "little"),  # Not compressible: many seek points
+        "data/text.txt": b"Test line\n" * 50000
+    }
+
+
+@pytest.fixture(autouse=True)
+def archiveCache():
+    FilePackPlugin.archive_cache.clear()
+    FilePackPlugin.archive_index_cache.clear()
+    # Smaller interval to have multiple seek points in small archives
+    with mock.patch.object(FilePackPlugin.TarGzIndex, "seek_point_interval", 64 * 1024):
+        yield
+    FilePackPlugin.archive_cache.clear()
+    FilePackPlugin.archive_index_cache.clear()
+
+
+class TestFilePack:
+    def checkArchive(self, archive_path, files):
+        archive = FilePackPlugin.openArchive(archive_path)
+        assert set(archive.getNames(include_dirs=False)) == set(files.keys())
+        for name, content in files.items():
+            assert archive.getSize(name) == len(content)
+            with archive.open(name) as file:
+                assert file.read() == content
+
+        # Random seeks forward and backward
+        rand = random.Random(5678)
+        content = files["data/big.bin"]
+        with archive.open("data/big.bin") as file:
+            for i in range(50):
+                pos = rand.randint(0, len(content))
+                size = rand.randint(0, 100 * 1024)
+                file.seek(pos)
+                assert file.read(size) == content[pos:pos + size]
+                assert file.tell() == min(pos + size, len(content))
+        return archive
+
+    def testTarGz(self, site, files):
+        archive_path = site.storage.getPath("data/archive.tar.gz")
+        with open(archive_path, "wb") as file:
+            file.write(gzip.compress(createTar(files)))
+
+        archive = self.checkArchive(archive_path, files)
+        assert len(archive.index.seek_points) > 2
+
+        # Index kept after the archive is closed
+        FilePackPlugin.closeArchive(archive_path)
+        with mock.patch.object(FilePackPlugin.TarGzIndex, "build") as build:
+            self.checkArchive(archive_path, files)
+        assert not build.called
+
+    def testTarGzMultiMember(self, site, files):
+        archive_path = site.storage.getPath("data/archive.tar.gz")
+        data = createTar(files)
+        with open(archive_path, "wb") as file:
+            for pos in range(0, len(data), 100 * 1024):  # New gzip member at every 100KB
+                file.write(gzip.compress(data[pos:pos + 100 * 1024]))
+
+        self.checkArchive(archive_path, files)
+
+    def testZip(self, site, files):
+        archive_path = site.storage.getPath("data/archive.zip")
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for name, content in files.items():
+                zip_file.writestr(name, content)
+
+        self.checkArchive(archive_path, files)
+        assert site.storage.read("data/archive.zip/index.html") == b"Hello archive"
+        assert set(site.storage.list("data/archive.zip/data/")) == {"big.bin", "text.txt"}
+
+    def testIndexCacheLimit(self, site, files):
+        num_seek_points = []
+        for i in range(3):
+            archive_path = site.storage.getPath("data/archive%s.tar.gz" % i)
+            with open(archive_path, "wb") as file:
+                file.write(gzip.compress(createTar(files)))
+            num_seek_points.append(len(FilePackPlugin.openArchive(archive_path).index.seek_points))
+
+        # Limited by the number of seek points, not by the number of archives
+        with mock.patch.object(FilePackPlugin, "archive_index_cache_seek_points", sum(num_seek_points[1:])):
+            FilePackPlugin.archive_index_cache.clear()
+            for i in range(3):
+                FilePackPlugin.TarGzArchive(site.storage.getPath("data/archive%s.tar.gz" % i), None)
+        assert len(FilePackPlugin.archive_index_cache) == 2
+
+    def testRangeRequest(self, site, files):
+        archive_path = site.storage.getPath("data/archive.tar.gz")
+        with open(archive_path, "wb") as file:
+            file.write(gzip.compress(createTar(files)))
+        SiteManager.site_manager.sites[site.address] = site
+
+        server = mock.MagicMock()
+        server.site_manager = SiteManager.site_manager
+        start_response = mock.MagicMock()
+        env = {"REQUEST_METHOD": "GET", "HTTP_RANGE": "bytes=100000-"}
+        ui_request = UiRequest(server, env, start_response)
+
+        data = b"".join(ui_request.actionSiteMedia("/media/%s/data/archive.tar.gz/data/big.bin" % site.address))
+        assert data == files["data/big.bin"][100000:]
+        status, headers = start_response.call_args[0]
+        assert status.startswith("206")
+        assert dict(headers)["Content-Range"] == "bytes 100000-%s/%s" % (len(files["data/big.bin"]) - 1, len(files["data/big.bin"]))
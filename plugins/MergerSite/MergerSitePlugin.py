@@ -18,6 +18,8 @@ if "merger_db" not in locals().keys():  # To keep merger_sites between module re
     merger_db = {}  # Sites that allowed to list other sites {address: [type1, type2...]}
     merged_db = {}  # Sites that allowed to be merged to other sites {address: type, ...}
     merged_to_merger = {}  # {address: [site1, site2, ...]} cache
+    merger_type_sites = {}  # Merger sites by type {type: [site1, site2, ...]}
+    merged_type_sites = {}  # Merged sites by type {type: [site1, site2, ...]}
     site_manager = None  # Site manager for merger sites
 
 
@@ -214,7 +216,7 @@ class UiWebsocketPlugin(object):
     def actionPermissionAdd(self, to, permission):
         super(UiWebsocketPlugin, self).actionPermissionAdd(to, permission)
         if permission.startswith("Merger"):
-            self.site.storage.rebuildDb()
+            site_manager.updateMergerSites()  # Imports the sites of the new type to the db
 
     def actionPermissionDetails(self, to, permission):
         if not permission.startswith("Merger"):
@@ -264,38 +266,95 @@ class SiteStoragePlugin(object):
         if not merger_types:
             return
 
-        merged_sites = [
-            site_manager.sites[address]
-            for address, merged_type in merged_db.items()
-            if merged_type in merger_types
-        ]
+        for merger_type in merger_types:
+            for merged_site in merged_type_sites.get(merger_type, []):
+                self.log.debug("Loading merged site: %s" % merged_site)
+                for item in self.getMergedDbFiles(merged_site, merger_type):
+                    yield item
+
+    # Return: Virtual inner path and real path of the json files of a merged site
+    def getMergedDbFiles(self, merged_site, merged_type):
         found = 0
-        for merged_site in merged_sites:
-            self.log.debug("Loading merged site: %s" % merged_site)
-            merged_type = merged_db[merged_site.address]
-            for content_inner_path, content in merged_site.content_manager.contents.items():
-                # content.json file itself
-                if merged_site.storage.isFile(content_inner_path):  # Missing content.json file
-                    merged_inner_path = "merged-%s/%s/%s" % (merged_type, merged_site.address, content_inner_path)
-                    yield merged_inner_path, merged_site.storage.getPath(content_inner_path)
+        dir_files = {}  # Files in directories, listed once instead of checking every file {dir_inner_path: set(file_names)}
+        for content_inner_path, content in merged_site.content_manager.contents.items():
+            file_inner_paths = [content_inner_path]  # content.json file itself
+            # Data files in content.json
+            content_inner_path_dir = helper.getDirname(content_inner_path)  # Content.json dir relative to site
+            for file_relative_path in list(content.get("files", {}).keys()) + list(content.get("files_optional", {}).keys()):
+                if not file_relative_path.endswith(".json"):
+                    continue  # We only interesed in json files
+                file_inner_path = content_inner_path_dir + file_relative_path  # File Relative to site dir
+                file_inner_paths.append(file_inner_path.strip("/"))  # Strip leading /
+
+            for file_inner_path in file_inner_paths:
+                dir_inner_path = helper.getDirname(file_inner_path)
+                if dir_inner_path not in dir_files:
+                    try:
+                        dir_files[dir_inner_path] = set(os.listdir(merged_site.storage.getPath(dir_inner_path)))
+                    except OSError:
+                        dir_files[dir_inner_path] = set()
+                if helper.getFilename(file_inner_path) in dir_files[dir_inner_path]:
+                    merged_inner_path = "merged-%s/%s/%s" % (merged_type, merged_site.address, file_inner_path)
+                    yield merged_inner_path, merged_site.storage.getPath(file_inner_path)
                 else:
-                    merged_site.log.error("[MISSING] %s" % content_inner_path)
-                # Data files in content.json
-                content_inner_path_dir = helper.getDirname(content_inner_path)  # Content.json dir relative to site
-                for file_relative_path in list(content.get("files", {}).keys()) + list(content.get("files_optional", {}).keys()):
-                    if not file_relative_path.endswith(".json"):
-                        continue  # We only interesed in json files
-                    file_inner_path = content_inner_path_dir + file_relative_path  # File Relative to site dir
-                    file_inner_path = file_inner_path.strip("/")  # Strip leading /
-                    if merged_site.storage.isFile(file_inner_path):
-                        merged_inner_path = "merged-%s/%s/%s" % (merged_type, merged_site.address, file_inner_path)
-                        yield merged_inner_path, merged_site.storage.getPath(file_inner_path)
-                    else:
-                        merged_site.log.error("[MISSING] %s" % file_inner_path)
-                    found += 1
-                    if found % 100 == 0:
+                    merged_site.log.error("[MISSING] %s" % file_inner_path)
+                found += 1
+                if found % 100 == 0:
+                    time.sleep(0.001)  # Context switch to avoid UI block
+
+    # Import the files of newly merged sites and remove the files of no longer merged sites from the db
+    # without rebuilding the whole db
+    def updateMergedSites(self, sites_added, sites_removed):
+        if not self.has_db:
+            return False
+        s = time.time()
+        db = self.getDb()
+        cur = db.getCursor()
+        cur.logging = False
+        num_imported = 0
+        num_removed = 0
+        try:
+            for merged_address, merged_type in sites_removed:
+                for file_path in self.getMergedDbPaths(db, cur, merged_address, merged_type):
+                    try:
+                        db.updateJson(file_path, file=False, cur=cur)
+                        num_removed += 1
+                    except Exception as err:
+                        self.log.error("Error removing %s: %s" % (file_path, Debug.formatException(err)))
+                    if num_removed % 100 == 0:
                         time.sleep(0.001)  # Context switch to avoid UI block
 
+            for merged_site, merged_type in sites_added:
+                for merged_inner_path, file_path in self.getMergedDbFiles(merged_site, merged_type):
+                    try:
+                        with open(file_path, "rb") as file:
+                            if self.updateDbFile(merged_inner_path, file=file, cur=cur):
+                                num_imported += 1
+                    except Exception as err:
+                        self.log.error("Error importing %s: %s" % (merged_inner_path, Debug.formatException(err)))
+        finally:
+            cur.close()
+            db.commit("Merged sites updated")
+        self.log.debug(
+            "Merged sites updated in %.3fs: +%s sites (%s files), -%s sites (%s files)" %
+            (time.time() - s, len(sites_added), num_imported, len(sites_removed), num_removed)
+        )
+        return True
+
+    # Return: Paths of the merged site's json files that are in the db
+    def getMergedDbPaths(self, db, cur, merged_address, merged_type):
+        merged_dir = "merged-%s/%s" % (merged_type, merged_address)
+        if db.schema["version"] == 1:
+            res = cur.execute("SELECT path FROM json WHERE path LIKE ?", (merged_dir + "/%",))
+            relative_paths = [row["path"] for row in res]
+        else:
+            res = cur.execute(
+                "SELECT directory, file_name FROM json WHERE directory = ? OR directory LIKE ?",
+                (merged_dir, merged_dir + "/%")
+            )
+            relative_paths = [row["directory"] + "/" + row["file_name"] for row in res]
+        return [db.db_dir + relative_path for relative_path in sorted(set(relative_paths))]
+
     # Also notice merger sites on a merged site file change
     def onUpdated(self, inner_path, file=None):
         super(SiteStoragePlugin, self).onUpdated(inner_path, file)
@@ -323,8 +382,7 @@ class SitePlugin(object):
         for merger_site in merged_to_merger.get(self.address, []):
             if merger_site.address == self.address:
                 continue
-            for ws in merger_site.websockets:
-                ws.event("siteChanged", self, {"event": ["file_done", inner_path]})
+            self.broadcastWebsocket({"event": ["file_done", inner_path]}, websockets=merger_site.websockets)
 
     def fileFailed(self, inner_path):
         super(SitePlugin, self).fileFailed(inner_path)
@@ -332,23 +390,36 @@ class SitePlugin(object):
         for merger_site in merged_to_merger.get(self.address, []):
             if merger_site.address == self.address:
                 continue
-            for ws in merger_site.websockets:
-                ws.event("siteChanged", self, {"event": ["file_failed", inner_path]})
+            self.broadcastWebsocket({"event": ["file_failed", inner_path]}, websockets=merger_site.websockets)
+
+
+@PluginManager.registerTo("ContentManager")
+class ContentManagerPlugin(object):
+    # Update the merger site index if the site's merged type changed
+    def loadContent(self, content_inner_path="content.json", *args, **kwargs):
+        res = super(ContentManagerPlugin, self).loadContent(content_inner_path, *args, **kwargs)
+        if content_inner_path.strip("/") == "content.json" and site_manager and self.site.address in site_manager.sites:
+            merged_type = self.contents.get("content.json", {}).get("merged_type")
+            if merged_type != merged_db.get(self.site.address):
+                site_manager.updateMergerSites()
+        return res
 
 
 @PluginManager.registerTo("SiteManager")
 class SiteManagerPlugin(object):
     # Update merger site for site types
     def updateMergerSites(self):
-        global merger_db, merged_db, merged_to_merger, site_manager
+        global merger_db, merged_db, merged_to_merger, merger_type_sites, merged_type_sites, site_manager
         s = time.time()
         merger_db_new = {}
         merged_db_new = {}
-        merged_to_merger_new = {}
+        merger_type_sites_new = {}
+        merged_type_sites_new = {}
+        is_first_update = site_manager is None
         site_manager = self
         if not self.sites:
             return
-        for site in self.sites.values():
+        for site in list(self.sites.values()):
             # Update merged sites
             try:
                 merged_type = site.content_manager.contents.get("content.json", {}).get("merged_type")
@@ -357,9 +428,10 @@ class SiteManagerPlugin(object):
                 continue
             if merged_type:
                 merged_db_new[site.address] = merged_type
+                merged_type_sites_new.setdefault(merged_type, []).append(site)
 
             # Update merger sites
-            for permission in site.settings["permissions"]:
+            for permission in list(site.settings["permissions"]):
                 if not permission.startswith("Merger:"):
                     continue
                 if merged_type:
@@ -370,26 +442,66 @@ class SiteManagerPlugin(object):
                     site.settings["permissions"].remove(permission)
                     continue
                 merger_type = permission.replace("Merger:", "")
-                if site.address not in merger_db_new:
-                    merger_db_new[site.address] = []
-                merger_db_new[site.address].append(merger_type)
-                site_manager.sites[site.address] = site
+                merger_db_new.setdefault(site.address, []).append(merger_type)
+                merger_type_sites_new.setdefault(merger_type, []).append(site)
 
-            # Update merged to merger
-            if merged_type:
-                for merger_site in self.sites.values():
-                    if "Merger:" + merged_type in merger_site.settings["permissions"]:
-                        if site.address not in merged_to_merger_new:
-                            merged_to_merger_new[site.address] = []
-                        merged_to_merger_new[site.address].append(merger_site)
+        if merger_db_new == merger_db and merged_db_new == merged_db and merger_type_sites_new == merger_type_sites:
+            return  # Nothing changed
+
+        # Update merged to merger
+        merged_to_merger_new = {}
+        for address, merged_type in merged_db_new.items():
+            if merged_type in merger_type_sites_new:
+                merged_to_merger_new[address] = merger_type_sites_new[merged_type]
+
+        if not is_first_update:
+            self.updateMergerSitesDb(merger_db_new, merged_db_new)
 
         # Update globals
         merger_db = merger_db_new
         merged_db = merged_db_new
         merged_to_merger = merged_to_merger_new
+        merger_type_sites = merger_type_sites_new
+        merged_type_sites = merged_type_sites_new
 
         self.log.debug("Updated merger sites in %.3fs" % (time.time() - s))
 
+    # Import and remove only the changed merged sites to the merger site dbs
+    def updateMergerSitesDb(self, merger_db_new, merged_db_new):
+        for address, merger_types in merger_db_new.items():
+            merger_site = self.sites[address]
+            merger_types_old = merger_db.get(address, [])
+            merged_old = {
+                merged_address: merged_type for merged_address, merged_type in merged_db.items()
+                if merged_type in merger_types_old
+            }
+            merged_new = {
+                merged_address: merged_type for merged_address, merged_type in merged_db_new.items()
+                if merged_type in merger_types
+            }
+            sites_removed = [
+                (merged_address, merged_type) for merged_address, merged_type in merged_old.items()
+                if merged_new.get(merged_address) != merged_type
+            ]
+            sites_added = [
+                (self.sites[merged_address], merged_type) for merged_address, merged_type in merged_new.items()
+                if merged_old.get(merged_address) != merged_type
+            ]
+            if sites_added or sites_removed:
+                merger_site.greenlet_manager.spawn(merger_site.storage.updateMergedSites, sites_added, sites_removed)
+
+        for address, merger_types_old in merger_db.items():
+            if address in merger_db_new or address not in self.sites:
+                continue
+            # No longer a merger site
+            merger_site = self.sites[address]
+            sites_removed = [
+                (merged_address, merged_type) for merged_address, merged_type in merged_db.items()
+                if merged_type in merger_types_old
+            ]
+            if sites_removed:
+                merger_site.greenlet_manager.spawn(merger_site.storage.updateMergedSites, [], sites_removed)
+
     def load(self, *args, **kwags):
         super(SiteManagerPlugin, self).load(*args, **kwags)
         self.updateMergerSites()
@@ -397,3 +509,7 @@ class SiteManagerPlugin(object):
     def saveDelayed(self, *args, **kwags):
         super(SiteManagerPlugin, self).saveDelayed(*args, **kwags)
         self.updateMergerSites()
+
+    def delete(self, *args, **kwags):
+        super(SiteManagerPlugin, self).delete(*args, **kwags)
+        self.updateMergerSites()
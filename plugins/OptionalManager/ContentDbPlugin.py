@@ -1,6 +1,6 @@
 import time
 import collections
-import itertools
+import sqlite3
 import re
 
 import gevent
@@ -22,6 +22,10 @@ class ContentDbPlugin(object):
         self.filled = {}  # Site addresses that already filled from content.json
         self.need_filling = False  # file_optional table just created, fill data from content.json files
         self.time_peer_numbers_updated = 0
+        self.peer_numbers_synced = set()  # Sites that had the peer numbers of every optional file checked since startup
+        self.optional_used_bytes = None  # Running size of the deletable downloaded optional files (None: needs recount)
+        self.optional_used_where = None  # Query conditions the running size counted with
+        self.time_optional_used_counted = 0
         self.my_optional_files = {}  # Last 50 site_address/inner_path called by fileWrite (auto-pinning these files)
         self.optional_files = collections.defaultdict(dict)
         self.optional_files_loaded = False
@@ -49,7 +53,9 @@ class ContentDbPlugin(object):
             ],
             "indexes": [
                 "CREATE UNIQUE INDEX file_optional_key ON file_optional (site_id, inner_path)",
-                "CREATE INDEX is_downloaded ON file_optional (is_downloaded)"
+                "CREATE INDEX is_downloaded ON file_optional (is_downloaded)",
+                "CREATE INDEX IF NOT EXISTS file_optional_hash_id ON file_optional (site_id, hash_id)",
+                "CREATE INDEX IF NOT EXISTS file_optional_used ON file_optional (is_downloaded, is_pinned, site_id)"
             ],
             "schema_changed": 11
         }
@@ -65,6 +71,10 @@ class ContentDbPlugin(object):
         changed_tables = super(ContentDbPlugin, self).checkTables()
         if "file_optional" in changed_tables:
             self.need_filling = True
+        else:  # Indexes added without table rebuild
+            self.execute("CREATE INDEX IF NOT EXISTS file_optional_hash_id ON file_optional (site_id, hash_id)")
+            self.execute("DROP INDEX IF EXISTS file_optional_deletable")  # Covered the peer/access columns, too costly to update
+            self.execute("CREATE INDEX IF NOT EXISTS file_optional_used ON file_optional (is_downloaded, is_pinned, site_id)")
         return changed_tables
 
     # Load optional files ending
@@ -143,6 +153,7 @@ class ContentDbPlugin(object):
             "UPDATE file_optional SET is_pinned = 1 WHERE site_id = :site_id AND inner_path LIKE :inner_path",
             {"site_id": site_id, "inner_path": "%%/%s/%%" % auth_address}
         )
+        self.optional_used_bytes = None
 
         self.log.debug(
             "Filled file_optional table for %s in %.3fs (loaded: %s, is_pinned: %s)" %
@@ -184,6 +195,8 @@ class ContentDbPlugin(object):
             self.optional_files[site_id][file_inner_path[-8:]] = 1
             num += 1
 
+        if num:
+            self.optional_used_bytes = None
         return num
 
     def setContent(self, site, inner_path, content, size=0):
@@ -200,6 +213,7 @@ class ContentDbPlugin(object):
                 if deleted:
                     site_id = self.site_ids[site.address]
                     self.execute("DELETE FROM file_optional WHERE ?", {"site_id": site_id, "inner_path": deleted})
+                    self.optional_used_bytes = None
 
     def deleteContent(self, site, inner_path):
         content = site.content_manager.contents.get(inner_path)
@@ -211,115 +225,122 @@ class ContentDbPlugin(object):
                 for relative_inner_path in content.get("files_optional", {}).keys()
             ]
             self.execute("DELETE FROM file_optional WHERE ?", {"site_id": site_id, "inner_path": optional_inner_paths})
+            self.optional_used_bytes = None
         super(ContentDbPlugin, self).deleteContent(site, inner_path)
 
+    def deleteSite(self, site):
+        super(ContentDbPlugin, self).deleteSite(site)
+        self.optional_used_bytes = None
+
+    # Apply collected optional file stats: [(site_id, inner_path, time_accessed, uploaded bytes), ...]
+    # The rows are staged in a temp table and applied with one UPDATE in a single transaction
+    def updateFileOptionalStats(self, stats):
+        s = time.time()
+        cur = self.getCursor()
+        cur.logging = False
+        if sqlite3.sqlite_version_info >= (3, 33, 0):  # UPDATE ... FROM support
+            cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS file_optional_stat " +
+                "(site_id INTEGER, inner_path TEXT, time_accessed INTEGER, uploaded INTEGER)"
+            )
+            cur.executemany("INSERT INTO file_optional_stat VALUES (?, ?, ?, ?)", stats)
+            cur.execute("""
+                UPDATE file_optional SET
+                 time_accessed = MAX(file_optional.time_accessed, stat.time_accessed),
+                 uploaded = file_optional.uploaded + stat.uploaded
+                FROM file_optional_stat AS stat
+                WHERE file_optional.site_id = stat.site_id AND file_optional.inner_path = stat.inner_path
+            """)
+            cur.execute("DELETE FROM file_optional_stat")
+        else:
+            cur.executemany(
+                "UPDATE file_optional SET time_accessed = MAX(time_accessed, ?), uploaded = uploaded + ? WHERE site_id = ? AND inner_path = ?",
+                [(time_accessed, uploaded, site_id, inner_path) for site_id, inner_path, time_accessed, uploaded in stats]
+            )
+        self.commit("Optional file stats")
+        self.log.debug("Updated %s optional file stats in %.3fs" % (len(stats), time.time() - s))
+
+    # Write the changed peer numbers of optional files to the db
     def updatePeerNumbers(self):
         s = time.time()
         num_file = 0
         num_updated = 0
         num_site = 0
+        cur = self.getCursor()
         for site in list(self.sites.values()):
             if not site.content_manager.has_optional_files:
                 continue
             if not site.isServing():
                 continue
-            has_updated_hashfield = next((
-                peer
-                for peer in site.peers.values()
-                if peer.has_hashfield and peer.hashfield.time_changed > self.time_peer_numbers_updated
-            ), None)
-
-            if not has_updated_hashfield and site.content_manager.hashfield.time_changed < self.time_peer_numbers_updated:
+            if not site.hash_id_peer_nums_changed and site.address in self.peer_numbers_synced:
                 continue
 
-            hashfield_peers = itertools.chain.from_iterable(
-                peer.hashfield.storage
-                for peer in site.peers.values()
-                if peer.has_hashfield
-            )
-            peer_nums = collections.Counter(
-                itertools.chain(
-                    hashfield_peers,
-                    site.content_manager.hashfield
-                )
-            )
-
             site_id = self.site_ids[site.address]
             if not site_id:
                 continue
 
-            res = self.execute("SELECT file_id, hash_id, peer FROM file_optional WHERE ?", {"site_id": site_id})
-            updates = {}
-            for row in res:
-                peer_num = peer_nums.get(row["hash_id"], 0)
-                if peer_num != row["peer"]:
-                    updates[row["file_id"]] = peer_num
-
-            for file_id, peer_num in updates.items():
-                self.execute("UPDATE file_optional SET peer = ? WHERE file_id = ?", (peer_num, file_id))
-
-            num_updated += len(updates)
-            num_file += len(peer_nums)
+            hash_id_peer_nums = site.hash_id_peer_nums
+            hash_ids_changed = site.hash_id_peer_nums_changed
+            site.hash_id_peer_nums_changed = set()
+            if site.address not in self.peer_numbers_synced:  # Check every file to fix the numbers stored by the previous run
+                res = self.execute("SELECT file_id, hash_id, peer FROM file_optional WHERE ?", {"site_id": site_id})
+                updates = [
+                    (hash_id_peer_nums.get(row["hash_id"], 0), row["file_id"])
+                    for row in res
+                    if hash_id_peer_nums.get(row["hash_id"], 0) != row["peer"]
+                ]
+                cur.executemany("UPDATE file_optional SET peer = ? WHERE file_id = ?", updates)
+                self.peer_numbers_synced.add(site.address)
+                num_updated += len(updates)
+                num_file += len(hash_id_peer_nums)
+            else:
+                updates = [
+                    (hash_id_peer_nums.get(hash_id, 0), site_id, hash_id, hash_id_peer_nums.get(hash_id, 0))
+                    for hash_id in hash_ids_changed
+                ]
+                cur.executemany("UPDATE file_optional SET peer = ? WHERE site_id = ? AND hash_id = ? AND peer != ?", updates)
+                num_updated += len(updates)
+                num_file += len(hash_ids_changed)
             num_site += 1
 
+        if num_updated:
+            self.commit("Updated peer numbers")
         self.time_peer_numbers_updated = time.time()
         self.log.debug("%s/%s peer number for %s site updated in %.3fs" % (num_updated, num_file, num_site, time.time() - s))
 
+    # Return: Deletable optional files in eviction order: the well seeded ones first, then by peer number,
+    # in both groups the not recently accessed and the least uploaded ones first
     def queryDeletableFiles(self):
-        # First return the files with atleast 10 seeder and not accessed in last week
         query = """
-            SELECT * FROM file_optional
-            WHERE peer > 10 AND %s
-            ORDER BY time_accessed < %s DESC, uploaded / size
+            SELECT file_id, site_id, hash_id, size FROM file_optional
+            WHERE %s
+            ORDER BY peer > 10 DESC, CASE WHEN peer > 10 THEN 0 ELSE peer END DESC, time_accessed < %s DESC, uploaded / size, file_id
         """ % (self.getOptionalUsedWhere(), int(time.time() - 60 * 60 * 7))
-        limit_start = 0
+        res = self.execute(query)  # Sorted once, then streamed from the cursor
         while 1:
-            num = 0
-            res = self.execute("%s LIMIT %s, 50" % (query, limit_start))
-            for row in res:
-                yield row
-                num += 1
-            if num < 50:
+            rows = res.fetchmany(100)
+            if not rows:
                 break
-            limit_start += 50
-
-        self.log.debug("queryDeletableFiles returning less-seeded files")
-
-        # Then return files less seeder but still not accessed in last week
-        query = """
-            SELECT * FROM file_optional
-            WHERE peer <= 10 AND %s
-            ORDER BY peer DESC, time_accessed < %s DESC, uploaded / size
-        """ % (self.getOptionalUsedWhere(), int(time.time() - 60 * 60 * 7))
-        limit_start = 0
-        while 1:
-            num = 0
-            res = self.execute("%s LIMIT %s, 50" % (query, limit_start))
-            for row in res:
+            inner_paths = {
+                row["file_id"]: row["inner_path"]
+                for row in self.execute("SELECT file_id, inner_path FROM file_optional WHERE ?", {"file_id": [row["file_id"] for row in rows]})
+            }
+            for row in rows:
+                if row["file_id"] not in inner_paths:  # Deleted since the query
+                    continue
+                row = dict(row)
+                row["inner_path"] = inner_paths[row["file_id"]]
                 yield row
-                num += 1
-            if num < 50:
-                break
-            limit_start += 50
-
-        self.log.debug("queryDeletableFiles returning everyting")
 
-        # At the end return all files
-        query = """
-            SELECT * FROM file_optional
-            WHERE peer <= 10 AND %s
-            ORDER BY peer DESC, time_accessed, uploaded / size
-        """ % self.getOptionalUsedWhere()
-        limit_start = 0
-        while 1:
-            num = 0
-            res = self.execute("%s LIMIT %s, 50" % (query, limit_start))
-            for row in res:
-                yield row
-                num += 1
-            if num < 50:
+    # Return: Optional files to delete to free up need_delete bytes in deletion order
+    def planOptionalEviction(self, need_delete):
+        plan = []
+        for row in self.queryDeletableFiles():
+            if need_delete <= 0:
                 break
-            limit_start += 50
+            plan.append(row)
+            need_delete -= row["size"]
+        return plan
 
     def getOptionalLimitBytes(self):
         if config.optional_limit.endswith("%"):
@@ -344,9 +365,20 @@ class ContentDbPlugin(object):
         return query
 
     def getOptionalUsedBytes(self):
-        size = self.execute("SELECT SUM(size) FROM file_optional WHERE %s" % self.getOptionalUsedWhere()).fetchone()[0]
+        used_where = self.getOptionalUsedWhere()
+        if (
+            self.optional_used_bytes is not None and used_where == self.optional_used_where and
+            time.time() - self.time_optional_used_counted < 60 * 60
+        ):
+            return self.optional_used_bytes
+
+        size = self.execute("SELECT SUM(size) FROM file_optional WHERE %s" % used_where).fetchone()[0]
         if not size:
             size = 0
+        if not self.delayed_queue:  # Don't keep the result if there are pending updates
+            self.optional_used_bytes = size
+            self.optional_used_where = used_where
+            self.time_optional_used_counted = time.time()
         return size
 
     def getOptionalNeedDelete(self, size):
@@ -380,7 +412,8 @@ class ContentDbPlugin(object):
 
         site_ids_reverse = {val: key for key, val in self.site_ids.items()}
         deleted_file_ids = []
-        for row in self.queryDeletableFiles():
+        deleted_size = 0
+        for row in self.planOptionalEviction(need_delete):
             site_address = site_ids_reverse.get(row["site_id"])
             site = self.sites.get(site_address)
             if not site:
@@ -392,16 +425,18 @@ class ContentDbPlugin(object):
                 site.content_manager.optionalRemoved(row["inner_path"], row["hash_id"], row["size"])
                 site.storage.delete(row["inner_path"])
                 need_delete -= row["size"]
+                deleted_size += row["size"]
             except Exception as err:
                 site.log.error("Error deleting %s: %s" % (row["inner_path"], err))
 
-            if need_delete <= 0:
-                break
-
-        cur = self.getCursor()
-        for file_id in deleted_file_ids:
-            cur.execute("UPDATE file_optional SET is_downloaded = 0, is_pinned = 0, peer = peer - 1 WHERE ?", {"file_id": file_id})
-        cur.close()
+        if deleted_file_ids:
+            self.getCursor().executemany(
+                "UPDATE file_optional SET is_downloaded = 0, is_pinned = 0, peer = peer - 1 WHERE file_id = ? AND is_downloaded = 1",
+                [(file_id,) for file_id in deleted_file_ids]
+            )
+        self.optional_used_bytes = size - deleted_size
+        self.optional_used_where = self.getOptionalUsedWhere()
+        self.time_optional_used_counted = time.time()
 
 
 @PluginManager.registerTo("SiteManager")
@@ -23,19 +23,14 @@ def processAccessLog():
         if not content_db.conn:
             return False
 
-        s = time.time()
         access_log_prev = access_log
         access_log = collections.defaultdict(dict)
         now = int(time.time())
-        num = 0
-        for site_id in access_log_prev:
-            content_db.execute(
-                "UPDATE file_optional SET time_accessed = %s WHERE ?" % now,
-                {"site_id": site_id, "inner_path": list(access_log_prev[site_id].keys())}
-            )
-            num += len(access_log_prev[site_id])
-
-        content_db.log.debug("Inserted %s web request stat in %.3fs" % (num, time.time() - s))
+        content_db.updateFileOptionalStats([
+            (site_id, inner_path, now, 0)
+            for site_id in access_log_prev
+            for inner_path in access_log_prev[site_id]
+        ])
 
 
 def processRequestLog():
@@ -45,18 +40,13 @@ def processRequestLog():
         if not content_db.conn:
             return False
 
-        s = time.time()
         request_log_prev = request_log
         request_log = collections.defaultdict(lambda: collections.defaultdict(int))  # {site_id: {inner_path1: 1, inner_path2: 1...}}
-        num = 0
-        for site_id in request_log_prev:
-            for inner_path, uploaded in request_log_prev[site_id].items():
-                content_db.execute(
-                    "UPDATE file_optional SET uploaded = uploaded + %s WHERE ?" % uploaded,
-                    {"site_id": site_id, "inner_path": inner_path}
-                )
-                num += 1
-        content_db.log.debug("Inserted %s file request stat in %.3fs" % (num, time.time() - s))
+        content_db.updateFileOptionalStats([
+            (site_id, inner_path, 0, uploaded)
+            for site_id in request_log_prev
+            for inner_path, uploaded in request_log_prev[site_id].items()
+        ])
 
 
 if "access_log" not in locals().keys():  # To keep between module reloads
@@ -82,6 +72,7 @@ class ContentManagerPlugin(object):
             "UPDATE file_optional SET time_downloaded = :now, is_downloaded = 1, peer = peer + 1 WHERE site_id = :site_id AND inner_path = :inner_path AND is_downloaded = 0",
             {"now": int(time.time()), "site_id": self.contents.db.site_ids[self.site.address], "inner_path": file_inner_path}
         )
+        self.contents.db.optional_used_bytes = None
 
         return super(ContentManagerPlugin, self).optionalDownloaded(inner_path, hash_id, size, own)
 
@@ -92,6 +83,7 @@ class ContentManagerPlugin(object):
         )
 
         if res.rowcount > 0:
+            self.contents.db.optional_used_bytes = None
             back = super(ContentManagerPlugin, self).optionalRemoved(inner_path, hash_id, size)
             # Re-add to hashfield if we have other file with the same hash_id
             if self.isDownloaded(hash_id=hash_id, force_check_db=True):
@@ -155,6 +147,7 @@ class ContentManagerPlugin(object):
         content_db = self.contents.db
         site_id = content_db.site_ids[self.site.address]
         content_db.execute("UPDATE file_optional SET is_pinned = %d WHERE ?" % is_pinned, {"site_id": site_id, "inner_path": inner_path})
+        content_db.optional_used_bytes = None
         self.cache_is_pinned = {}
 
     def optionalDelete(self, inner_path):
@@ -156,3 +156,63 @@ class TestOptionalManager:
         assert not site.content_manager.isPinned("data/img/zerotalk-upvote.png")
         assert site.content_manager.isPinned("data/img/zerotalk-upvote-new.png")
         assert site.storage.isFile("data/img/zerotalk-upvote-new.png")
+
+    def testUpdatePeerNumbers(self, site):
+        contents = site.content_manager.contents
+        site.storage.verifyFiles(quick_check=True)
+        contents.db.updatePeerNumbers()  # First update after start checks every file
+
+        def getPeerNum(inner_path):
+            return contents.db.execute("SELECT peer FROM file_optional WHERE ?", {"inner_path": inner_path}).fetchone()["peer"]
+
+        is_downloaded = contents.db.execute(
+            "SELECT is_downloaded FROM file_optional WHERE inner_path = 'data/img/zeroid.png'"
+        ).fetchone()["is_downloaded"]
+        assert getPeerNum("data/img/zeroid.png") == is_downloaded
+
+        hash_id = site.content_manager.hashfield.getHashId(contents["content.json"]["files_optional"]["data/img/zeroid.png"]["sha512"])
+        peer = site.addPeer("1.2.3.4", 15441)
+        peer.hashfield.appendHashId(hash_id)
+        assert hash_id in site.hash_id_peer_nums_changed
+        contents.db.updatePeerNumbers()
+        assert not site.hash_id_peer_nums_changed
+        assert getPeerNum("data/img/zeroid.png") == is_downloaded + 1
+
+        peer.remove()
+        contents.db.updatePeerNumbers()
+        assert getPeerNum("data/img/zeroid.png") == is_downloaded
+
+    def testOptionalEviction(self, site):
+        site.settings["own"] = False  # Files of owned sites are never deleted
+        site.storage.verifyFiles(quick_check=True)
+        content_db = site.content_manager.contents.db
+
+        used_bytes = content_db.getOptionalUsedBytes()
+        assert used_bytes > 0
+        assert len(content_db.planOptionalEviction(1)) == 1
+
+        plan = content_db.planOptionalEviction(used_bytes)
+        assert sum(row["size"] for row in plan) == used_bytes
+        assert len(set(row["file_id"] for row in plan)) == len(plan)
+        assert all(site.content_manager.isDownloaded(row["inner_path"]) for row in plan)
+
+        # Pinned files are not counted and not deleted
+        site.content_manager.setPin(plan[0]["inner_path"], True)
+        assert content_db.getOptionalUsedBytes() == used_bytes - plan[0]["size"]
+        assert plan[0]["file_id"] not in [row["file_id"] for row in content_db.planOptionalEviction(used_bytes)]
+
+    def testUpdateFileOptionalStats(self, site):
+        content_db = site.content_manager.contents.db
+        site_id = content_db.site_ids[site.address]
+        row_before = content_db.execute("SELECT * FROM file_optional WHERE ?", {"inner_path": "data/optional.txt"}).fetchone()
+
+        content_db.updateFileOptionalStats([
+            (site_id, "data/optional.txt", 1000, 0),
+            (site_id, "data/not-exist.txt", 1000, 100)
+        ])
+        content_db.updateFileOptionalStats([(site_id, "data/optional.txt", 0, 1234)])
+        content_db.updateFileOptionalStats([(site_id, "data/optional.txt", 0, 1000)])
+
+        row = content_db.execute("SELECT * FROM file_optional WHERE ?", {"inner_path": "data/optional.txt"}).fetchone()
+        assert row["time_accessed"] == max(1000, row_before["time_accessed"])
+        assert row["uploaded"] == row_before["uploaded"] + 2234
@@ -11,6 +11,7 @@ from Plugin import PluginManager
 class ContentDbPlugin(object):
     def __init__(self, *args, **kwargs):
         atexit.register(self.saveAllPeers)
+        self.peers_saved = {}  # Site address: {peer key: state of the peer's row in the db}
         super(ContentDbPlugin, self).__init__(*args, **kwargs)
 
     def getSchema(self):
@@ -40,9 +41,16 @@ class ContentDbPlugin(object):
         res = self.execute("SELECT * FROM peer WHERE site_id = :site_id", {"site_id": site_id})
         num = 0
         num_hashfield = 0
+        peers_saved = {}
         for row in res:
             peer = site.addPeer(str(row["address"]), row["port"])
-            if not peer:  # Already exist
+            if not peer:  # Already exist or blacklisted: Keep the state of the row to update or delete it on save
+                if row["hashfield"]:
+                    hashfield_changed = "unknown"  # Not equal to any peer's, so the hashfield is written on save
+                else:
+                    hashfield_changed = None
+                key = "%s:%s" % (row["address"], row["port"])
+                peers_saved[key] = (row["reputation"], row["time_added"], row["time_found"], hashfield_changed)
                 continue
             if row["hashfield"]:
                 peer.hashfield.replaceFromBytes(row["hashfield"])
@@ -52,46 +60,123 @@ class ContentDbPlugin(object):
             peer.reputation = row["reputation"]
             if row["address"].endswith(".onion"):
                 peer.reputation = peer.reputation / 2 - 1 # Onion peers less likely working
+            peers_saved[peer.key] = self.getPeerState(peer)  # Lowered onion reputation is not written back
             num += 1
+        self.peers_saved[site.address] = peers_saved
         if num_hashfield:
             site.content_manager.has_optional_files = True
         site.log.debug("%s peers (%s with hashfield) loaded in %.3fs" % (num, num_hashfield, time.time() - s))
 
+    # Return: Values of the peer that are stored in the db, the hashfield is represented by its modification time
+    def getPeerState(self, peer):
+        if peer.has_hashfield:
+            hashfield_changed = peer.hashfield.time_changed
+        else:
+            hashfield_changed = None
+        return (peer.reputation, int(peer.time_added), int(peer.time_found), hashfield_changed)
+
+    def getPeerRow(self, site_id, key, peer):
+        address, port = key.rsplit(":", 1)
+        if peer.has_hashfield:
+            hashfield = sqlite3.Binary(peer.hashfield.tobytes())
+        else:
+            hashfield = ""
+        return (site_id, address, port, hashfield, peer.reputation, int(peer.time_added), int(peer.time_found))
+
     def iteratePeers(self, site):
         site_id = self.site_ids.get(site.address)
         for key, peer in list(site.peers.items()):
-            address, port = key.rsplit(":", 1)
-            if peer.has_hashfield:
-                hashfield = sqlite3.Binary(peer.hashfield.tobytes())
+            yield self.getPeerRow(site_id, key, peer)
+
+    # Write every peer of the site, used if we don't know what is in the db
+    def savePeersFull(self, site, peers_state):
+        site_id = self.site_ids.get(site.address)
+        cur = self.getCursor()
+        cur.execute("DELETE FROM peer WHERE site_id = :site_id", {"site_id": site_id})
+        cur.executemany(
+            "INSERT INTO peer (site_id, address, port, hashfield, reputation, time_added, time_found) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [self.getPeerRow(site_id, key, peer) for key, peer in peers_state]
+        )
+        return len(peers_state)
+
+    # Write only the added, removed and modified peers since the last save
+    def savePeersChanged(self, site, peers_state, peers_saved):
+        site_id = self.site_ids.get(site.address)
+        peer_keys = set()
+        rows_hashfield = []  # New peers and peers with modified hashfield
+        rows_info = []  # Peers with only modified reputation or times
+        for key, peer, state in peers_state:
+            peer_keys.add(key)
+            state_saved = peers_saved.get(key)
+            if state_saved == state:
+                continue
+            if not state_saved or state_saved[3] != state[3]:
+                rows_hashfield.append(self.getPeerRow(site_id, key, peer))
             else:
-                hashfield = ""
-            yield (site_id, address, port, hashfield, peer.reputation, int(peer.time_added), int(peer.time_found))
+                address, port = key.rsplit(":", 1)
+                rows_info.append((peer.reputation, int(peer.time_added), int(peer.time_found), site_id, address, port))
+        rows_removed = [
+            (site_id,) + tuple(key.rsplit(":", 1))
+            for key in peers_saved if key not in peer_keys
+        ]
+
+        cur = self.getCursor()
+        if rows_removed:
+            cur.executemany("DELETE FROM peer WHERE site_id = ? AND address = ? AND port = ?", rows_removed)
+        if rows_hashfield:
+            if sqlite3.sqlite_version_info >= (3, 24, 0):
+                cur.executemany(
+                    "INSERT INTO peer (site_id, address, port, hashfield, reputation, time_added, time_found) VALUES (?, ?, ?, ?, ?, ?, ?) " +
+                    "ON CONFLICT (site_id, address, port) DO UPDATE SET " +
+                    "hashfield = excluded.hashfield, reputation = excluded.reputation, " +
+                    "time_added = excluded.time_added, time_found = excluded.time_found",
+                    rows_hashfield
+                )
+            else:  # No upsert support in sqlite < 3.24
+                cur.executemany(
+                    "INSERT OR REPLACE INTO peer (site_id, address, port, hashfield, reputation, time_added, time_found) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows_hashfield
+                )
+        if rows_info:
+            cur.executemany(
+                "UPDATE peer SET reputation = ?, time_added = ?, time_found = ? WHERE site_id = ? AND address = ? AND port = ?",
+                rows_info
+            )
+        return len(rows_removed) + len(rows_hashfield) + len(rows_info)
 
-    def savePeers(self, site, spawn=False):
+    # Return: Number of written peer rows
+    def savePeers(self, site, spawn=False, full=False):
         if spawn:
             # Save peers every hour (+random some secs to not update very site at same time)
             site.greenlet_manager.spawnLater(60 * 60 + random.randint(0, 60), self.savePeers, site, spawn=True)
         if not site.peers:
             site.log.debug("Peers not saved: No peers found")
-            return
+            return 0
         s = time.time()
-        site_id = self.site_ids.get(site.address)
-        cur = self.getCursor()
+        peers_state = [(key, peer, self.getPeerState(peer)) for key, peer in list(site.peers.items())]
+        peers_saved = self.peers_saved.get(site.address)
         try:
-            cur.execute("DELETE FROM peer WHERE site_id = :site_id", {"site_id": site_id})
-            cur.executemany(
-                "INSERT INTO peer (site_id, address, port, hashfield, reputation, time_added, time_found) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                self.iteratePeers(site)
-            )
+            if full or peers_saved is None:
+                num = self.savePeersFull(site, [(key, peer) for key, peer, state in peers_state])
+            else:
+                num = self.savePeersChanged(site, peers_state, peers_saved)
         except Exception as err:
             site.log.error("Save peer error: %s" % err)
-        site.log.debug("Peers saved in %.3fs" % (time.time() - s))
+            self.peers_saved.pop(site.address, None)  # Unknown db state: Rewrite everything next time
+            return 0
+        self.peers_saved[site.address] = {key: state for key, peer, state in peers_state}
+        site.log.debug("Peers saved in %.3fs (%s/%s changed)" % (time.time() - s, num, len(peers_state)))
+        return num
 
     def initSite(self, site):
         super(ContentDbPlugin, self).initSite(site)
         site.greenlet_manager.spawnLater(0.5, self.loadPeers, site)
         site.greenlet_manager.spawnLater(60*60, self.savePeers, site, spawn=True)
 
+    def deleteSite(self, site):
+        self.peers_saved.pop(site.address, None)
+        return super(ContentDbPlugin, self).deleteSite(site)
+
     def saveAllPeers(self):
         for site in list(self.sites.values()):
             try:
@@ -8,6 +8,7 @@ import json
 import io
 import urllib
 import urllib.parse
+import collections
 
 import gevent
 
@@ -24,7 +25,13 @@ from .ZipStream import ZipStream
 plugin_dir = os.path.dirname(__file__)
 media_dir = plugin_dir + "/media"
 
-loc_cache = {}
+if "loc_cache" not in locals():
+    loc_cache = collections.OrderedDict()  # Key: ip, Value: (time added, location or None), least recently used first
+loc_cache_size = 10000
+loc_cache_ttl = 60 * 60 * 24
+if "geodb_reader" not in locals():
+    geodb_reader = None  # Shared between websocket connections
+    geodb_reader_key = None  # (path, mtime) of the opened database
 if "_" not in locals():
     _ = Translate(plugin_dir + "/languages/")
 
@@ -651,20 +658,19 @@ class UiWebsocketPlugin(object):
         ])
 
     def getLoc(self, geodb, ip):
-        global loc_cache
+        cached = loc_cache.get(ip)
+        if cached and time.time() - cached[0] < loc_cache_ttl:
+            loc_cache.move_to_end(ip)
+            return cached[1]
 
-        if ip in loc_cache:
-            return loc_cache[ip]
-        else:
-            try:
-                loc_data = geodb.get(ip)
-            except:
-                loc_data = None
-
-            if not loc_data or "location" not in loc_data:
-                loc_cache[ip] = None
-                return None
+        try:
+            loc_data = geodb.get(ip)
+        except:
+            loc_data = None
 
+        if not loc_data or "location" not in loc_data:
+            loc = None
+        else:
             loc = {
                 "lat": loc_data["location"]["latitude"],
                 "lon": loc_data["location"]["longitude"],
@@ -675,8 +681,38 @@ class UiWebsocketPlugin(object):
             if "country" in loc_data:
                 loc["country"] = loc_data["country"]["names"]["en"]
 
-            loc_cache[ip] = loc
-            return loc
+        loc_cache[ip] = (time.time(), loc)
+        loc_cache.move_to_end(ip)
+        while len(loc_cache) > loc_cache_size:
+            loc_cache.popitem(last=False)
+        return loc
+
+    # Return: Location of every ip, looking up each distinct ip only once
+    def getLocs(self, geodb, ips):
+        locs = {}
+        for ip in ips:
+            if ip not in locs:
+                locs[ip] = self.getLoc(geodb, ip)
+        return locs
+
+    # Return: GeoIP database reader, opened memory mapped once and reused until the file changes
+    def getGeoipReader(self):
+        global geodb_reader, geodb_reader_key
+        import maxminddb
+
+        db_path = self.getGeoipDb()
+        if not db_path:
+            return None
+
+        reader_key = (str(db_path), os.path.getmtime(db_path))
+        if not geodb_reader or geodb_reader_key != reader_key:
+            if geodb_reader:
+                geodb_reader.close()
+            self.log.debug("Opening GeoIP database: %s" % db_path)
+            geodb_reader = maxminddb.open_database(str(db_path), maxminddb.MODE_MMAP)
+            geodb_reader_key = reader_key
+            loc_cache.clear()
+        return geodb_reader
 
     @util.Noparallel()
     def getGeoipDb(self):
@@ -701,16 +737,14 @@ class UiWebsocketPlugin(object):
         return None
 
     def getPeerLocations(self, peers):
-        import maxminddb
-
-        db_path = self.getGeoipDb()
-        if not db_path:
+        geodb = self.getGeoipReader()
+        if not geodb:
             self.log.debug("Not showing peer locations: no GeoIP database")
             return False
 
-        geodb = maxminddb.open_database(db_path)
-
         peers = list(peers.values())
+        my_ips = self.site.connection_server.ip_external_list
+        locs = self.getLocs(geodb, [peer.ip for peer in peers] + list(my_ips))
         # Place bars
         peer_locations = []
         placed = {}  # Already placed bars here
@@ -720,7 +754,7 @@ class UiWebsocketPlugin(object):
                 ping = round(peer.connection.last_ping_delay * 1000)
             else:
                 ping = None
-            loc = self.getLoc(geodb, peer.ip)
+            loc = locs[peer.ip]
 
             if not loc:
                 continue
@@ -741,9 +775,9 @@ class UiWebsocketPlugin(object):
             peer_locations.append(peer_location)
 
         # Append myself
-        for ip in self.site.connection_server.ip_external_list:
-            my_loc = self.getLoc(geodb, ip)
-            if my_loc:
+        for ip in my_ips:
+            if locs[ip]:
+                my_loc = dict(locs[ip])  # Don't modify the cached location
                 my_loc["ping"] = 0
                 peer_locations.append(my_loc)
 
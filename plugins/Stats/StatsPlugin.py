@@ -39,6 +39,7 @@ class UiRequestPlugin(object):
     def renderHead(self):
         import main
         from Crypt import CryptConnection
+        from Crypt import CryptBitcoin
 
         # Memory
         yield f'{config.version_full} | '
@@ -53,6 +54,7 @@ class UiRequestPlugin(object):
         )
         yield "Peerid: %s  | " % main.file_server.peer_id
         yield "Time: %.2fs | " % main.file_server.getTimecorrection()
+        yield "Verify cache hit: %.0f%% | " % (CryptBitcoin.get_sign_address_cache_stats()["hit_rate"] * 100)
         yield "Blocks: %s" % Debug.num_block
 
         try:
@@ -244,6 +246,28 @@ class UiRequestPlugin(object):
         yield "</div>"
         yield "<div style='clear: both'></div>"
 
+    def renderLatency(self):
+        import main
+        waiting = main.file_server.getWaitingRequestsStats()
+        yield "<br><br><b>Waiting requests</b>: %s on %s connections (max: %s, peak: %s)<br>" % (
+            waiting["num"], waiting["connections"], waiting["max"], waiting["peak"]
+        )
+        for title, stat_latency in [("Sent commands latency", main.file_server.stat_latency_sent), ("Received commands latency", main.file_server.stat_latency_recv)]:
+            yield "<br><b>%s</b> (<a href='/StatsJson'>json</a>):<br>" % title
+            yield "<table><tr> <th>command</th> <th>num</th> <th>avg</th> <th>p50</th> <th>p90</th> <th>p99</th> <th>max</th> </tr>"
+            for cmd, histogram in sorted(stat_latency.items(), key=lambda i: i[1].num, reverse=True):
+                stats = histogram.getStats()
+                yield self.formatTableRow([
+                    ("%s", cmd),
+                    ("%s", stats["num"]),
+                    ("%.3fs", stats["avg"]),
+                    ("%.3fs", stats["p50"]),
+                    ("%.3fs", stats["p90"]),
+                    ("%.3fs", stats["p99"]),
+                    ("%.3fs", stats["max"])
+                ])
+            yield "</table>"
+
     def renderMemory(self):
         import gc
         from Ui import UiRequest
@@ -387,8 +411,8 @@ class UiRequestPlugin(object):
             self.renderDbStats(),
             self.renderSites(),
             self.renderBigfiles(),
-            self.renderRequests()
-
+            self.renderRequests(),
+            self.renderLatency()
         ]
 
         for part in itertools.chain(*renderers):
@@ -401,6 +425,31 @@ class UiRequestPlugin(object):
         gc.collect()  # Implicit grabage collection
         yield "Done in %.1f" % (time.time() - s)
 
+    # /StatsJson entry point: Machine-readable connection stats
+    @helper.encodeResponse
+    def actionStatsJson(self):
+        import main
+        from Crypt import CryptBitcoin
+
+        if "Multiuser" in PluginManager.plugin_manager.plugin_names and not config.multiuser_local:
+            return self.error403("This function is disabled on this proxy")
+
+        file_server = main.file_server
+        stats = {
+            "time": time.time(),
+            "connections": len(file_server.connections),
+            "bytes_recv": file_server.bytes_recv,
+            "bytes_sent": file_server.bytes_sent,
+            "waiting_requests": file_server.getWaitingRequestsStats(),
+            "sent": {cmd: dict(stat) for cmd, stat in file_server.stat_sent.items()},
+            "recv": {cmd: dict(stat) for cmd, stat in file_server.stat_recv.items()},
+            "latency_sent": {cmd: histogram.getStats() for cmd, histogram in file_server.stat_latency_sent.items()},
+            "latency_recv": {cmd: histogram.getStats() for cmd, histogram in file_server.stat_latency_recv.items()},
+            "verify_cache": CryptBitcoin.get_sign_address_cache_stats()
+        }
+        self.sendHeader(content_type="application/json")
+        return json.dumps(stats, indent=1)
+
     @helper.encodeResponse
     def actionDumpobj(self):
 
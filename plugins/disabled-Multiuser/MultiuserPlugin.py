@@ -16,7 +16,8 @@ def importPluginnedClasses():
     from User import UserManager
 
 try:
-    local_master_addresses = set(json.load((config.private_dir / 'users.json').open()).keys())  # Users in users.json
+    from User.UserDb import getUserDb
+    local_master_addresses = set(getUserDb().getAddresses())  # Users in users.db
 except Exception as err:
     local_master_addresses = set()
 
@@ -2,14 +2,14 @@ import pytest
 import json
 from Config import config
 from User import UserManager
+from User.UserDb import getUserDb
 
 @pytest.mark.usefixtures("resetSettings")
 @pytest.mark.usefixtures("resetTempSettings")
 class TestMultiuser:
     def testMemorySave(self, user):
         # It should not write users to disk
-        users_json = config.private_dir / 'users.json'
-        users_before = users_json.open().read()
+        users_before = getUserDb().getUsers()
         user = UserManager.user_manager.create()
         user.save()
-        assert users_json.open().read() == users_before
+        assert getUserDb().getUsers() == users_before
@@ -27,7 +27,7 @@ class UserManagerPlugin(object):
 
 @PluginManager.registerTo("User")
 class UserPlugin(object):
-    # In multiuser mode users data only exits in memory, dont write to data/user.json
+    # In multiuser mode users data only exits in memory, dont write to private/users.db
     def save(self):
         if not config.multiuser_local:
             return False
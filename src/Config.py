@@ -5,6 +5,7 @@ import platform
 import locale
 import re
 import configparser
+import importlib.util
 import logging
 import logging.handlers
 import stat
@@ -238,6 +239,11 @@ class Config:
 
         use_openssl = True
 
+        if importlib.util.find_spec("orjson"):  # Optional dependency
+            json_lib = "orjson"
+        else:
+            json_lib = "json"
+
         if repr(1483108852.565) != "1483108852.565":  # Fix for weird Android issue
             fix_float_decimals = True
         else:
@@ -385,6 +391,8 @@ class Config:
         self.parser.add_argument('--ui-host', help='Allow access using this hosts', metavar='host', nargs='*')
         self.parser.add_argument('--ui-trans-proxy', help='Allow access using a transparent proxy', action='store_true')
 
+        self.parser.add_argument('--ui-update-rate', help='Max number of frequent site info updates sent to web interface per second', default=5, type=int, metavar='limit')
+
         self.parser.add_argument('--open-browser', help='Open homepage in web browser automatically',
                                  nargs='?', const="default_browser", metavar='browser_name')
         self.parser.add_argument('--homepage', help='Web interface Homepage', default='191CazMVNaAcT9Y1zhkxd9ixMBPs59g2um',
@@ -418,6 +426,7 @@ class Config:
         self.parser.add_argument('--trackers-file', help='Load torrent trackers dynamically from a file (using Syncronite by default)', default=['{data_dir}/15CEFKBRHFfAP9rmL6hhLmHoXrrgmw4B5o/cache/1/Syncronite.html'], metavar='path', nargs='*')
         self.parser.add_argument('--trackers-proxy', help='Force use proxy to connect to trackers (disable, tor, ip:port)', default="disable")
         self.parser.add_argument('--use-libsecp256k1', help='Use Libsecp256k1 liblary for speedup', type='bool', choices=[True, False], default=True)
+        self.parser.add_argument('--verify-cache-size', help='Number of recovered signature addresses to cache (0: disable)', default=10000, type=int, metavar="num")
         self.parser.add_argument('--use-openssl', help='Use OpenSSL liblary for speedup', type='bool', choices=[True, False], default=True)
         self.parser.add_argument('--openssl-lib-file', help='Path for OpenSSL library file (default: detect)', default=argparse.SUPPRESS, metavar="path")
         self.parser.add_argument('--openssl-bin-file', help='Path for OpenSSL binary file (default: detect)', default=argparse.SUPPRESS, metavar="path")
@@ -434,6 +443,7 @@ class Config:
                                  type='bool', choices=[True, False], default=False)
         self.parser.add_argument('--stream-downloads', help='Stream download directly to files (experimental)',
                                  type='bool', choices=[True, False], default=False)
+        self.parser.add_argument('--json-lib', help='Library used for parsing json files (json: Python built-in)', choices=["orjson", "json"], default=json_lib)
         self.parser.add_argument('--msgpack-purepython', help='Use less memory, but a bit more CPU power',
                                  type='bool', choices=[True, False], default=False)
         self.parser.add_argument('--fix-float-decimals', help='Fix content.json modification date float precision on verification',
@@ -427,12 +427,8 @@ class Connection(object):
                 self.crypt = crypt
 
         if self.type == "in" and handshake.get("onion") and not self.ip_type == "onion":  # Set incoming connection's onion address
-            if self.server.ips.get(self.ip) == self:
-                del self.server.ips[self.ip]
-            self.setIp(handshake["onion"] + ".onion")
+            self.server.changeConnectionIp(self, handshake["onion"] + ".onion")
             self.log("Changing ip to %s" % self.ip)
-            self.server.ips[self.ip] = self
-            self.updateName()
 
         self.event_connected.set(True)  # Mark handshake as done
         self.event_connected = None
@@ -582,10 +578,15 @@ class Connection(object):
         data = {"cmd": cmd, "req_id": self.req_id, "params": params}
         event = gevent.event.AsyncResult()  # Create new event for response
         self.waiting_requests[self.req_id] = {"evt": event, "cmd": cmd}
+        if len(self.waiting_requests) > self.server.stat_waiting_requests_peak:
+            self.server.stat_waiting_requests_peak = len(self.waiting_requests)
         if stream_to:
             self.waiting_streams[self.req_id] = stream_to
+        s = time.time()
         self.send(data)  # Send request
         res = event.get()  # Wait until event solves
+        if res:
+            self.server.stat_latency_sent[cmd].record(time.time() - s)
         return res
 
     def ping(self):
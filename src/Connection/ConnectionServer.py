@@ -11,6 +11,7 @@ from gevent.pool import Pool
 
 import util
 from util import helper
+from util.Histogram import Histogram
 from Debug import Debug
 from .Connection import Connection
 from Config import config
@@ -51,6 +52,9 @@ class ConnectionServer(object):
 
         self.stat_recv = defaultdict(lambda: defaultdict(int))
         self.stat_sent = defaultdict(lambda: defaultdict(int))
+        self.stat_latency_sent = defaultdict(Histogram)  # Request -> response time of sent commands
+        self.stat_latency_recv = defaultdict(Histogram)  # Processing time of received commands
+        self.stat_waiting_requests_peak = 0
         self.bytes_recv = 0
         self.bytes_sent = 0
         self.num_recv = 0
@@ -58,6 +62,8 @@ class ConnectionServer(object):
 
         self.num_incoming = 0
         self.num_outgoing = 0
+        self.num_connections_in = 0  # Number of incoming connections in self.connections
+        self.num_connections_onion = 0  # Number of onion connections in self.connections
         self.had_external_incoming = False
 
         self.timecorrection = 0.0
@@ -154,7 +160,7 @@ class ConnectionServer(object):
             self.ip_incoming[ip] = 1
 
         connection = Connection(self, ip, port, sock)
-        self.connections.append(connection)
+        self.addConnection(connection, incoming=True)
         if ip not in config.ip_local:
             self.ips[ip] = connection
         connection.handleIncomingConnection(sock)
@@ -162,6 +168,16 @@ class ConnectionServer(object):
     def handleMessage(self, *args, **kwargs):
         pass
 
+    # Return: Current number of requests waiting for response
+    def getWaitingRequestsStats(self):
+        waiting = [len(connection.waiting_requests) for connection in self.connections]
+        return {
+            "num": sum(waiting),
+            "max": max(waiting, default=0),
+            "connections": len([num for num in waiting if num]),
+            "peak": self.stat_waiting_requests_peak
+        }
+
     def getConnection(self, ip=None, port=None, peer_id=None, create=True, site=None, is_tracker_connection=False):
         ip_type = helper.getIpType(ip)
         has_per_site_onion = (ip_type == 'onion' or self.port_opened.get(ip_type, None) == False) and self.tor_manager.start_onions and site
@@ -213,7 +229,7 @@ class ConnectionServer(object):
                     connection = Connection(self, ip, port, is_tracker_connection=is_tracker_connection)
                 self.num_outgoing += 1
                 self.ips[key] = connection
-                self.connections.append(connection)
+                self.addConnection(connection)
                 connection.log("Connecting... (site: %s)" % site)
                 succ = connection.connect()
                 if not succ:
@@ -231,6 +247,23 @@ class ConnectionServer(object):
         else:
             return None
 
+    def addConnection(self, connection, incoming=False):
+        self.connections.append(connection)
+        if incoming:
+            self.num_connections_in += 1
+        if connection.ip_type == "onion":
+            self.num_connections_onion += 1
+
+    # Re-register the connection when the ip changes (eg. to the onion address of an incoming connection)
+    def changeConnectionIp(self, connection, ip):
+        if self.ips.get(connection.ip) == connection:
+            del self.ips[connection.ip]
+        is_onion_before = connection.ip_type == "onion"
+        connection.setIp(ip)
+        if connection in self.connections and is_onion_before != (connection.ip_type == "onion"):
+            self.num_connections_onion += 1 if connection.ip_type == "onion" else -1
+        self.ips[ip] = connection
+
     def removeConnection(self, connection):
         # Delete if same as in registry
         if self.ips.get(connection.ip) == connection:
@@ -245,6 +278,10 @@ class ConnectionServer(object):
 
         if connection in self.connections:
             self.connections.remove(connection)
+            if connection.type == "in":
+                self.num_connections_in -= 1
+            if connection.ip_type == "onion":
+                self.num_connections_onion -= 1
 
     def checkConnections(self):
         run_i = 0
@@ -4,6 +4,7 @@ from Db.Db import Db, DbTableError
 from Config import config
 from Plugin import PluginManager
 from Debug import Debug
+from util import helper
 
 
 @PluginManager.acceptPlugins
@@ -79,8 +80,44 @@ class ContentDb(Db):
             "schema_changed": 1
         }
 
+        # Hash of site files at the time of signing to avoid re-hashing not modified files
+        schema["tables"]["file_hash"] = {
+            "cols": [
+                ["site_id", "INTEGER REFERENCES site (site_id) ON DELETE CASCADE"],
+                ["inner_path", "TEXT"],
+                ["size", "INTEGER"],
+                ["mtime_ns", "INTEGER"],
+                ["sha512", "TEXT"]
+            ],
+            "indexes": [
+                "CREATE UNIQUE INDEX file_hash_key ON file_hash (site_id, inner_path)"
+            ],
+            "schema_changed": 2
+        }
+
         return schema
 
+    # Return: Cached sha512 of the file if its size and modification time not changed since hashing
+    def getFileHash(self, site, inner_path, size, mtime_ns):
+        row = self.execute(
+            "SELECT sha512 FROM file_hash WHERE ?",
+            {"site_id": self.site_ids.get(site.address, 0), "inner_path": inner_path, "size": size, "mtime_ns": mtime_ns}
+        ).fetchone()
+        if row:
+            return row["sha512"]
+        else:
+            return None
+
+    def setFileHash(self, site, inner_path, size, mtime_ns, sha512):
+        self.execute(
+            "INSERT OR REPLACE INTO file_hash ?",
+            {"site_id": self.needSite(site), "inner_path": inner_path, "size": size, "mtime_ns": mtime_ns, "sha512": sha512}
+        )
+
+    def deleteFileHashes(self, site, inner_paths):
+        if inner_paths:
+            self.execute("DELETE FROM file_hash WHERE ?", {"site_id": self.site_ids.get(site.address, 0), "inner_path": inner_paths})
+
     def initSite(self, site):
         self.sites[site.address] = site
 
@@ -111,6 +148,13 @@ class ContentDb(Db):
         })
 
     def deleteContent(self, site, inner_path):
+        content = site.content_manager.contents.get(inner_path)
+        if content:
+            content_inner_dir = helper.getDirname(inner_path)
+            self.deleteFileHashes(site, [
+                content_inner_dir + relative_inner_path
+                for relative_inner_path in list(content.get("files", {}).keys()) + list(content.get("files_optional", {}).keys())
+            ])
         self.execute("DELETE FROM content WHERE ?", {"site_id": self.site_ids.get(site.address, 0), "inner_path": inner_path})
 
     def loadDbDict(self, site):
@@ -15,6 +15,7 @@ from Config import config
 from util import helper
 from util import Diff
 from util import SafeRe
+from util import Json
 from Peer import PeerHashfield
 from .ContentDbDict import ContentDbDict
 from Plugin import PluginManager
@@ -45,7 +46,7 @@ class ContentManager:
         self.site = site
         self.log = self.site.log
         self.contents = ContentDbDict(site)
-        self.hashfield = PeerHashfield()
+        self.hashfield = PeerHashfield(on_changed=site.onHashfieldChanged)
         self.has_optional_files = False
 
     def addBadCert(self, sign):
@@ -64,7 +65,7 @@ class ContentManager:
 
         # Load hashfield cache
         if "hashfield" in self.site.settings.get("cache", {}):
-            self.hashfield.frombytes(base64.b64decode(self.site.settings["cache"]["hashfield"]))
+            self.hashfield.replaceFromBytes(base64.b64decode(self.site.settings["cache"]["hashfield"]))
             del self.site.settings["cache"]["hashfield"]
         elif self.contents.get("content.json") and self.site.settings["size_optional"] > 0:
             self.site.storage.updateBadFiles()  # No hashfield cache created yet
@@ -614,14 +615,21 @@ class ContentManager:
     def hashFile(self, dir_inner_path, file_relative_path, optional=False):
         back = {}
         file_inner_path = dir_inner_path + "/" + file_relative_path
+        hash_inner_path = (dir_inner_path.rstrip("/") + "/" + file_relative_path).lstrip("/")  # Without the double slashes
 
         file_path = self.site.storage.getPath(file_inner_path)
-        file_size = os.path.getsize(file_path)
-        sha512sum = CryptHash.sha512sum(file_path)  # Calculate sha512 sum of file
+        file_stat = os.stat(file_path)
+        file_size = file_stat.st_size
+        sha512sum = self.contents.db.getFileHash(self.site, hash_inner_path, file_size, file_stat.st_mtime_ns)
+        if not sha512sum:
+            sha512sum = CryptHash.sha512sum(file_path)  # Calculate sha512 sum of file
+            # Files modified in the last 2 sec could change again without changing the mtime
+            if time.time_ns() - file_stat.st_mtime_ns > 2 * 1000000000:
+                self.contents.db.setFileHash(self.site, hash_inner_path, file_size, file_stat.st_mtime_ns, sha512sum)
         if optional and not self.hashfield.hasHash(sha512sum):
             self.optionalDownloaded(file_inner_path, self.hashfield.getHashId(sha512sum), file_size, own=True)
 
-        back[file_relative_path] = {"sha512": sha512sum, "size": os.path.getsize(file_path)}
+        back[file_relative_path] = {"sha512": sha512sum, "size": file_size}
         return back
 
     def isValidRelativePath(self, relative_path):
@@ -728,6 +736,13 @@ class ContentManager:
             helper.getDirname(inner_path), content.get("ignore"), content.get("optional")
         )
 
+        # Forget the cached hashes of the removed files
+        self.contents.db.deleteFileHashes(self.site, [
+            inner_directory + file_relative_path
+            for file_relative_path in list(content.get("files", {}).keys()) + list(content.get("files_optional", {}).keys())
+            if file_relative_path not in files_node and file_relative_path not in files_optional_node
+        ])
+
         if not remove_missing_optional:
             for file_inner_path, file_details in content.get("files_optional", {}).items():
                 if file_inner_path not in files_optional_node:
@@ -791,7 +806,7 @@ class ContentManager:
         if "sign" in new_content:
             del(new_content["sign"])  # Delete old sign (backward compatibility)
 
-        sign_content = json.dumps(new_content, sort_keys=True)
+        sign_content = Json.dumpsCanonical(new_content)
         sign = CryptBitcoin.sign(sign_content, privatekey)
         # new_content["signs"] = content.get("signs", {}) # TODO: Multisig
         if sign:  # If signing is successful (not an old address)
@@ -832,18 +847,29 @@ class ContentManager:
     def getSignsRequired(self, inner_path, content=None):
         return 1  # Todo: Multisig
 
+    def getCertSubject(self, user_address, user_auth_type, user_name):
+        return f'{user_address}#{user_auth_type}/{user_name}'
+
     def verifyCertSign(self, user_address, user_auth_type, user_name, issuer_address, sign):
-        cert_subject = f'{user_address}#{user_auth_type}/{user_name}'
+        cert_subject = self.getCertSubject(user_address, user_auth_type, user_name)
         return CryptBitcoin.verify(cert_subject, issuer_address, sign)
 
     def verifyCert(self, inner_path, content):
+        cert_sign_item = self.getCertSignItem(inner_path, content)
+        if not cert_sign_item:
+            return True  # Does not need cert
+        cert_subject, cert_address, cert_sign = cert_sign_item
+        return CryptBitcoin.verify(cert_subject, cert_address, cert_sign)
+
+    # Return: (cert subject, cert signer address, cert sign) or None if the file does not need cert
+    def getCertSignItem(self, inner_path, content):
         rules = self.getRules(inner_path, content)
 
         if not rules:
             raise VerifyError("No rules for this file")
 
         if not rules.get("cert_signers") and not rules.get("cert_signers_pattern"):
-            return True  # Does not need cert
+            return None  # Does not need cert
 
         if "cert_user_id" not in content:
             raise VerifyError("Missing cert_user_id")
@@ -859,7 +885,22 @@ class ContentManager:
             else:
                 raise VerifyError("Invalid cert signer: %s" % domain)
 
-        return self.verifyCertSign(rules["user_address"], content["cert_auth_type"], name, cert_address, content["cert_sign"])
+        cert_subject = self.getCertSubject(rules["user_address"], content["cert_auth_type"], name)
+        return (cert_subject, cert_address, content["cert_sign"])
+
+    # Return: Data that the signs of the content.json signed
+    def getSignContent(self, new_content):
+        sign_content = Json.dumpsCanonical(new_content)  # Dump the json to string to remove whitepsace
+
+        # Fix float representation error on Android
+        modified = new_content["modified"]
+        if config.fix_float_decimals and type(modified) is float and not str(modified).endswith(".0"):
+            modified_fixed = "{:.6f}".format(modified).strip("0.")
+            sign_content = sign_content.replace(
+                '"modified": %s' % repr(modified),
+                '"modified": %s' % modified_fixed
+            )
+        return sign_content
 
     # Checks if the content.json content is valid
     # Return: True or False
@@ -963,7 +1004,7 @@ class ContentManager:
                     new_content = file
                 else:
                     try:
-                        new_content = json.load(file)
+                        new_content = Json.load(file)
                     except Exception as err:
                         raise VerifyError(f"Invalid json file: {err}")
                 if inner_path in self.contents:
@@ -990,16 +1031,7 @@ class ContentManager:
                 if "signs" in new_content:
                     del(new_content["signs"])  # The file signed without the signs
 
-                sign_content = json.dumps(new_content, sort_keys=True)  # Dump the json to string to remove whitepsace
-
-                # Fix float representation error on Android
-                modified = new_content["modified"]
-                if config.fix_float_decimals and type(modified) is float and not str(modified).endswith(".0"):
-                    modified_fixed = "{:.6f}".format(modified).strip("0.")
-                    sign_content = sign_content.replace(
-                        '"modified": %s' % repr(modified),
-                        '"modified": %s' % modified_fixed
-                    )
+                sign_content = self.getSignContent(new_content)
 
                 if signs:  # New style signing
                     valid_signers = self.getValidSigners(inner_path, new_content)
@@ -1035,7 +1067,13 @@ class ContentManager:
         else:  # Check using sha512 hash
             file_info = self.getFileInfo(inner_path)
             if file_info:
-                if CryptHash.sha512sum(file) != file_info.get("sha512", ""):
+                file_hash = None
+                if hasattr(file, "getSha512"):  # Hashed while downloading
+                    file_hash = file.getSha512()
+                    file.seek(0, 2)
+                if not file_hash:
+                    file_hash = CryptHash.sha512sum(file)
+                if file_hash != file_info.get("sha512", ""):
                     raise VerifyError("Invalid hash")
 
                 if file_info.get("size", 0) != file.tell():
@@ -3,12 +3,15 @@ import base64
 import binascii
 import time
 import hashlib
+import threading
 
+from collections import OrderedDict
 from collections.abc import Container
 from typing import Optional
 
 from util.Electrum import dbl_format
 from Config import config
+from Crypt import Crypt
 
 import util.OpensslFindPatch
 
@@ -83,14 +86,72 @@ def sign(data: str, privatekey: str) -> str:
         hash=dbl_format
     )).decode()
 
-def get_sign_address_64(data: str, sign: str, lib_verify=None) -> Optional[str]:
-    """Returns pubkey/address of signer if any"""
-    if not lib_verify:
-        lib_verify = lib_verify_best
-
+# Recovered signer addresses, least recently used first
+# The recovered address does not depend on the library, so lib_verify is not part of the key
+sign_address_cache = OrderedDict()  # Key: (sha256 of data, sign), Value: signer address
+sign_address_cache_stats = {"hit": 0, "miss": 0}
+sign_address_cache_lock = threading.Lock()  # Also used from the crypt thread pool
+
+def get_sign_address_cache_stats() -> dict:
+    """Returns size and hit rate of the signer address cache"""
+    num_lookup = sign_address_cache_stats["hit"] + sign_address_cache_stats["miss"]
+    return {
+        "size": len(sign_address_cache),
+        "size_limit": config.verify_cache_size,
+        "hit": sign_address_cache_stats["hit"],
+        "miss": sign_address_cache_stats["miss"],
+        "hit_rate": sign_address_cache_stats["hit"] / num_lookup if num_lookup else 0.0
+    }
+
+def clear_sign_address_cache():
+    with sign_address_cache_lock:
+        sign_address_cache.clear()
+        sign_address_cache_stats["hit"] = 0
+        sign_address_cache_stats["miss"] = 0
+
+def get_sign_address_64(data: str, sign: str, lib_verify=None, use_cache=True) -> Optional[str]:
+    """Returns pubkey/address of signer if any
+
+    Same data and sign always recovers the same address, so the results are
+    kept in a bounded LRU cache (size set by --verify-cache-size)
+    """
     if not sign:
         return None
 
+    if not use_cache or config.verify_cache_size <= 0:
+        return recover_sign_address_64(data, sign, lib_verify)
+
+    cache_key = get_sign_address_cache_key(data, sign)
+    sign_address = get_cached_sign_address(cache_key)
+    if sign_address is None:
+        sign_address = recover_sign_address_64(data, sign, lib_verify)
+        set_cached_sign_address(cache_key, sign_address)
+    return sign_address
+
+def get_sign_address_cache_key(data: str, sign: str) -> tuple:
+    return (hashlib.sha256(data.encode("utf8")).digest(), sign)
+
+def get_cached_sign_address(cache_key: tuple) -> Optional[str]:
+    with sign_address_cache_lock:
+        sign_address = sign_address_cache.get(cache_key)
+        if sign_address is None:
+            sign_address_cache_stats["miss"] += 1
+        else:
+            sign_address_cache_stats["hit"] += 1
+            sign_address_cache.move_to_end(cache_key)
+    return sign_address
+
+def set_cached_sign_address(cache_key: tuple, sign_address: str):
+    with sign_address_cache_lock:
+        sign_address_cache[cache_key] = sign_address
+        while len(sign_address_cache) > config.verify_cache_size:
+            sign_address_cache.popitem(last=False)
+
+def recover_sign_address_64(data: str, sign: str, lib_verify=None) -> str:
+    """Recovers address of signer from the signature"""
+    if not lib_verify:
+        lib_verify = lib_verify_best
+
     if lib_verify == "libsecp256k1":
         sign_address = libsecp256k1message.recover_address(data.encode("utf8"), sign).decode("utf8")
     elif lib_verify in ("sslcrypto", "sslcrypto_fallback"):
@@ -101,16 +162,68 @@ def get_sign_address_64(data: str, sign: str, lib_verify=None) -> Optional[str]:
 
     return sign_address
 
+@Crypt.thread_pool_crypt.wrap
+def recover_sign_addresses_64(datas_signs: list, lib_verify=None) -> list:
+    """Recovers the signer addresses of multiple (data, sign) pairs in one crypt thread call
+
+    None is returned for the invalid signatures
+    """
+    if not lib_verify:
+        lib_verify = lib_verify_best
+
+    sign_addresses = []
+    for data, sign in datas_signs:
+        try:
+            sign_addresses.append(recover_sign_address_64(data, sign, lib_verify))
+        except Exception:
+            sign_addresses.append(None)
+    return sign_addresses
+
+def verifyMany(items: list, lib_verify=None, use_cache=True) -> list:
+    """Verify multiple [(data, addresses, sign), ...] items, return list of bools
+
+    Signatures not in the cache are recovered in a single call to the crypt thread pool
+    """
+    use_cache = use_cache and config.verify_cache_size > 0
+    sign_addresses = [None] * len(items)
+    cache_keys = {}
+    to_recover = []  # Index of items to recover
+    for i, (data, addresses, sign) in enumerate(items):
+        if not sign:
+            continue
+        if use_cache:
+            cache_keys[i] = get_sign_address_cache_key(data, sign)
+            sign_addresses[i] = get_cached_sign_address(cache_keys[i])
+        if sign_addresses[i] is None:
+            to_recover.append(i)
+
+    if to_recover:
+        recovered = recover_sign_addresses_64([(items[i][0], items[i][2]) for i in to_recover], lib_verify)
+        for i, sign_address in zip(to_recover, recovered):
+            sign_addresses[i] = sign_address
+            if use_cache and sign_address:
+                set_cached_sign_address(cache_keys[i], sign_address)
+
+    back = []
+    for (data, addresses, sign), sign_address in zip(items, sign_addresses):
+        if not sign_address:
+            back.append(False)
+        elif isinstance(addresses, str):
+            back.append(sign_address == addresses)
+        else:
+            back.append(sign_address in addresses)
+    return back
+
 def verify(*args, **kwargs):
     """Default verify, see verify64"""
     return verify64(*args, **kwargs)
 
-def verify64(data: str, addresses: str | Container[str], sign: str, lib_verify=None) -> bool:
+def verify64(data: str, addresses: str | Container[str], sign: str, lib_verify=None, use_cache=True) -> bool:
     """Verify that sign is a valid signature for data by one of addresses
 
     Expecting signature to be in base64
     """
-    sign_address = get_sign_address_64(data, sign, lib_verify)
+    sign_address = get_sign_address_64(data, sign, lib_verify, use_cache=use_cache)
 
     if isinstance(addresses, str):
         return sign_address == addresses
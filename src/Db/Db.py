@@ -17,6 +17,7 @@ import gevent
 from Debug import Debug
 from .DbCursor import DbCursor
 from util import SafeRe
+from util import Json
 from util import helper
 from util import ThreadPool
 from Config import config
@@ -377,7 +378,7 @@ class Db(object):
                 if file_path.endswith("json.gz"):
                     file = helper.limitedGzipFile(fileobj=file)
 
-                data = json.load(file)
+                data = Json.load(file)
         except Exception as err:
             self.log.debug("Json file %s load error: %s" % (file_path, err))
             data = {}
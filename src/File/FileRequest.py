@@ -1,7 +1,6 @@
 # Included modules
 import os
 import time
-import json
 import collections
 import itertools
 
@@ -12,6 +11,7 @@ from Debug import Debug
 from Config import config
 from util import RateLimit
 from util import Msgpack
+from util import Json
 from util import helper
 from Plugin import PluginManager
 from contextlib import closing
@@ -88,14 +88,15 @@ class FileRequest(object):
                     time.sleep(self.connection.cpu_time)
                     if self.connection.cpu_time > 5:
                         self.connection.close("Cpu time: %.3fs" % self.connection.cpu_time)
-                s = time.time()
+            s = time.time()
             if func:
                 func(params)
             else:
                 self.actionUnknown(cmd, params)
+            taken = time.time() - s
+            self.server.stat_latency_recv[cmd].record(taken)
 
             if cmd not in ["getFile", "streamFile"]:
-                taken = time.time() - s
                 taken_sent = self.connection.last_sent_time - self.connection.last_send_time
                 self.connection.cpu_time += taken - taken_sent
 
@@ -134,7 +135,7 @@ class FileRequest(object):
 
         if should_validate_content:
             try:
-                content = json.loads(body.decode())
+                content = Json.loads(body)
             except Exception as err:
                 site.log.debug("Update for %s is invalid JSON: %s" % (inner_path, err))
                 self.response({"error": "File invalid JSON"})
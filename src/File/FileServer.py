@@ -253,6 +253,13 @@ class FileServer(ConnectionServer):
                 self.tor_manager.startOnions()
 
         if not sites_checking:
+            # Get the connections of the active sites before checking them one by one
+            sites_active = [
+                site for site in self.sites.values()
+                if site.isServing() and time.time() - site.settings.get("modified", 0) < 60 * 60 * 24 * 7
+            ]
+            self.warmupConnections(sites_active)
+
             check_pool = gevent.pool.Pool(5)
             # Check sites integrity
             for site in sorted(list(self.sites.values()), key=lambda site: site.settings.get("modified", 0), reverse=True):
@@ -264,6 +271,68 @@ class FileServer(ConnectionServer):
                     check_thread.join(timeout=5)
         self.log.debug("Checksites done in %.3fs" % (time.time() - s))
 
+    # Most active sites first: opened in browser, then recently modified
+    def getSitePriority(self, site):
+        return (bool(site.websockets), site.settings.get("modified", 0))
+
+    # Connect sites to their peers in parallel, the most active sites first
+    # A peer shared by multiple sites is connected once and the connection is used for all of them
+    # Return: {site: Number of connected peers}
+    def warmupConnections(self, sites, check_site_on_reconnect=False, concurrency=20):
+        s = time.time()
+        sites = sorted(sites, key=self.getSitePriority, reverse=True)
+        connected = {}
+        need = {}
+        peer_groups = {}  # Key: ip:port, Value: Peer objects of the sites that need more connections
+        for site in sites:
+            connected[site] = len(site.getConnectedPeers())
+            need[site] = site.getConnectionsNeeded()
+            if connected[site] >= need[site]:
+                continue
+            for peer in site.getRecentPeers(30):
+                if peer.connection and peer.connection.connected:
+                    continue
+                peer_groups.setdefault(peer.key, []).append(peer)
+        connected_before = dict(connected)
+
+        def warmupPeer(peers):
+            for peer in peers:
+                if connected[peer.site] >= need[peer.site]:
+                    continue
+                peer.pex()  # Initiate peer exchange, re-uses the connection made for the previous site
+                if peer.connection and peer.connection.connected:
+                    connected[peer.site] += 1  # Successfully connected
+                else:
+                    break  # Not connectable, don't try it for the other sites
+
+        pool = gevent.pool.Pool(concurrency)
+        for peers in peer_groups.values():  # Peers of higher priority sites first
+            if all(connected[peer.site] >= need[peer.site] for peer in peers):
+                continue
+            pool.spawn(warmupPeer, peers)
+        pool.join()
+
+        for site in sites:
+            if check_site_on_reconnect and connected_before[site] == 0 and connected[site] > 0 and self.has_internet:
+                gevent.spawn(site.update, check_files=False)
+
+        self.log.debug(
+            "Connection warmup of %s sites using %s peers done in %.3fs, connections: %s -> %s" %
+            (len(sites), len(peer_groups), time.time() - s, sum(connected_before.values()), sum(connected.values()))
+        )
+        return connected
+
+    def maintainSite(self, site):
+        if site.peers:
+            with gevent.Timeout(10, exception=False):
+                site.announcer.announcePex()
+
+        # Last check modification failed
+        if site.content_updated is False:
+            site.update()
+        elif site.bad_files:
+            site.retryBadFiles()
+
     def cleanupSites(self):
         import gc
         startup = True
@@ -285,31 +354,25 @@ class FileServer(ConnectionServer):
 
                 time.sleep(1)  # Prevent too quick request
 
-            peers_protected = set([])
-            for address, site in list(self.sites.items()):
-                if not site.isServing():
-                    continue
+            sites_serving = [site for site in self.sites.values() if site.isServing()]
 
-                if site.peers:
-                    with gevent.Timeout(10, exception=False):
-                        site.announcer.announcePex()
+            # Keep active connections if site has been modified witin 7 days
+            sites_active = [site for site in sites_serving if time.time() - site.settings.get("modified", 0) < 60 * 60 * 24 * 7]
+            connected = self.warmupConnections(sites_active, check_site_on_reconnect=True)
 
-                # Last check modification failed
-                if site.content_updated is False:
-                    site.update()
-                elif site.bad_files:
-                    site.retryBadFiles()
-
-                if time.time() - site.settings.get("modified", 0) < 60 * 60 * 24 * 7:
-                    # Keep active connections if site has been modified witin 7 days
-                    connected_num = site.needConnections(check_site_on_reconnect=True)
-
-                    if connected_num < config.connected_limit:  # This site has small amount of peers, protect them from closing
-                        peers_protected.update([peer.key for peer in site.getConnectedPeers()])
+            peers_protected = set([])
+            for site, connected_num in connected.items():
+                if connected_num < config.connected_limit:  # This site has small amount of peers, protect them from closing
+                    peers_protected.update([peer.key for peer in site.getConnectedPeers()])
 
-                time.sleep(1)  # Prevent too quick request
+            maintain_pool = gevent.pool.Pool(5)
+            for site in sorted(sites_serving, key=self.getSitePriority, reverse=True):
+                maintain_pool.spawn(self.maintainSite, site)
+                time.sleep(0.2)  # Prevent too quick request
+            maintain_pool.join()
 
             site = None
+            sites_serving = sites_active = connected = None
             gc.collect()  # Explicit garbage collection
             startup = False
             time.sleep(60 * 20)
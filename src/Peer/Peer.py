@@ -21,7 +21,7 @@ if config.use_tempfiles:
 @PluginManager.acceptPlugins
 class Peer(object):
     __slots__ = (
-        "ip", "port", "site", "key", "connection", "connection_server", "time_found", "time_response", "time_hashfield",
+        "ip", "port", "site", "key", "_connection", "connection_server", "time_found", "time_response", "time_hashfield",
         "time_added", "has_hashfield", "is_tracker_connection", "time_my_hashfield_sent", "last_ping", "reputation",
         "last_content_json_update", "hashfield", "connection_error", "hash_failed", "download_bytes", "download_time"
     )
@@ -32,7 +32,7 @@ class Peer(object):
         self.site = site
         self.key = "%s:%s" % (ip, port)
 
-        self.connection = None
+        self._connection = None
         self.connection_server = connection_server
         self.has_hashfield = False  # Lazy hashfield object not created yet
         self.time_hashfield = None  # Last time peer's hashfiled downloaded
@@ -53,11 +53,31 @@ class Peer(object):
     def __getattr__(self, key):
         if key == "hashfield":
             self.has_hashfield = True
-            self.hashfield = PeerHashfield()
+            if self.site:
+                self.hashfield = PeerHashfield(on_changed=self.onHashfieldChanged)
+            else:
+                self.hashfield = PeerHashfield()
             return self.hashfield
         else:
             return getattr(self, key)
 
+    def onHashfieldChanged(self, added_hash_ids, removed_hash_ids):
+        self.site.onHashfieldChanged(added_hash_ids, removed_hash_ids, peer=self)
+
+    # Keep the connected peer counter of the site up to date
+    @property
+    def connection(self):
+        return self._connection
+
+    @connection.setter
+    def connection(self, connection):
+        if bool(connection) != bool(self._connection) and self.site and self.site.peers.get(self.key) is self:
+            if connection:
+                self.site.peers_connected += 1
+            else:
+                self.site.peers_connected -= 1
+        self._connection = connection
+
     def log(self, text):
         if not config.verbose:
             return  # Only log if we are in debug mode
@@ -188,7 +208,7 @@ class Peer(object):
         return None  # Failed after 3 attempts
 
     # Get a file content from peer
-    def getFile(self, site, inner_path, file_size=None, pos_from=0, pos_to=None, streaming=False):
+    def getFile(self, site, inner_path, file_size=None, pos_from=0, pos_to=None, streaming=False, buff=None):
         if file_size and file_size > 5 * 1024 * 1024:
             max_read_size = 1024 * 1024
         else:
@@ -201,10 +221,11 @@ class Peer(object):
 
         location = pos_from
 
-        if config.use_tempfiles:
-            buff = tempfile.SpooledTemporaryFile(max_size=16 * 1024, mode='w+b')
-        else:
-            buff = io.BytesIO()
+        if buff is None:
+            if config.use_tempfiles:
+                buff = tempfile.SpooledTemporaryFile(max_size=16 * 1024, mode='w+b')
+            else:
+                buff = io.BytesIO()
 
         s = time.time()
         while True:  # Read in smaller parts
@@ -384,12 +405,17 @@ class Peer(object):
     # Stop and remove from site
     def remove(self, reason="Removing"):
         self.log("Removing peer...Connection error: %s, Hash failed: %s" % (self.connection_error, self.hash_failed))
-        if self.site and self.key in self.site.peers:
+        if self.site and self.site.peers.get(self.key) is self:
             del(self.site.peers[self.key])
+            self.site.onPeerRemoved(self)
 
         if self.site and self in self.site.peers_recent:
             self.site.peers_recent.remove(self)
 
+        if self.has_hashfield and self.hashfield.on_changed:  # The peer's optional files are no longer available
+            self.hashfield.on_changed([], set(self.hashfield.storage))
+            self.hashfield.on_changed = None
+
         if self.connection:
             self.connection.close(reason)
 
@@ -3,10 +3,11 @@ import time
 
 
 class PeerHashfield(object):
-    __slots__ = ("storage", "time_changed", "append", "remove", "tobytes", "frombytes", "__len__", "__iter__")
-    def __init__(self):
+    __slots__ = ("storage", "time_changed", "on_changed", "append", "remove", "tobytes", "frombytes", "__len__", "__iter__")
+    def __init__(self, on_changed=None):
         self.storage = self.createStorage()
         self.time_changed = time.time()
+        self.on_changed = on_changed  # Called with (added hash_ids, removed hash_ids) on modification
 
     def createStorage(self):
         storage = array.array("H")
@@ -23,6 +24,8 @@ class PeerHashfield(object):
         if hash_id not in self.storage:
             self.storage.append(hash_id)
             self.time_changed = time.time()
+            if self.on_changed:
+                self.on_changed([hash_id], [])
             return True
         else:
             return False
@@ -31,6 +34,8 @@ class PeerHashfield(object):
         if hash_id not in self.storage:
             self.storage.append(hash_id)
             self.time_changed = time.time()
+            if self.on_changed:
+                self.on_changed([hash_id], [])
             return True
         else:
             return False
@@ -40,6 +45,8 @@ class PeerHashfield(object):
         if hash_id in self.storage:
             self.storage.remove(hash_id)
             self.time_changed = time.time()
+            if self.on_changed and hash_id not in self.storage:
+                self.on_changed([], [hash_id])
             return True
         else:
             return False
@@ -48,6 +55,8 @@ class PeerHashfield(object):
         if hash_id in self.storage:
             self.storage.remove(hash_id)
             self.time_changed = time.time()
+            if self.on_changed and hash_id not in self.storage:
+                self.on_changed([], [hash_id])
             return True
         else:
             return False
@@ -59,9 +68,13 @@ class PeerHashfield(object):
         return int(hash[0:4], 16) in self.storage
 
     def replaceFromBytes(self, hashfield_raw):
+        hash_ids_before = set(self.storage)
         self.storage = self.createStorage()
         self.storage.frombytes(hashfield_raw)
         self.time_changed = time.time()
+        if self.on_changed:
+            hash_ids = set(self.storage)
+            self.on_changed(hash_ids - hash_ids_before, hash_ids_before - hash_ids)
 
 if __name__ == "__main__":
     field = PeerHashfield()
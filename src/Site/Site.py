@@ -31,6 +31,9 @@ from . import SiteManager
 
 @PluginManager.acceptPlugins
 class Site(object):
+    # Events that only signal a state change, intermediate ones can be skipped
+    websocket_coalesced_events = ("file_started", "peers_added", "peernumber_updated")
+
 
     def __init__(self, address, allow_create=True, settings=None):
         self.address = str(re.sub("[^A-Za-z0-9]", "", address))  # Make sure its correct address
@@ -44,6 +47,8 @@ class Site(object):
         self.content = None  # Load content.json
         self.peers = {}  # Key: ip:port, Value: Peer.Peer
         self.peers_recent = collections.deque(maxlen=150)
+        self.peers_onion = 0  # Number of onion peers in self.peers
+        self.peers_connected = 0  # Number of peers in self.peers with connection
         self.peer_blacklist = SiteManager.peer_blacklist  # Ignore this peers (eg. myself)
         self.greenlet_manager = GreenletManager.GreenletManager()  # Running greenlets
         self.worker_manager = WorkerManager(self)  # Handle site download from other peers
@@ -52,9 +57,15 @@ class Site(object):
         self.notifications = []  # Pending notifications displayed once on page load [error|ok|info, message, timeout]
         self.page_requested = False  # Page viewed in browser
         self.websockets = []  # Active site websocket connections
+        self.websocket_updated = 0  # Last time the site info sent to websockets
+        self.websocket_update_pending = {}  # Coalesced updates waiting to be sent by event name (None: without event)
+        self.websocket_update_thread = None
 
         self.connection_server = None
-        self.loadSettings(settings)  # Load settings from sites.json
+        self.hash_id_peer_nums = collections.Counter()  # Optional file hash_id: Number of peers (including us) having it
+        self.hash_id_peer_nums_changed = set()  # Hash_ids with changed peer number since the last db update
+        self.hash_id_peers = {}  # Optional file hash_id: {peer: None, ...} of the peers having it
+        self.loadSettings(settings)  # Load settings from sites.db
         self.storage = SiteStorage(self, allow_create=allow_create)  # Save and load site files
         self.content_manager = ContentManager(self)
         self.content_manager.loadContents()  # Load content.json files
@@ -84,14 +95,16 @@ class Site(object):
     def __repr__(self):
         return "<%s>" % self.__str__()
 
-    # Load site settings from data/sites.json
+    # Load site settings from private/sites.db
     def loadSettings(self, settings=None):
         if not settings:
             try:
-                with (config.private_dir / 'sites.json').open() as f:
-                    settings = json.load(f).get(self.address)
+                settings_db = SiteManager.site_manager.getSettingsDb()
+                settings = settings_db.getSettings(self.address)
+                if settings:
+                    settings["cache"] = settings_db.getCache(self.address)
             except Exception as err:
-                logging.error(f'Error loading {config.private_dir}/sites.json: {err}')
+                logging.error(f'Error loading site settings of {self.address}: {err}')
                 settings = {}
         if settings:
             self.settings = settings
@@ -122,7 +135,7 @@ class Site(object):
 
         return
 
-    # Save site settings to data/sites.json
+    # Save site settings to private/sites.db
     def saveSettings(self):
         if not SiteManager.site_manager.sites:
             SiteManager.site_manager.sites = {}
@@ -832,6 +845,30 @@ class Site(object):
             else:
                 return task["evt"]
 
+    # Update the number of peers having the optional files on peer or my hashfield change
+    # peer: The peer whose hashfield changed, None for my hashfield
+    def onHashfieldChanged(self, added_hash_ids, removed_hash_ids, peer=None):
+        hash_id_peer_nums = self.hash_id_peer_nums
+        for hash_id in added_hash_ids:
+            hash_id_peer_nums[hash_id] += 1
+        for hash_id in removed_hash_ids:
+            hash_id_peer_nums[hash_id] -= 1
+            if hash_id_peer_nums[hash_id] <= 0:
+                del hash_id_peer_nums[hash_id]
+        self.hash_id_peer_nums_changed.update(added_hash_ids)
+        self.hash_id_peer_nums_changed.update(removed_hash_ids)
+
+        if peer:  # Keep the hash_id -> peers index up to date
+            hash_id_peers = self.hash_id_peers
+            for hash_id in added_hash_ids:
+                hash_id_peers.setdefault(hash_id, {})[peer] = None
+            for hash_id in removed_hash_ids:
+                peers = hash_id_peers.get(hash_id)
+                if peers and peer in peers:
+                    del peers[peer]
+                    if not peers:
+                        del hash_id_peers[hash_id]
+
     # Add or update a peer to site
     # return_peer: Always return the peer even if it was already present
     def addPeer(self, ip, port, return_peer=False, connection=None, source="other"):
@@ -851,21 +888,41 @@ class Site(object):
                 return False  # Ignore blacklist (eg. myself)
             peer = Peer(ip, port, self)
             self.peers[key] = peer
+            self.onPeerAdded(peer)
             peer.found(source)
             return peer
 
+    # Update the peer counters after a peer added to or removed from self.peers
+    def onPeerAdded(self, peer):
+        if peer.ip.endswith(".onion"):
+            self.peers_onion += 1
+        if peer.connection:
+            self.peers_connected += 1
+        SiteManager.site_manager.addPeerKey(peer)
+
+    def onPeerRemoved(self, peer):
+        if peer.ip.endswith(".onion"):
+            self.peers_onion -= 1
+        if peer.connection:
+            self.peers_connected -= 1
+        SiteManager.site_manager.removePeerKey(peer)
+
     def announce(self, *args, **kwargs):
         if self.isServing():
             self.announcer.announce(*args, **kwargs)
 
     # Keep connections to get the updates
-    def needConnections(self, num=None, check_site_on_reconnect=False):
+    # Return: Number of connected peers the site should keep
+    def getConnectionsNeeded(self, num=None):
         if num is None:
             if len(self.peers) < 50:
                 num = 3
             else:
                 num = 6
-        need = min(len(self.peers), num, config.connected_limit)  # Need 5 peer, but max total peers
+        return min(len(self.peers), num, config.connected_limit)  # Need 5 peer, but max total peers
+
+    def needConnections(self, num=None, check_site_on_reconnect=False):
+        need = self.getConnectionsNeeded(num)
 
         connected = len(self.getConnectedPeers())
 
@@ -1075,6 +1132,9 @@ class Site(object):
         self.worker_manager.running = False
         num_workers = self.worker_manager.stopWorkers()
         SiteManager.site_manager.delete(self.address)
+        for peer in list(self.peers.values()):
+            self.onPeerRemoved(peer)
+        self.peers = {}
         self.content_manager.contents.db.deleteSite(self)
         self.updateWebsocket(deleted=True)
         self.storage.deleteFiles()
@@ -1102,8 +1162,51 @@ class Site(object):
             param = {"event": list(kwargs.items())[0]}
         else:
             param = None
-        for ws in self.websockets:
-            ws.event("siteChanged", self, param)
+
+        if not self.websockets:
+            return
+
+        # Frequent state-only updates: send the latest one at most ui_update_rate per second
+        if param is None or param["event"][0] in self.websocket_coalesced_events:
+            interval = 1.0 / config.ui_update_rate
+            time_left = interval - (time.time() - self.websocket_updated)
+            if time_left > 0:
+                if param:  # Keep the last param of every event
+                    self.websocket_update_pending[param["event"][0]] = param
+                else:  # Never replaces a pending event, they also send the site info
+                    self.websocket_update_pending.setdefault(None, None)
+                if not self.websocket_update_thread:
+                    self.websocket_update_thread = gevent.spawn_later(time_left, self.updateWebsocketPending)
+                return
+
+        self.websocket_updated = time.time()
+        self.broadcastWebsocket(param)
+
+    def updateWebsocketPending(self):
+        self.websocket_update_thread = None
+        self.websocket_updated = time.time()
+        pending = self.websocket_update_pending
+        self.websocket_update_pending = {}
+        params = [param for param in pending.values() if param]
+        for param in params or [None]:
+            self.broadcastWebsocket(param)
+
+    # Send siteChanged event with this site's info to the websockets
+    # Site info formatted and json encoded once for every permission class / user
+    def broadcastWebsocket(self, param=None, websockets=None):
+        if websockets is None:
+            websockets = self.websockets
+        site_info_encoded = {}
+        for ws in websockets[:]:
+            if "siteChanged" not in ws.channels:
+                continue
+            key = ws.getSiteInfoKey()
+            if key not in site_info_encoded:
+                site_info = ws.formatSiteInfo(self, create_user=False)
+                if param:  # Extra data
+                    site_info.update(param)
+                site_info_encoded[key] = json.dumps(site_info)
+            ws.cmdEncoded("setSiteInfo", site_info_encoded[key])
 
     def messageWebsocket(self, message, type="info", progress=None):
         for ws in self.websockets:
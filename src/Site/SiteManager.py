@@ -4,6 +4,7 @@ import re
 import os
 import time
 import atexit
+import collections
 
 import gevent
 
@@ -23,11 +24,15 @@ class SiteManager(object):
         self.log.debug("SiteManager created.")
         self.sites = {}
         self.sites_changed = int(time.time())
+        self.sites_deleted = set()
+        self.sites_saved = {}  # Hash of the last saved settings by site address
         self.loaded = False
+        self.peer_keys = collections.Counter()  # Number of sites the peer is added to by ip:port
+        self.num_peers_onion = 0  # Number of unique onion peers
         gevent.spawn(self.saveTimer)
         atexit.register(lambda: self.save(recalculate_size=True))
 
-    # Load all sites from data/sites.json
+    # Load all sites from private/sites.db
     @util.Noparallel()
     def load(self, cleanup=True, startup=False):
         from .Site import Site
@@ -38,20 +43,22 @@ class SiteManager(object):
         load_s = time.time()
         # Load new adresses
         try:
-            json_path = config.private_dir / 'sites.json'
-            data = json.load(open(json_path))
+            settings_db = self.getSettingsDb()
+            addresses = settings_db.getAddresses()
         except Exception as err:
-            self.log.error(f"Unable to load {json_path}: {err}")
-            data = {}
+            self.log.error(f"Unable to load site settings: {err}")
+            addresses = []
 
         sites_need = []
 
-        for address, settings in data.items():
+        for address in addresses:
             if address not in self.sites:
+                settings = settings_db.getSettings(address)
                 if (config.data_dir / address / 'content.json').is_file():
                     # Root content.json exists, try load site
                     s = time.time()
                     try:
+                        settings["cache"] = settings_db.getCache(address)
                         site = Site(address, settings=settings)
                         site.content_manager.contents.get("content.json")
                     except Exception as err:
@@ -62,7 +69,7 @@ class SiteManager(object):
                     added += 1
                 elif startup:
                     # No site directory, start download
-                    self.log.debug("Found new site in sites.json: %s" % address)
+                    self.log.debug("Found new site in site settings: %s" % address)
                     sites_need.append([address, settings])
                     added += 1
 
@@ -101,36 +108,55 @@ class SiteManager(object):
     def saveDelayed(self):
         RateLimit.callAsync("Save sites.json", allowed_again=5, func=self.save)
 
+    def getSettingsDb(self):
+        from .SiteSettingsDb import getSiteSettingsDb
+        return getSiteSettingsDb()
+
+    # Save the settings of the sites changed since the last save
+    # Settings are often modified directly, so every site is compared to its last saved state and only the changed rows written
     def save(self, recalculate_size=False):
-        if not self.sites:
+        if not self.sites and not self.sites_deleted:
             self.log.debug("Save skipped: No sites found")
             return
         if not self.loaded:
             self.log.debug("Save skipped: Not loaded")
             return
         s = time.time()
-        data = {}
-        # Generate data file
-        s = time.time()
-        for address, site in list(self.list().items()):
+        addresses = list(self.list().keys())
+
+        # Generate data rows
+        rows = []
+        for address in addresses:
+            site = self.sites.get(address)
+            if not site:
+                continue
             if recalculate_size:
                 site.settings["size"], site.settings["size_optional"] = site.content_manager.getTotalSize()  # Update site size
-            data[address] = site.settings
-            data[address]["cache"] = site.getSettingsCache()
+            settings_json = json.dumps({key: val for key, val in site.settings.items() if key != "cache"}, sort_keys=True)
+            cache_json = json.dumps(site.getSettingsCache(), sort_keys=True)
+            site.settings["cache"] = {}  # Remove cache from site settings
+            row_hash = hash((settings_json, cache_json))
+            if self.sites_saved.get(address) == row_hash:
+                continue  # Not changed since last save
+            rows.append((address, settings_json, cache_json))
+            self.sites_saved[address] = row_hash
         time_generate = time.time() - s
 
         s = time.time()
-        if data:
-            helper.atomicWrite(config.private_dir / 'sites.json', helper.jsonDumps(data).encode("utf8"))
-        else:
-            self.log.debug("Save error: No data")
+        settings_db = self.getSettingsDb()
+        for address in self.sites_deleted:
+            settings_db.deleteSite(address)
+            self.sites_saved.pop(address, None)
+        self.sites_deleted = set()
+        if rows:
+            settings_db.saveSites(rows)
+        settings_db.commit("Saved sites")
         time_write = time.time() - s
 
-        # Remove cache from site settings
-        for address, site in self.list().items():
-            site.settings["cache"] = {}
-
-        self.log.debug("Saved sites in %.2fs (generate: %.2fs, write: %.2fs)" % (time.time() - s, time_generate, time_write))
+        self.log.debug(
+            "Saved %s/%s sites in %.2fs (generate: %.2fs, write: %.2fs)" %
+            (len(rows), len(addresses), time_generate + time_write, time_generate, time_write)
+        )
 
     def saveTimer(self):
         while 1:
@@ -206,9 +232,23 @@ class SiteManager(object):
         self.sites_changed = int(time.time())
         self.log.debug("Deleted site: %s" % address)
         del(self.sites[address])
-        # Delete from sites.json
+        self.sites_deleted.add(address)
+        # Delete from site settings
         self.save()
 
+    # Keep the unique peer counters up to date when a peer added to or removed from a site
+    def addPeerKey(self, peer):
+        self.peer_keys[peer.key] += 1
+        if self.peer_keys[peer.key] == 1 and peer.ip.endswith(".onion"):
+            self.num_peers_onion += 1
+
+    def removePeerKey(self, peer):
+        self.peer_keys[peer.key] -= 1
+        if self.peer_keys[peer.key] <= 0:
+            del self.peer_keys[peer.key]
+            if peer.ip.endswith(".onion"):
+                self.num_peers_onion -= 1
+
     # Lazy load sites
     def list(self):
         if not self.loaded:  # Not loaded yet
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+
+from Db.Db import Db
+from Config import config
+from Debug import Debug
+
+
+class SiteSettingsDb(Db):
+    """Per-site storage of sites.json settings
+
+    Every site is a single row, so saving only touches the sites that changed
+    instead of rewriting the settings of all sites.
+    """
+
+    def __init__(self, path):
+        Db.__init__(self, self.getSchema(), path)
+        self.checkTables()
+
+    def getSchema(self):
+        schema = {}
+        schema["db_name"] = "SiteSettings"
+        schema["tables"] = {}
+        schema["tables"]["site_settings"] = {
+            "cols": [
+                ["address", "TEXT PRIMARY KEY NOT NULL"],
+                ["settings", "TEXT"],
+                ["cache", "TEXT"],
+                ["modified", "INTEGER"]
+            ],
+            "schema_changed": 1
+        }
+        return schema
+
+    # Import legacy sites.json, the file renamed to sites.json.bak after import
+    # Return: Number of imported sites
+    def importJson(self, json_path):
+        if not os.path.isfile(json_path):
+            return 0
+        s = time.time()
+        try:
+            with open(json_path) as f:
+                data = json.load(f)
+        except Exception as err:
+            self.log.error("Unable to import %s: %s" % (json_path, Debug.formatException(err)))
+            return 0
+
+        rows = []
+        for address, settings in data.items():
+            cache = settings.pop("cache", {})
+            rows.append((address, json.dumps(settings), json.dumps(cache), int(time.time())))
+        # Sites already in the db are newer than the ones in the legacy file
+        self.getCursor().executemany(
+            "INSERT OR IGNORE INTO site_settings (address, settings, cache, modified) VALUES (?, ?, ?, ?)", rows
+        )
+        self.commit("Imported %s" % json_path)
+        os.replace(json_path, "%s.bak" % json_path)
+        self.log.info("Imported %s sites from %s in %.3fs" % (len(rows), json_path, time.time() - s))
+        return len(rows)
+
+    def getAddresses(self):
+        return [row["address"] for row in self.execute("SELECT address FROM site_settings")]
+
+    # Return: Site settings without the cache or None if not found
+    def getSettings(self, address):
+        row = self.execute("SELECT settings FROM site_settings WHERE ?", {"address": address}).fetchone()
+        if not row:
+            return None
+        return json.loads(row["settings"])
+
+    def getCache(self, address):
+        row = self.execute("SELECT cache FROM site_settings WHERE ?", {"address": address}).fetchone()
+        if not row or not row["cache"]:
+            return {}
+        return json.loads(row["cache"])
+
+    # Save serialized settings
+    # rows: [(address, settings_json, cache_json), ...]
+    def saveSites(self, rows):
+        modified = int(time.time())
+        self.getCursor().executemany(
+            "INSERT OR REPLACE INTO site_settings (address, settings, cache, modified) VALUES (?, ?, ?, ?)",
+            [(address, settings, cache, modified) for address, settings, cache in rows]
+        )
+
+    def deleteSite(self, address):
+        self.execute("DELETE FROM site_settings WHERE ?", {"address": address})
+
+
+site_settings_dbs = {}
+
+
+def getSiteSettingsDb(path=None):
+    if not path:
+        path = config.private_dir / 'sites.db'
+    if path not in site_settings_dbs:
+        site_settings_dbs[path] = SiteSettingsDb(path)
+        site_settings_dbs[path].importJson(os.path.join(os.path.dirname(path), "sites.json"))
+    return site_settings_dbs[path]
@@ -1,9 +1,10 @@
 import os
 import re
 import shutil
-import json
 import time
 import errno
+import hashlib
+import tempfile
 from collections import defaultdict
 
 import sqlite3
@@ -11,6 +12,7 @@ import gevent.event
 
 import util
 from util import SafeRe
+from util import Json
 from Db.Db import Db
 from Debug import Debug
 from Config import config
@@ -24,6 +26,59 @@ thread_pool_fs_read = ThreadPool.ThreadPool(config.threads_fs_read, name="FS rea
 thread_pool_fs_write = ThreadPool.ThreadPool(config.threads_fs_write, name="FS write")
 thread_pool_fs_batch = ThreadPool.ThreadPool(1, name="FS batch")
 
+# Temp files are created with 0600, the downloaded files get the mode of a normally opened file
+file_umask = os.umask(0)
+os.umask(file_umask)
+
+
+# Download target that hashes the data while it's received and is moved
+# to the final place only after verification
+class DownloadFile(object):
+    def __init__(self, file_path):
+        dir_path, file_name = os.path.split(file_path)
+        # Starts with . to skip it on signing
+        fd, self.temp_path = tempfile.mkstemp(prefix=".%s." % file_name, suffix=".download", dir=dir_path)
+        self.file = os.fdopen(fd, "w+b")
+        self.hash = hashlib.sha512()
+        self.hashed_bytes = 0
+        self.committed = False
+
+    def write(self, data):
+        if self.hash and self.file.tell() == self.hashed_bytes:
+            self.hash.update(data)
+            self.hashed_bytes += len(data)
+        else:  # Not a sequential write, fall back to hashing on verify
+            self.hash = None
+        return self.file.write(data)
+
+    # Return: Same as CryptHash.sha512sum of the file or None if not available
+    def getSha512(self):
+        if not self.hash:
+            return None
+        return self.hash.hexdigest()[0:64]
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    # Move the downloaded file to its final place
+    def commit(self, file_path):
+        self.file.close()
+        os.chmod(self.temp_path, 0o666 & ~file_umask)
+        os.replace(self.temp_path, file_path)
+        self.committed = True
+
+    # Remove the temp file if it's not committed
+    def close(self):
+        self.file.close()
+        if not self.committed and os.path.isfile(self.temp_path):
+            os.unlink(self.temp_path)
+
 
 @PluginManager.acceptPlugins
 class SiteStorage(object):
@@ -36,6 +91,7 @@ class SiteStorage(object):
         self.db_checked = False  # Checked db tables since startup
         self.event_db_busy = None  # Gevent AsyncResult if db is working on rebuild
         self.has_db = self.isFile("dbschema.json")  # The site has schema
+        self.download_dirs_checked = set()  # Directories cleaned from the stale downloads since startup
 
         if not os.path.isdir(self.directory):
             if allow_create:
@@ -43,6 +99,29 @@ class SiteStorage(object):
             else:
                 raise Exception("Directory not exists: %s" % self.directory)
 
+    # Remove the temp files of the downloads interrupted by a crash or shutdown
+    @thread_pool_fs_batch.wrap
+    def removeStaleDownloads(self, dir_path, modified_before):
+        num_removed = 0
+        try:
+            file_names = os.listdir(dir_path)
+        except OSError as err:
+            self.log.debug("Error listing %s for stale downloads: %s" % (dir_path, err))
+            return 0
+        for file_name in file_names:
+            if not file_name.startswith(".") or not file_name.endswith(".download"):
+                continue
+            file_path = os.path.join(dir_path, file_name)
+            try:
+                if os.path.getmtime(file_path) < modified_before:  # Not a running download
+                    os.unlink(file_path)
+                    num_removed += 1
+            except OSError as err:
+                self.log.debug("Error removing stale download %s: %s" % (file_path, err))
+        if num_removed:
+            self.log.debug("Removed %s stale download files" % num_removed)
+        return num_removed
+
     def getDbFile(self):
         if self.db:
             return self.db.schema["db_file"]
@@ -268,7 +347,9 @@ class SiteStorage(object):
         # Create dir if not exist
         self.ensureDir(os.path.dirname(inner_path))
         # Write file
-        if hasattr(content, 'read'):  # File-like object
+        if isinstance(content, DownloadFile):  # Downloaded to a temp file next to it
+            content.commit(file_path)
+        elif hasattr(content, 'read'):  # File-like object
 
             with open(file_path, "wb") as file:
                 shutil.copyfileobj(content, file)  # Write buff to disk
@@ -279,6 +360,16 @@ class SiteStorage(object):
                 with open(file_path, "wb") as file:
                     file.write(content)
 
+    # Open a temp file to download the file to, pass it to write() after verification
+    def openDownload(self, inner_path):
+        self.ensureDir(os.path.dirname(inner_path))
+        file_path = self.getPath(inner_path)
+        dir_path = os.path.dirname(file_path)
+        if dir_path not in self.download_dirs_checked:  # Interrupted downloads of the previous runs are next to the new ones
+            self.download_dirs_checked.add(dir_path)
+            gevent.spawn(self.removeStaleDownloads, dir_path, time.time())
+        return DownloadFile(file_path)
+
     # Write content to file
     def write(self, inner_path, content):
         self.writeThread(inner_path, content)
@@ -369,8 +460,8 @@ class SiteStorage(object):
     # Load and parse json file
     @thread_pool_fs_read.wrap
     def loadJson(self, inner_path):
-        with self.open(inner_path, "r", encoding="utf8") as file:
-            return json.load(file)
+        with self.open(inner_path, "rb") as file:
+            return Json.load(file)
 
     # Write formatted json file
     def writeJson(self, inner_path, data):
@@ -431,6 +522,7 @@ class SiteStorage(object):
             self.log.debug("VerifyFile content.json not exists")
             self.site.needFile("content.json", update=True)  # Force update to fix corrupt file
             self.site.content_manager.loadContent()  # Reload content.json
+
         for content_inner_path, content in list(self.site.content_manager.contents.items()):
             back["num_content"] += 1
             i += 1
@@ -94,8 +94,11 @@ class TestConnection:
         assert not client.getConnection(file_server.ip, 1544, peer_id="notexists", create=False)
         connection2 = client.getConnection(file_server.ip, 1544, peer_id=connection.handshake["peer_id"], create=False)
         assert connection2 == connection
+        assert file_server.num_connections_in == len([True for conn in file_server.connections if conn.type == "in"])
 
         connection.close()
+        assert client.connections == []
+        assert client.num_connections_in == client.num_connections_onion == 0
         client.stop()
 
     def testFloodProtection(self, file_server):
@@ -1,12 +1,15 @@
 import json
 import time
 import io
+import os
 
 import pytest
 
 from Crypt import CryptBitcoin
+from Crypt import CryptHash
 from Content.ContentManager import VerifyError, SignError
 from util.SafeRe import UnsafePatternError
+from . import Spy
 
 
 @pytest.mark.usefixtures("resetSettings")
@@ -115,6 +118,41 @@ class TestContent:
             {key: val for key, val in content.items() if key not in ["modified", "signs", "sign", "zeronet_version"]}
         )
 
+    def testSignHashCache(self, site):
+        inner_path = "data/hash-cache-test.txt"
+        site.storage.write(inner_path, b"Hello")
+        file_path = site.storage.getPath(inner_path)
+        os.utime(file_path, (time.time() - 10, time.time() - 10))
+
+        site.content_manager.sign(privatekey=self.privatekey, filewrite=False)  # Fill the cache
+
+        # Not modified files are not hashed again
+        with Spy.Spy(CryptHash, "sha512sum") as calls:
+            content = site.content_manager.sign(privatekey=self.privatekey, filewrite=False)
+        assert len(calls) == 0
+        assert content["files"][inner_path]["sha512"] == CryptHash.sha512sum(file_path)
+
+        # Same size, but modified
+        site.storage.write(inner_path, b"World")
+        os.utime(file_path, (time.time() - 5, time.time() - 5))
+        with Spy.Spy(CryptHash, "sha512sum") as calls:
+            content = site.content_manager.sign(privatekey=self.privatekey, filewrite=False)
+        assert len(calls) == 1
+        assert content["files"][inner_path]["sha512"] == CryptHash.sha512sum(file_path)
+
+        # Hash of the removed file is forgotten on the next sign
+        db = site.content_manager.contents.db
+        site.content_manager.sign(privatekey=self.privatekey)
+        assert db.execute("SELECT * FROM file_hash WHERE ?", {"inner_path": inner_path}).fetchone()
+        site.storage.delete(inner_path)
+        site.content_manager.sign(privatekey=self.privatekey)
+        assert not db.execute("SELECT * FROM file_hash WHERE ?", {"inner_path": inner_path}).fetchone()
+        assert db.execute("SELECT * FROM file_hash WHERE ?", {"inner_path": "index.html"}).fetchone()
+
+        # Removed with the site
+        db.deleteSite(site)
+        assert not db.execute("SELECT * FROM file_hash").fetchone()
+
     def testSignOptionalFiles(self, site):
         for hash in list(site.content_manager.hashfield):
             site.content_manager.hashfield.remove(hash)
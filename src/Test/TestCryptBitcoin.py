@@ -1,4 +1,7 @@
+import threading
+
 from Crypt import CryptBitcoin
+from Config import config
 
 
 class TestCryptBitcoin:
@@ -34,6 +37,69 @@ class TestCryptBitcoin:
         sign_compressed = b'H6YkcFTuwKMVMHI2yycGQIFGbCZVNsZEZvSlOhKpHUt/BlADY94egmDAWdlrbbFrP9wH4aKcEfbLO8sa6f63VU0='
         assert crypt_bitcoin_lib.verify("1NQUem2M4cAqWua6BVFBADtcSP55P4QobM#web/gitcenter", "1KH5BdNnqxh2KRWMMT8wUXzUgz4vVQ4S8p", sign_compressed)
 
+    def testVerifyCache(self, crypt_bitcoin_lib):
+        privatekey = "5K9S6dVpufGnroRgFrT6wsKiz2mJRYsC73eWDmajaHserAp3F1C"
+        address = "1MpDMxFeDUkiHohxx9tbGLeEGEuR4ZNsJz"
+        sign = crypt_bitcoin_lib.sign("hello", privatekey)
+
+        assert crypt_bitcoin_lib.verify("hello", address, sign)
+        assert crypt_bitcoin_lib.verify("hello", address, sign)
+        assert not crypt_bitcoin_lib.verify("hello", "1KH5BdNnqxh2KRWMMT8wUXzUgz4vVQ4S8p", sign)
+        assert not crypt_bitcoin_lib.verify("hello!", address, sign)
+
+        stats = crypt_bitcoin_lib.get_sign_address_cache_stats()
+        assert stats["size"] == 2
+        assert stats["hit"] == 2
+        assert stats["miss"] == 2
+
+    def testVerifyMany(self, crypt_bitcoin_lib):
+        privatekey = "5K9S6dVpufGnroRgFrT6wsKiz2mJRYsC73eWDmajaHserAp3F1C"
+        address = "1MpDMxFeDUkiHohxx9tbGLeEGEuR4ZNsJz"
+        sign_hello = crypt_bitcoin_lib.sign("hello", privatekey)
+        sign_world = crypt_bitcoin_lib.sign("world", privatekey)
+
+        items = [
+            ("hello", address, sign_hello),
+            ("world", address, sign_world),
+            ("hello", "1KH5BdNnqxh2KRWMMT8wUXzUgz4vVQ4S8p", sign_hello),  # Other signer
+            ("hello!", address, sign_hello),  # Modified data
+            ("hello", address, "invalid sign"),
+            ("world", [address, "1KH5BdNnqxh2KRWMMT8wUXzUgz4vVQ4S8p"], sign_world)  # Any of the addresses
+        ]
+        assert crypt_bitcoin_lib.verifyMany(items) == [True, True, False, False, False, True]
+        assert crypt_bitcoin_lib.verifyMany([]) == []
+
+        # Recovered addresses are cached for single verifications
+        stats = crypt_bitcoin_lib.get_sign_address_cache_stats()
+        assert crypt_bitcoin_lib.verify("world", address, sign_world)
+        assert crypt_bitcoin_lib.get_sign_address_cache_stats()["hit"] == stats["hit"] + 1
+
+    def testVerifyCacheThreads(self, crypt_bitcoin_lib):
+        # Lookups and evictions of the crypt pool threads must not break each other
+        verify_cache_size = config.verify_cache_size
+        config.verify_cache_size = 10
+        errors = []
+
+        def useCache(thread_i):
+            try:
+                for i in range(2000):
+                    cache_key = crypt_bitcoin_lib.get_sign_address_cache_key("data %s" % (i % 20), "sign")
+                    if crypt_bitcoin_lib.get_cached_sign_address(cache_key) is None:
+                        crypt_bitcoin_lib.set_cached_sign_address(cache_key, "address %s" % thread_i)
+            except Exception as err:
+                errors.append(err)
+
+        try:
+            threads = [threading.Thread(target=useCache, args=(thread_i,)) for thread_i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            config.verify_cache_size = verify_cache_size
+            crypt_bitcoin_lib.clear_sign_address_cache()
+        assert not errors
+
     def testNewPrivatekey(self):
         assert CryptBitcoin.newPrivatekey() != CryptBitcoin.newPrivatekey()
         assert CryptBitcoin.privatekeyToAddress(CryptBitcoin.newPrivatekey())
@@ -56,3 +56,48 @@ class TestDiff:
         )
         old_f.seek(0)
         assert Diff.patch(old_f, actions).getvalue() == new_f.getvalue()
+
+    def testDiffRolling(self):
+        assert Diff.diff([], ["one", "two", "three"], engine="rolling") == [("+", ["one", "two", "three"])]
+        assert Diff.diff(["one", "two", "three"], [], engine="rolling") == [("-", 11)]
+        assert Diff.diff(
+            ["one", "two", "three", "hmm", "six"],
+            ["one", "two", "three", "four", "five", "six"],
+            engine="rolling"
+        ) == [("=", 11), ("-", 3), ("+", ["four", "five"]), ("=", 3)]
+
+        # Moved block: matched by the window hash, not by the common head or tail
+        old = ["line %s\n" % i for i in range(20)]
+        new = old[10:15] + ["new\n"] + old[:10] + old[15:19]
+        actions = Diff.diff(old, new, engine="rolling")
+        assert actions[0:2] == [("-", Diff.sumLen(old[:10])), ("=", Diff.sumLen(old[10:15]))]
+        assert Diff.patch(io.BytesIO("".join(old).encode()), [
+            (action, [line.encode() for line in param] if action == "+" else param) for action, param in actions
+        ]).getvalue() == "".join(new).encode()
+
+    def testPatchRollingFuzz(self):
+        import random
+        rand = random.Random(1234)
+        for _ in range(200):
+            old = [b"%d\n" % rand.randint(0, 20) for _ in range(rand.randint(0, 100))]
+            new = old[:]
+            for _ in range(rand.randint(0, 5)):
+                pos = rand.randint(0, len(new))
+                if rand.choice([True, False]):
+                    new[pos:pos] = [b"%d\n" % rand.randint(0, 30) for _ in range(rand.randint(1, 5))]
+                else:
+                    del new[pos:pos + rand.randint(1, 5)]
+            actions = Diff.diff(old, new, engine="rolling")
+            assert Diff.patch(io.BytesIO(b"".join(old)), actions).getvalue() == b"".join(new)
+
+    def testDiffRollingBig(self):
+        old = [b'  {"id": %d, "title": "Post title %d", "body": "Post body"},\n' % (i, i) for i in range(100000)]
+        new = old[:]
+        new[500] = b'  {"id": 500, "title": "Modified", "body": "Post body"},\n'
+        new.insert(50000, b'  {"id": -1, "title": "Inserted", "body": "Post body"},\n')
+        del new[90000:90010]
+
+        actions = Diff.diff(old, new, limit=1024)
+        assert actions
+        assert sum(len(param) for action, param in actions if action == "+") == 2
+        assert Diff.patch(io.BytesIO(b"".join(old)), actions).getvalue() == b"".join(new)
@@ -0,0 +1,28 @@
+from util.Histogram import Histogram
+
+
+class TestHistogram:
+    def testBuckets(self):
+        histogram = Histogram()
+        for value_us in [0, 1, 15, 16, 17, 31, 32, 33, 1000, 123456, 10 ** 9]:
+            bucket = histogram.getBucket(value_us)
+            assert histogram.getBucketValue(bucket) <= value_us < histogram.getBucketValue(bucket + 1)
+            assert value_us - histogram.getBucketValue(bucket) <= value_us / 16
+
+    def testPercentile(self):
+        histogram = Histogram()
+        assert histogram.percentile(99) == 0.0
+
+        for i in range(1, 1001):
+            histogram.record(i / 1000.0)  # 1ms - 1s
+
+        assert histogram.num == 1000
+        assert abs(histogram.getAvg() - 0.5005) < 0.0001
+        assert histogram.max == 1.0
+        assert 0.5 <= histogram.percentile(50) <= 0.5 * 1.07
+        assert 0.99 <= histogram.percentile(99) <= 1.0
+        assert histogram.percentile(100) == 1.0
+
+        stats = histogram.getStats()
+        assert stats["num"] == 1000
+        assert stats["p90"] >= 0.9
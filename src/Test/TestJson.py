@@ -0,0 +1,109 @@
+import json
+import random
+
+import pytest
+
+from util import Json
+from . import Spy
+
+
+def randomString(rand):
+    chars = [
+        "a", "Z", "0", " ", '"', "\\", "/", "\n", "\t", "\x00", "\x1f", "\x7f",
+        "é", "ő", "€", "字", " ", "﻿", "\U0001f600", "\ud800"
+    ]
+    return "".join(rand.choice(chars) for _ in range(rand.randint(0, 10)))
+
+
+def randomFloat(rand):
+    return rand.choice([
+        0.0, -0.0, 0.1, 1.5, 1e16, 1e-7, 123456789.123456, 1.7976931348623157e+308, 5e-324,
+        float("inf"), float("-inf"), rand.uniform(-1e6, 1e6), rand.random() * 10 ** rand.randint(-20, 20)
+    ])
+
+
+def randomValue(rand, depth=0):
+    kind = rand.randint(0, 8 if depth < 4 else 5)
+    if kind == 0:
+        return None
+    elif kind == 1:
+        return rand.choice([True, False])
+    elif kind == 2:
+        return rand.choice([
+            0, -1, 2 ** 31, -2 ** 63, -2 ** 63 - 1, 2 ** 64 - 1, 2 ** 64, -2 ** 64, -10 ** 18, -10 ** 19, 10 ** 30,
+            rand.randint(-10 ** 6, 10 ** 6), rand.randint(-2 ** 65, 2 ** 65)
+        ])
+    elif kind == 3:
+        return randomFloat(rand)
+    elif kind in (4, 5):
+        return randomString(rand)
+    elif kind in (6, 7):
+        return {randomString(rand): randomValue(rand, depth + 1) for _ in range(rand.randint(0, 5))}
+    else:
+        return [randomValue(rand, depth + 1) for _ in range(rand.randint(0, 5))]
+
+
+@pytest.fixture(params=list(Json.loaders.keys()))
+def json_lib(request):
+    lib_before = Json.lib_json
+    Json.setLib(request.param)
+    yield request.param
+    Json.setLib(lib_before)
+
+
+class TestJson:
+    def testDumpsCanonicalFuzz(self):
+        rand = random.Random(1234)
+        for _ in range(2000):
+            data = randomValue(rand)
+            assert Json.dumpsCanonical(data) == json.dumps(data, sort_keys=True)
+
+    def testDumpsCanonicalContent(self, site):
+        for inner_path in ["content.json", "data/users/content.json", "data/test_include/content.json"]:
+            content = site.storage.loadJson(inner_path)
+            assert Json.dumpsCanonical(content) == json.dumps(content, sort_keys=True)
+
+    def testLoadsFuzz(self, json_lib):
+        rand = random.Random(5678)
+        for _ in range(2000):
+            data_json = json.dumps(randomValue(rand), sort_keys=rand.choice([True, False]), indent=rand.choice([None, 1]))
+            # Compare the re-serialized form as NaN != NaN
+            assert json.dumps(Json.loads(data_json)) == json.dumps(json.loads(data_json))
+            assert json.dumps(Json.loads(data_json.encode("utf8"))) == json.dumps(json.loads(data_json.encode("utf8")))
+
+            data_json = json.dumps(randomValue(rand), ensure_ascii=False)  # Raw unicode characters
+            assert json.dumps(Json.loads(data_json)) == json.dumps(json.loads(data_json))
+
+    def testLoadsSpecial(self, json_lib):
+        assert json.dumps(Json.loads('[NaN, Infinity, -Infinity]')) == '[NaN, Infinity, -Infinity]'
+        assert Json.loads('{"a": 1, "a": 2}') == {"a": 2}
+        assert Json.loads("[%s]" % 10 ** 30) == [10 ** 30]
+        assert Json.loads("[-9223372036854775809]") == [-9223372036854775809]
+        assert Json.loads(b"[-18446744073709551616]") == [-2 ** 64]
+        assert Json.loads("[1e400]") == [float("inf")]
+        assert Json.loads('"\\ud800"') == "\ud800"
+        assert Json.loads(b'\xef\xbb\xbf{"a": 1}') == {"a": 1}
+
+        for invalid in ['{"a": 1', "", "[1,]", b"\xff"]:
+            with pytest.raises(ValueError):
+                Json.loads(invalid)
+
+    @pytest.mark.skipif(not Json.orjson, reason="orjson not installed")
+    def testLoadsOrjsonFallback(self):
+        lib_before = Json.lib_json
+        Json.setLib("orjson")
+        try:
+            # Digit runs in the hashes are not numbers
+            data_json = json.dumps({"files": {"data/%s.json" % i: {"sha512": "%064d" % i, "size": 10 ** 18} for i in range(100)}})
+            with Spy.Spy(json, "loads") as calls:
+                assert Json.loads(data_json) == json.loads(data_json)
+                assert Json.loads(data_json.encode("utf8")) == json.loads(data_json)
+            assert len(calls) == 2  # Only the compared stdlib calls
+
+            # Long numbers are left to the stdlib
+            for data_json in ["%s" % 10 ** 20, "[1, %s]" % 10 ** 20, '{"a":\n -%s}' % 10 ** 19]:
+                with Spy.Spy(json, "loads") as calls:
+                    assert Json.loads(data_json) == json.loads(data_json)
+                assert len(calls) == 2
+        finally:
+            Json.setLib(lib_before)
@@ -1,11 +1,14 @@
+import array
 import time
 import io
 
 import pytest
+import mock
 
 from File import FileServer
 from File import FileRequest
 from Crypt import CryptHash
+from Site import SiteManager
 from . import Spy
 
 
@@ -75,6 +78,65 @@ class TestPeer:
         assert site.content_manager.hashfield.removeHash(new_hash)
         assert site.content_manager.hashfield.getHashId(new_hash) not in site.content_manager.hashfield
 
+    def testHashfieldPeerNumbers(self, site):
+        peer1 = site.addPeer("1.2.3.4", 15441)
+        peer2 = site.addPeer("1.2.3.5", 15441)
+        site.hash_id_peer_nums_changed = set()
+
+        peer1.hashfield.appendHashId(1)
+        peer1.hashfield.appendHashId(2)
+        peer2.hashfield.appendHashId(2)
+        assert site.hash_id_peer_nums[1] == 1
+        assert site.hash_id_peer_nums[2] == 2
+        assert site.hash_id_peer_nums_changed == {1, 2}
+
+        peer2.hashfield.replaceFromBytes(array.array("H", [3, 3]).tobytes())
+        assert site.hash_id_peer_nums[2] == 1
+        assert site.hash_id_peer_nums[3] == 1
+        peer2.hashfield.removeHashId(3)
+        assert site.hash_id_peer_nums[3] == 1  # Duplicate still in the hashfield
+
+        assert list(site.hash_id_peers[1]) == [peer1]
+        assert list(site.hash_id_peers[3]) == [peer2]
+        assert site.worker_manager.findOptionalHashIds([1, 2, 3, 4]) == {1: [peer1], 2: [peer1], 3: [peer2]}
+        tasks = [{"optional_hash_id": hash_id, "peers": None, "failed": []} for hash_id in [2, 3, 4]]
+        tasks[1]["failed"] = [peer2]
+        assert site.worker_manager.findOptionalTasks(tasks) == {2: [peer1]}
+        assert site.worker_manager.findOptionalTasks(tasks, reset_task=True) == {2: [peer1], 3: [peer2]}
+        assert tasks[1]["peers"] == [peer2] and tasks[2]["peers"] is None
+
+        peer1.remove()
+        assert 1 not in site.hash_id_peer_nums
+        assert site.hash_id_peer_nums[2] == 0
+        assert site.hash_id_peer_nums_changed == {1, 2, 3}
+        assert 1 not in site.hash_id_peers and 2 not in site.hash_id_peers
+        peer1.remove()  # Removing again does not change the numbers
+        assert site.hash_id_peer_nums[3] == 1
+
+    def testPeerCounters(self, site):
+        site_manager = SiteManager.site_manager
+        peers_onion_before = site.peers_onion
+        peers_connected_before = site.peers_connected
+        unique_onion_before = site_manager.num_peers_onion
+
+        peer1 = site.addPeer("1.2.3.4", 15441)
+        peer2 = site.addPeer("abcdefghijklmnop.onion", 15441)
+        assert site.peers_onion == peers_onion_before + 1
+        assert site_manager.peer_keys[peer2.key] == 1
+        assert site_manager.num_peers_onion == unique_onion_before + 1
+
+        peer1.connection = mock.MagicMock()
+        peer1.connection = mock.MagicMock()  # Connection change counted once
+        assert site.peers_connected == peers_connected_before + 1
+
+        peer1.remove()
+        peer2.remove()
+        peer2.remove()  # Removing again does not change the numbers
+        assert site.peers_onion == peers_onion_before
+        assert site.peers_connected == peers_connected_before
+        assert peer1.key not in site_manager.peer_keys
+        assert site_manager.num_peers_onion == unique_onion_before
+
     def testHashfieldExchange(self, file_server, site, site_temp):
         server1 = file_server
         server1.sites[site.address] = site
@@ -139,13 +201,13 @@ class TestPeer:
 
         # Add fake peer with requred hash
         fake_peer_1 = site.addPeer(file_server.ip_external, 1544)
-        fake_peer_1.hashfield.append(1234)
+        fake_peer_1.hashfield.appendHashId(1234)
         fake_peer_2 = site.addPeer("1.2.3.5", 1545)
-        fake_peer_2.hashfield.append(1234)
-        fake_peer_2.hashfield.append(1235)
+        fake_peer_2.hashfield.appendHashId(1234)
+        fake_peer_2.hashfield.appendHashId(1235)
         fake_peer_3 = site.addPeer("1.2.3.6", 1546)
-        fake_peer_3.hashfield.append(1235)
-        fake_peer_3.hashfield.append(1236)
+        fake_peer_3.hashfield.appendHashId(1235)
+        fake_peer_3.hashfield.appendHashId(1236)
 
         res = peer_file_server.findHashIds([1234, 1235])
         assert sorted(res[1234]) == sorted([(file_server.ip_external, 1544), ("1.2.3.5", 1545)])
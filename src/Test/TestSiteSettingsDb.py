@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+from Config import config
+from Site.SiteSettingsDb import SiteSettingsDb
+
+
+@pytest.fixture()
+def settings_db(request):
+    db_path = "%s/sites-test.db" % config.data_dir
+    json_path = "%s/sites-test.json" % config.data_dir
+    db = SiteSettingsDb(db_path)
+
+    def cleanup():
+        db.close("Test cleanup")
+        for path in [db_path, json_path, json_path + ".bak"]:
+            if os.path.isfile(path):
+                os.unlink(path)
+    request.addfinalizer(cleanup)
+    return db
+
+
+class TestSiteSettingsDb:
+    def testImportJson(self, settings_db):
+        json_path = "%s/sites-test.json" % config.data_dir
+        with open(json_path, "w") as f:
+            json.dump({
+                "1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT": {"own": True, "cache": {"bad_files": {"index.html": 1}}},
+                "1EU1tbG9oC1A8jz2ouVwGZyQ5asrNsE4Vr": {"own": False}
+            }, f)
+
+        assert settings_db.importJson(json_path) == 2
+        assert not os.path.isfile(json_path)  # Moved to .bak
+        assert os.path.isfile(json_path + ".bak")
+
+        assert sorted(settings_db.getAddresses()) == ["1EU1tbG9oC1A8jz2ouVwGZyQ5asrNsE4Vr", "1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT"]
+        assert settings_db.getSettings("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT") == {"own": True}
+        assert settings_db.getCache("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT") == {"bad_files": {"index.html": 1}}
+        assert settings_db.getCache("1EU1tbG9oC1A8jz2ouVwGZyQ5asrNsE4Vr") == {}
+
+        # Already stored sites are not overwritten by the legacy file
+        with open(json_path, "w") as f:
+            json.dump({"1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT": {"own": False}}, f)
+        settings_db.importJson(json_path)
+        assert settings_db.getSettings("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT") == {"own": True}
+
+    def testSaveDelete(self, settings_db):
+        assert settings_db.getSettings("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT") is None
+
+        settings_db.saveSites([("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT", json.dumps({"serving": True}), json.dumps({}))])
+        assert settings_db.getSettings("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT") == {"serving": True}
+
+        settings_db.saveSites([("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT", json.dumps({"serving": False}), json.dumps({}))])
+        assert settings_db.getSettings("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT") == {"serving": False}
+        assert len(settings_db.getAddresses()) == 1
+
+        settings_db.deleteSite("1TeSTvb4w2PWE81S2rEELgmX2GCCExQGT")
+        assert settings_db.getAddresses() == []
@@ -1,5 +1,9 @@
+import os
+
 import pytest
 
+from Crypt import CryptHash
+
 
 @pytest.mark.usefixtures("resetSettings")
 class TestSiteStorage:
@@ -23,3 +27,52 @@ class TestSiteStorage:
 
     def testDbRebuild(self, site):
         assert site.storage.rebuildDb()
+
+    def testOpenDownload(self, site):
+        data = b"Hello download " * 1024
+        inner_path = "data/download-test.txt"
+        file_path = site.storage.getPath(inner_path)
+
+        download_file = site.storage.openDownload(inner_path)
+        download_file.write(data[:100])
+        download_file.write(data[100:])
+        assert download_file.getSha512() == CryptHash.sha512t(data).hexdigest()
+        assert not site.storage.isFile(inner_path)  # Not moved to its place yet
+
+        site.storage.write(inner_path, download_file)
+        download_file.close()
+        assert site.storage.read(inner_path) == data
+        assert not os.path.isfile(download_file.temp_path)
+        site.storage.delete(inner_path)
+
+        # Not committed download removed on close
+        download_file = site.storage.openDownload(inner_path)
+        download_file.write(data)
+        download_file.close()
+        assert not os.path.isfile(download_file.temp_path)
+        assert not site.storage.isFile(inner_path)
+
+    def testRemoveStaleDownloads(self, site):
+        dir_path = site.storage.getPath("data")
+        stale_file = site.storage.openDownload("data/stale-test.txt")
+        stale_file.file.close()  # Interrupted download: not closed by the worker
+        os.utime(stale_file.temp_path, (0, 0))
+        running_file = site.storage.openDownload("data/running-test.txt")
+        assert dir_path in site.storage.download_dirs_checked  # Cleaned on the first download to the directory
+
+        site.storage.removeStaleDownloads(dir_path, modified_before=1000)
+        assert not os.path.isfile(stale_file.temp_path)
+        assert os.path.isfile(running_file.temp_path)
+        running_file.close()
+
+    def testDownloadFileMode(self, site):
+        inner_path = "data/download-mode-test.txt"
+        download_file = site.storage.openDownload(inner_path)
+        download_file.write(b"Hello")
+        site.storage.write(inner_path, download_file)
+        download_file.close()
+
+        umask = os.umask(0)
+        os.umask(umask)
+        assert os.stat(site.storage.getPath(inner_path)).st_mode & 0o777 == 0o666 & ~umask
+        site.storage.delete(inner_path)
@@ -127,13 +127,13 @@ class TestTor:
 
         # Add fake peer with requred hash
         fake_peer_1 = site.addPeer("bka4ht2bzxchy44r.onion", 1544)
-        fake_peer_1.hashfield.append(1234)
+        fake_peer_1.hashfield.appendHashId(1234)
         fake_peer_2 = site.addPeer("1.2.3.5", 1545)
-        fake_peer_2.hashfield.append(1234)
-        fake_peer_2.hashfield.append(1235)
+        fake_peer_2.hashfield.appendHashId(1234)
+        fake_peer_2.hashfield.appendHashId(1235)
         fake_peer_3 = site.addPeer("1.2.3.6", 1546)
-        fake_peer_3.hashfield.append(1235)
-        fake_peer_3.hashfield.append(1236)
+        fake_peer_3.hashfield.appendHashId(1235)
+        fake_peer_3.hashfield.appendHashId(1236)
 
         res = peer_file_server.findHashIds([1234, 1235])
 
@@ -1,6 +1,13 @@
 import sys
+import json
+import time
+
 import pytest
 
+from Config import config
+from Ui.UiWebsocket import UiWebsocket
+from . import Spy
+
 @pytest.mark.usefixtures("resetSettings")
 class TestUiWebsocket:
     def testPermission(self, ui_websocket):
@@ -9,3 +16,39 @@ class TestUiWebsocket:
 
         res = ui_websocket.testAction("certList")
         assert "You don't have permission" in res["error"]
+
+    def testBroadcastSiteInfo(self, ui_websocket):
+        site = ui_websocket.site
+        sent = []
+        ui_websocket.ws.send = lambda data: sent.append(json.loads(data))
+        ui_websocket.channels.append("siteChanged")
+        site.websockets = [ui_websocket, ui_websocket]
+
+        # Site info formatted once for websockets with same permissions
+        with Spy.Spy(UiWebsocket, "formatSiteInfo") as calls:
+            site.updateWebsocket(file_done="index.html")
+        assert len(calls) == 1
+        assert len(sent) == 2
+        assert sent[0]["cmd"] == "setSiteInfo"
+        assert sent[0]["params"]["event"] == ["file_done", "index.html"]
+        assert sent[0]["id"] != sent[1]["id"]
+
+        # Frequent state-only updates are coalesced
+        sent.clear()
+        for i in range(10):
+            site.updateWebsocket(peers_added=i)
+        assert len(sent) == 0
+        time.sleep(1.0 / config.ui_update_rate + 0.1)
+        assert len(sent) == 2
+        assert sent[0]["params"]["event"] == ["peers_added", 9]
+
+        # Pending events are not replaced by other events or updates without event
+        sent.clear()
+        site.updateWebsocket(file_started=True)
+        site.updateWebsocket(peernumber_updated=True)
+        site.updateWebsocket()
+        assert len(sent) == 0
+        time.sleep(1.0 / config.ui_update_rate + 0.1)
+        assert [message["params"]["event"] for message in sent] == [["file_started", True]] * 2 + [["peernumber_updated", True]] * 2
+
+        site.websockets = []
@@ -0,0 +1,45 @@
+import json
+import os
+
+import pytest
+
+from Config import config
+from User.UserDb import UserDb
+
+
+@pytest.fixture()
+def user_db(request):
+    db_path = "%s/users-test.db" % config.data_dir
+    json_path = "%s/users-test.json" % config.data_dir
+    db = UserDb(db_path)
+
+    def cleanup():
+        db.close("Test cleanup")
+        for path in [db_path, json_path, json_path + ".bak"]:
+            if os.path.isfile(path):
+                os.unlink(path)
+    request.addfinalizer(cleanup)
+    return db
+
+
+class TestUserDb:
+    def testImportJson(self, user_db):
+        json_path = "%s/users-test.json" % config.data_dir
+        with open(json_path, "w") as f:
+            json.dump({"15E5rhcAUD69WbiYsYARh4YHJ4sLm2JEyc": {"certs": {}, "master_seed": "024bce", "sites": {}}}, f)
+
+        assert user_db.importJson(json_path) == 1
+        assert not os.path.isfile(json_path)
+        assert user_db.getUsers() == {"15E5rhcAUD69WbiYsYARh4YHJ4sLm2JEyc": {"certs": {}, "master_seed": "024bce", "sites": {}}}
+
+    def testSaveUser(self, user_db):
+        user_db.saveUser("15E5rhcAUD69WbiYsYARh4YHJ4sLm2JEyc", json.dumps({"sites": {}}))
+        user_db.saveUser("1MyJgYQjeEkR9QD66nkfJc9zqi9uUy5Lr2", json.dumps({"sites": {}}))
+        user_db.saveUser("15E5rhcAUD69WbiYsYARh4YHJ4sLm2JEyc", json.dumps({"sites": {"1Site": {}}}))
+
+        users = user_db.getUsers()
+        assert len(users) == 2
+        assert users["15E5rhcAUD69WbiYsYARh4YHJ4sLm2JEyc"] == {"sites": {"1Site": {}}}
+
+        user_db.deleteUser("1MyJgYQjeEkR9QD66nkfJc9zqi9uUy5Lr2")
+        assert user_db.getAddresses() == ["15E5rhcAUD69WbiYsYARh4YHJ4sLm2JEyc"]
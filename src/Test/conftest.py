@@ -136,7 +136,7 @@ def cleanup():
         if os.path.isdir(dir_path):
             for file_name in os.listdir(dir_path):
                 ext = file_name.rsplit(".", 1)[-1]
-                if ext not in ["csr", "pem", "srl", "db", "json", "tmp"]:
+                if ext not in ["csr", "pem", "srl", "db", "json", "tmp", "bak"]:
                     continue
                 file_path = dir_path + "/" + file_name
                 if os.path.isfile(file_path):
@@ -448,6 +448,7 @@ def db(request):
 def crypt_bitcoin_lib(request, monkeypatch):
     monkeypatch.setattr(CryptBitcoin, "lib_verify_best", request.param)
     CryptBitcoin.loadLib(request.param)
+    CryptBitcoin.clear_sign_address_cache()  # Don't use signer addresses recovered by the other library
     return CryptBitcoin
 
 @pytest.fixture(scope='function', autouse=True)
@@ -160,6 +160,13 @@ class UiWebsocket(object):
     def cmd(self, cmd, params={}, cb=None):
         self.send({"cmd": cmd, "params": params}, cb)
 
+    # Send a command with already json encoded params
+    def cmdEncoded(self, cmd, params_json):
+        message_id = self.next_message_id
+        self.next_message_id += 1
+        self.send_queue.append('{"cmd": %s, "params": %s, "id": %s}' % (json.dumps(cmd), params_json, message_id))
+        self.sendQueue()
+
     # Encode to json and send message
     def send(self, message, cb=None):
         message["id"] = self.next_message_id  # Add message id to allow response
@@ -167,13 +174,19 @@ class UiWebsocket(object):
         if cb:  # Callback after client responded
             self.waiting_cb[message["id"]] = cb
         self.send_queue.append(message)
+        self.sendQueue()
+
+    def sendQueue(self):
         if self.state["sending"]:
             return  # Already sending
         try:
             while self.send_queue:
                 self.state["sending"] = True
                 message = self.send_queue.pop(0)
-                self.ws.send(json.dumps(message))
+                if type(message) is str:  # Already encoded
+                    self.ws.send(message)
+                else:
+                    self.ws.send(json.dumps(message))
                 self.state["sending"] = False
         except Exception as err:
             self.log.debug("Websocket send error: %s" % Debug.formatException(err))
@@ -246,6 +259,10 @@ class UiWebsocket(object):
         if result is not None:
             self.response(req["id"], result)
 
+    # Websockets with the same key get the same formatSiteInfo result
+    def getSiteInfoKey(self):
+        return ("ADMIN" in self.site.settings["permissions"], self.user)
+
     # Format site info
     def formatSiteInfo(self, site, create_user=True):
         content = site.content_manager.contents.get("content.json", {})
@@ -652,9 +669,9 @@ class UiWebsocket(object):
         self.response(to, "ok")
 
         # Send sitechanged to other local users
-        for ws in self.site.websockets:
-            if ws != self:
-                ws.event("siteChanged", self.site, {"event": ["file_done", inner_path]})
+        self.site.broadcastWebsocket(
+            {"event": ["file_done", inner_path]}, websockets=[ws for ws in self.site.websockets if ws != self]
+        )
 
     def actionFileDelete(self, to, inner_path):
         if not self.hasFilePermission(inner_path):
@@ -684,9 +701,9 @@ class UiWebsocket(object):
         self.response(to, "ok")
 
         # Send sitechanged to other local users
-        for ws in self.site.websockets:
-            if ws != self:
-                ws.event("siteChanged", self.site, {"event": ["file_deleted", inner_path]})
+        self.site.broadcastWebsocket(
+            {"event": ["file_deleted", inner_path]}, websockets=[ws for ws in self.site.websockets if ws != self]
+        )
 
     # Find data in json files
     def actionFileQuery(self, to, dir_inner_path, query=None):
@@ -1225,7 +1242,7 @@ class UiWebsocket(object):
             import main
             main.update_after_shutdown = True
             main.restart_after_shutdown = True
-            SiteManager.site_manager.save()
+            SiteManager.site_manager.save(recalculate_size=True)  # Save all sites before the restart
             main.file_server.stop()
             main.ui_server.stop()
 
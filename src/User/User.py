@@ -11,6 +11,7 @@ from Plugin import PluginManager
 from Config import config
 from util import helper
 from Debug import Debug
+from .UserDb import getUserDb
 
 
 @PluginManager.acceptPlugins
@@ -29,25 +30,25 @@ class User(object):
         self.certs = data.get("certs", {})
         self.settings = data.get("settings", {})
         self.delayed_save_thread = None
+        self.saved_data_json = None
 
         self.log = logging.getLogger("User:%s" % self.master_address)
 
-    # Save to data/users.json
+    # Save to private/users.db
     @util.Noparallel(queue=True, ignore_class=True)
     def save(self):
-        users_json = config.private_dir / 'users.json'
         s = time.time()
-        users = json.load(open(users_json))
-        if self.master_address not in users:
-            users[self.master_address] = {}  # Create if not exist
-        user_data = users[self.master_address]
+        user_data = {}
         if self.master_seed:
             user_data["master_seed"] = self.master_seed
         user_data["sites"] = self.sites
         user_data["certs"] = self.certs
         user_data["settings"] = self.settings
-        helper.atomicWrite(users_json, helper.jsonDumps(users).encode("utf8"))
-        self.log.debug("Saved in %.3fs" % (time.time() - s))
+        data_json = json.dumps(user_data, sort_keys=True)
+        if data_json != self.saved_data_json:  # Only write if changed since last save
+            getUserDb().saveUser(self.master_address, data_json)
+            self.saved_data_json = data_json
+            self.log.debug("Saved in %.3fs" % (time.time() - s))
         self.delayed_save_thread = None
 
     def saveDelayed(self):
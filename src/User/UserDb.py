@@ -0,0 +1,84 @@
+import os
+import json
+import time
+
+from Db.Db import Db
+from Config import config
+from Debug import Debug
+
+
+class UserDb(Db):
+    """Per-user storage of users.json data
+
+    Saving a user only replaces its own row, other users are not read or written.
+    """
+
+    def __init__(self, path):
+        Db.__init__(self, self.getSchema(), path)
+        self.checkTables()
+
+    def getSchema(self):
+        schema = {}
+        schema["db_name"] = "User"
+        schema["tables"] = {}
+        schema["tables"]["user"] = {
+            "cols": [
+                ["master_address", "TEXT PRIMARY KEY NOT NULL"],
+                ["data", "TEXT"],
+                ["modified", "INTEGER"]
+            ],
+            "schema_changed": 1
+        }
+        return schema
+
+    # Import legacy users.json, the file renamed to users.json.bak after import
+    # Return: Number of imported users
+    def importJson(self, json_path):
+        if not os.path.isfile(json_path):
+            return 0
+        s = time.time()
+        try:
+            with open(json_path) as f:
+                data = json.load(f)
+        except Exception as err:
+            self.log.error("Unable to import %s: %s" % (json_path, Debug.formatException(err)))
+            return 0
+
+        rows = [(master_address, json.dumps(user_data), int(time.time())) for master_address, user_data in data.items()]
+        # Users already in the db are newer than the ones in the legacy file
+        self.getCursor().executemany(
+            "INSERT OR IGNORE INTO user (master_address, data, modified) VALUES (?, ?, ?)", rows
+        )
+        self.commit("Imported %s" % json_path)
+        os.replace(json_path, "%s.bak" % json_path)
+        self.log.info("Imported %s users from %s in %.3fs" % (len(rows), json_path, time.time() - s))
+        return len(rows)
+
+    def getAddresses(self):
+        return [row["master_address"] for row in self.execute("SELECT master_address FROM user")]
+
+    # Return: {master_address: user_data}
+    def getUsers(self):
+        return {row["master_address"]: json.loads(row["data"]) for row in self.execute("SELECT * FROM user")}
+
+    def saveUser(self, master_address, data_json):
+        self.execute(
+            "INSERT OR REPLACE INTO user (master_address, data, modified) VALUES (?, ?, ?)",
+            (master_address, data_json, int(time.time()))
+        )
+        self.commit("Saved user")
+
+    def deleteUser(self, master_address):
+        self.execute("DELETE FROM user WHERE ?", {"master_address": master_address})
+
+
+user_dbs = {}
+
+
+def getUserDb(path=None):
+    if not path:
+        path = config.private_dir / 'users.db'
+    if path not in user_dbs:
+        user_dbs[path] = UserDb(path)
+        user_dbs[path].importJson(os.path.join(os.path.dirname(path), "users.json"))
+    return user_dbs[path]
@@ -5,6 +5,7 @@ import time
 
 # ZeroNet Modules
 from .User import User
+from .UserDb import getUserDb
 from Plugin import PluginManager
 from Config import config
 
@@ -15,7 +16,7 @@ class UserManager(object):
         self.users = {}
         self.log = logging.getLogger("UserManager")
 
-    # Load all user from users.json
+    # Load all user from private/users.db
     def load(self):
         if not self.users:
             self.users = {}
@@ -25,10 +26,9 @@ class UserManager(object):
         s = time.time()
         # Load new users
         try:
-            json_path = config.private_dir / 'users.json'
-            data = json.load(open(json_path))
+            data = getUserDb().getUsers()
         except Exception as err:
-            raise Exception("Unable to load %s: %s" % (json_path, err))
+            raise Exception("Unable to load users: %s" % err)
 
         for master_address, data in list(data.items()):
             if master_address not in self.users:
@@ -24,6 +24,7 @@ class WorkerStop(Exception):
 
 
 class Worker(object):
+    download_to_file_min_size = 512 * 1024
 
     def __init__(self, manager, peer):
         self.manager = manager
@@ -94,12 +95,30 @@ class Worker(object):
             self.waitForTask(task, timeout)
         return task
 
+    # Larger files are hashed while received and downloaded directly to a temp file next to the final file
+    def openTaskDownload(self, task):
+        inner_path = task["inner_path"]
+        if not task["size"] or task["size"] < self.download_to_file_min_size:
+            return None
+        if "|" in inner_path or inner_path.endswith("content.json"):  # Bigfile pieces and content.json files are verified differently
+            return None
+        try:
+            return task["site"].storage.openDownload(inner_path)
+        except Exception as err:
+            self.manager.log.debug("%s: Unable to open download file for %s: %s" % (self.key, inner_path, err))
+            return None
+
     def downloadTask(self, task):
+        download_file = self.openTaskDownload(task)
+        buff = None
         try:
-            buff = self.peer.getFile(task["site"].address, task["inner_path"], task["size"])
+            buff = self.peer.getFile(task["site"].address, task["inner_path"], task["size"], buff=download_file)
         except Exception as err:
             self.manager.log.debug("%s: getFile error: %s" % (self.key, err))
             raise WorkerDownloadError(str(err))
+        finally:
+            if download_file and buff is not download_file:  # Not returned to the caller: remove the temp file
+                download_file.close()
 
         if not buff:
             raise WorkerDownloadError("No response")
@@ -147,54 +166,59 @@ class Worker(object):
         download_err = write_err = False
 
         write_lock = None
+        buff = None
         try:
-            buff = self.downloadTask(task)
-
-            if task["done"] is True:  # Task done, try to find new one
-                return None
-
-            if self.running is False:  # Worker no longer needed or got killed
-                self.manager.log.debug("%s: No longer needed, returning: %s" % (self.key, task["inner_path"]))
-                raise WorkerStop("Running got disabled")
-
-            write_lock = self.getTaskLock(task)
-            write_lock.acquire()
-            if task["site"].content_manager.verifyFile(task["inner_path"], buff) is None:
-                is_same = True
-            else:
-                is_same = False
-            is_valid = True
-        except (WorkerDownloadError, VerifyError) as err:
-            download_err = err
-            is_valid = False
-            is_same = False
-
-        if is_valid and not is_same:
-            if self.manager.started_task_num < 50 or task["priority"] > 10 or config.verbose:
-                self.manager.log.debug("%s: Verify correct: %s" % (self.key, task["inner_path"]))
             try:
-                self.writeTask(task, buff)
-            except WorkerIOError as err:
-                write_err = err
-
-        if not task["done"]:
-            if write_err:
-                self.manager.failTask(task, reason="Write error")
-                self.num_failed += 1
-                self.manager.log.error("%s: Error writing %s: %s" % (self.key, task["inner_path"], write_err))
-            elif is_valid:
-                self.manager.doneTask(task)
-                self.num_downloaded += 1
-
-        if write_lock is not None and write_lock.locked():
-            write_lock.release()
-
-        if not is_valid:
-            self.onTaskVerifyFail(task, download_err)
-            time.sleep(1)
-            return False
+                buff = self.downloadTask(task)
+
+                if task["done"] is True:  # Task done, try to find new one
+                    return None
+
+                if self.running is False:  # Worker no longer needed or got killed
+                    self.manager.log.debug("%s: No longer needed, returning: %s" % (self.key, task["inner_path"]))
+                    raise WorkerStop("Running got disabled")
+
+                write_lock = self.getTaskLock(task)
+                write_lock.acquire()
+                if task["site"].content_manager.verifyFile(task["inner_path"], buff) is None:
+                    is_same = True
+                else:
+                    is_same = False
+                is_valid = True
+            except (WorkerDownloadError, VerifyError) as err:
+                download_err = err
+                is_valid = False
+                is_same = False
 
-        return True
+            if is_valid and not is_same:
+                if self.manager.started_task_num < 50 or task["priority"] > 10 or config.verbose:
+                    self.manager.log.debug("%s: Verify correct: %s" % (self.key, task["inner_path"]))
+                try:
+                    self.writeTask(task, buff)
+                except WorkerIOError as err:
+                    write_err = err
+
+            if not task["done"]:
+                if write_err:
+                    self.manager.failTask(task, reason="Write error")
+                    self.num_failed += 1
+                    self.manager.log.error("%s: Error writing %s: %s" % (self.key, task["inner_path"], write_err))
+                elif is_valid:
+                    self.manager.doneTask(task)
+                    self.num_downloaded += 1
+
+            if write_lock is not None and write_lock.locked():
+                write_lock.release()
+
+            if not is_valid:
+                self.onTaskVerifyFail(task, download_err)
+                time.sleep(1)
+                return False
+
+            return True
+        finally:
+            if buff:
+                buff.close()  # Removes the temp file if it's not moved to its place
 
     def downloader(self):
         self.peer.hash_failed = 0  # Reset hash error counter
@@ -1,6 +1,7 @@
 import time
 import logging
 import collections
+import itertools
 
 import gevent
 
@@ -218,20 +219,16 @@ class WorkerManager(object):
     def findOptionalTasks(self, optional_tasks, reset_task=False):
         found = collections.defaultdict(list)  # { found_hash: [peer1, peer2...], ...}
 
-        for peer in list(self.site.peers.values()):
-            if not peer.has_hashfield:
-                continue
-
-            hashfield_set = set(peer.hashfield)  # Finding in set is much faster
-            for task in optional_tasks:
-                optional_hash_id = task["optional_hash_id"]
-                if optional_hash_id in hashfield_set:
-                    if reset_task and len(task["failed"]) > 0:
-                        task["failed"] = []
-                    if peer in task["failed"]:
-                        continue
-                    if self.taskAddPeer(task, peer):
-                        found[optional_hash_id].append(peer)
+        for task in optional_tasks:
+            optional_hash_id = task["optional_hash_id"]
+            peers = list(self.site.hash_id_peers.get(optional_hash_id, ()))
+            if peers and reset_task and len(task["failed"]) > 0:
+                task["failed"] = []
+            for peer in peers:
+                if peer in task["failed"]:
+                    continue
+                if self.taskAddPeer(task, peer):
+                    found[optional_hash_id].append(peer)
 
         return found
 
@@ -239,16 +236,14 @@ class WorkerManager(object):
     def findOptionalHashIds(self, optional_hash_ids, limit=0):
         found = collections.defaultdict(list)  # { found_hash_id: [peer1, peer2...], ...}
 
-        for peer in list(self.site.peers.values()):
-            if not peer.has_hashfield:
+        for optional_hash_id in optional_hash_ids:
+            peers = self.site.hash_id_peers.get(optional_hash_id)
+            if not peers:
                 continue
-
-            hashfield_set = set(peer.hashfield)  # Finding in set is much faster
-            for optional_hash_id in optional_hash_ids:
-                if optional_hash_id in hashfield_set:
-                    found[optional_hash_id].append(peer)
-                    if limit and len(found[optional_hash_id]) >= limit:
-                        optional_hash_ids.remove(optional_hash_id)
+            if limit:
+                found[optional_hash_id] = list(itertools.islice(peers, limit))
+            else:
+                found[optional_hash_id] = list(peers)
 
         return found
 
@@ -71,7 +71,7 @@ def init_dirs():
     private_dir = Path(config.private_dir)
     need_bootstrap = (config.bootstrap
                       and not config.offline
-                      and (not data_dir.is_dir() or not (private_dir / 'sites.json').is_file()))
+                      and (not data_dir.is_dir() or not ((private_dir / 'sites.json').is_file() or (private_dir / 'sites.db').is_file())))
 
     # old_users_json = data_dir / 'users.json'
     # if old_users_json.is_file():
@@ -98,15 +98,6 @@ def init_dirs():
             startupError(f"Cannot load boostrap bundle (response status: {response.status_code})")
         importBundle(BytesIO(response.content))
 
-    sites_json = private_dir / 'sites.json'
-    if not os.path.isfile(sites_json):
-        with open(sites_json, "w") as f:
-            f.write("{}")
-    users_json = private_dir / 'users.json'
-    if not os.path.isfile(users_json):
-        with open(users_json, "w") as f:
-            f.write("{}")
-
 def load_plugins():
     from Plugin import PluginManager
     PluginManager.plugin_manager.loadPlugins()
@@ -144,6 +135,9 @@ def init():
 
     load_plugins()
 
+    from util import Json
+    Json.loadConfigLib()
+
     # Log current config
     logging.debug("Config: %s" % config)
 
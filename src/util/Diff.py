@@ -1,4 +1,5 @@
 import io
+import bisect
 
 import difflib
 
@@ -7,7 +8,14 @@ def sumLen(lines):
     return sum(map(len, lines))
 
 
-def diff(old, new, limit=False):
+def diff(old, new, limit=False, engine="auto"):
+    if engine == "rolling" or (engine == "auto" and len(old) + len(new) > 1000):
+        return diffRolling(old, new, limit=limit)
+    else:
+        return diffSequence(old, new, limit=limit)
+
+
+def diffSequence(old, new, limit=False):
     matcher = difflib.SequenceMatcher(None, old, new)
     actions = []
     size = 0
@@ -30,6 +38,108 @@ def diff(old, new, limit=False):
     return actions
 
 
+# Return: Rolling hash of every block_lines long window of lines starting from line start to end
+def getWindowHashes(lines, start, end, block_lines, base=1000003, mod=2 ** 61 - 1):
+    hashes = []
+    if end - start < block_lines:
+        return hashes
+    line_hashes = [hash(line) % mod for line in lines[start:end]]
+    base_out = pow(base, block_lines - 1, mod)
+    window_hash = 0
+    for line_hash in line_hashes[:block_lines]:
+        window_hash = (window_hash * base + line_hash) % mod
+    hashes.append(window_hash)
+    for i in range(block_lines, len(line_hashes)):
+        window_hash = ((window_hash - line_hashes[i - block_lines] * base_out) * base + line_hashes[i]) % mod
+        hashes.append(window_hash)
+    return hashes
+
+
+def addAction(actions, action, param):
+    if action == "=" and actions and actions[-1][0] == "=":  # Merge with previous same block
+        actions[-1] = ("=", actions[-1][1] + param)
+    else:
+        actions.append((action, param))
+
+
+# Rsync-style diff: the old lines are indexed by the rolling hash of block_lines long windows,
+# then the new lines are scanned once and matching windows are extended as far as possible
+def diffRolling(old, new, limit=False, block_lines=4):
+    actions = []
+    size = 0
+
+    # Skip the common head and tail
+    old_end = len(old)
+    new_end = len(new)
+    head = 0
+    while head < old_end and head < new_end and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < old_end - head and tail < new_end - head and old[old_end - tail - 1] == new[new_end - tail - 1]:
+        tail += 1
+    old_end -= tail
+    new_end -= tail
+
+    if head:
+        addAction(actions, "=", sumLen(old[:head]))
+
+    old_positions = {}  # Window hash: [line positions in increasing order]
+    for pos, window_hash in enumerate(getWindowHashes(old, head, old_end, block_lines), head):
+        old_positions.setdefault(window_hash, []).append(pos)
+    new_hashes = getWindowHashes(new, head, new_end, block_lines)
+
+    old_pos = head
+    new_pos = head
+    added = []
+    while new_pos < new_end:
+        match_pos = None
+        if new_pos + block_lines <= new_end:
+            positions = old_positions.get(new_hashes[new_pos - head])
+            if positions:
+                for i in range(bisect.bisect_left(positions, old_pos), len(positions)):
+                    if old[positions[i]:positions[i] + block_lines] == new[new_pos:new_pos + block_lines]:
+                        match_pos = positions[i]
+                        break
+
+        if match_pos is None:
+            added.append(new[new_pos])
+            size += len(new[new_pos])
+            if limit and size > limit:
+                return False
+            new_pos += 1
+            continue
+
+        match_len = block_lines
+        while (
+            match_pos + match_len < old_end and new_pos + match_len < new_end and
+            old[match_pos + match_len] == new[new_pos + match_len]
+        ):
+            match_len += 1
+        # Take back the added lines that also precede the match in the old file
+        while added and match_pos > old_pos and old[match_pos - 1] == added[-1]:
+            size -= len(added.pop())
+            match_pos -= 1
+            new_pos -= 1
+            match_len += 1
+
+        if match_pos > old_pos:
+            addAction(actions, "-", sumLen(old[old_pos:match_pos]))
+        if added:
+            addAction(actions, "+", added)
+            added = []
+        addAction(actions, "=", sumLen(old[match_pos:match_pos + match_len]))
+        old_pos = match_pos + match_len
+        new_pos += match_len
+
+    if old_pos < old_end:
+        addAction(actions, "-", sumLen(old[old_pos:old_end]))
+    if added:
+        addAction(actions, "+", added)
+    if tail:
+        addAction(actions, "=", sumLen(old[old_end:]))
+    return actions
+
+
 def patch(old_f, actions):
     new_f = io.BytesIO()
     for action, param in actions:
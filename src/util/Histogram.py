@@ -0,0 +1,58 @@
+class Histogram(object):
+    """Log-linear latency histogram
+
+    Values are stored in microseconds in buckets of 16 linear steps per power of two,
+    so recording is a few integer operations and percentiles have max ~6% error.
+    """
+    sub_buckets = 16
+
+    def __init__(self):
+        self.buckets = {}
+        self.num = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def getBucket(self, value_us):
+        if value_us < self.sub_buckets:
+            return value_us
+        shift = value_us.bit_length() - 5
+        return (shift + 1) * self.sub_buckets + (value_us >> shift) - self.sub_buckets
+
+    # Return: Lowest microsecond value that falls in the bucket
+    def getBucketValue(self, bucket):
+        if bucket < self.sub_buckets:
+            return bucket
+        shift = bucket // self.sub_buckets - 1
+        return (self.sub_buckets + bucket % self.sub_buckets) << shift
+
+    # Record a value in seconds
+    def record(self, value):
+        bucket = self.getBucket(max(0, int(value * 1000000)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.num += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    # Return: Value in seconds below which the percent of the recorded values fall
+    def percentile(self, percent):
+        if not self.num:
+            return 0.0
+        limit = self.num * percent / 100.0
+        num = 0
+        for bucket in sorted(self.buckets):
+            num += self.buckets[bucket]
+            if num >= limit:
+                return min(self.getBucketValue(bucket + 1) / 1000000.0, self.max)
+        return self.max
+
+    def getAvg(self):
+        if not self.num:
+            return 0.0
+        return self.sum / self.num
+
+    def getStats(self, percents=(50, 90, 99)):
+        stats = {"num": self.num, "avg": self.getAvg(), "max": self.max}
+        for percent in percents:
+            stats["p%s" % percent] = self.percentile(percent)
+        return stats
@@ -0,0 +1,73 @@
+import json
+import logging
+import re
+
+from Config import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Same settings as json.dumps(data, sort_keys=True), but without creating a new encoder on every call
+canonical_encoder = json.JSONEncoder(sort_keys=True)
+
+lib_json = "json"
+
+
+def loadsStdlib(data):
+    return json.loads(data)
+
+
+# Orjson parses integers outside of the int64/uint64 range as float, so leave data with long numbers to the stdlib
+# (every positive integer below 20 digits fits uint64, negative ones from 19 digits can be below -2**63)
+# Only number tokens are matched: the digit runs of the hex hashes in strings follow a letter or quote
+long_number_re = re.compile(r"(?:^|[:\[,])\s*(?:-[0-9]{19}|[0-9]{20})")
+long_number_re_bytes = re.compile(rb"(?:^|[:\[,])\s*(?:-[0-9]{19}|[0-9]{20})")
+
+
+def loadsOrjson(data):
+    if (long_number_re_bytes if type(data) is bytes else long_number_re).search(data):
+        return json.loads(data)
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # NaN, Infinity, lone surrogates, BOM: let the stdlib decide to keep the same results and errors
+        return json.loads(data)
+
+
+loaders = {"json": loadsStdlib}
+if orjson:
+    loaders["orjson"] = loadsOrjson
+
+loads = loadsStdlib
+
+
+def setLib(lib_name):
+    global loads, lib_json
+    if lib_name not in loaders:
+        raise Exception("Json library not available: %s" % lib_name)
+    loads = loaders[lib_name]
+    lib_json = lib_name
+
+
+# Parse json from str or bytes
+def load(file):
+    return loads(file.read())
+
+
+# Return: Serialized data that is byte-identical to json.dumps(data, sort_keys=True), used for signing
+def dumpsCanonical(data):
+    return canonical_encoder.encode(data)
+
+
+# Set the library selected by --json_lib, called again on startup after the config is parsed
+def loadConfigLib():
+    try:
+        setLib(config.json_lib)
+    except Exception as err:
+        logging.warning("Json library load failed, using %s: %s" % (lib_json, err))
+
+
+if hasattr(config, "json_lib"):  # Config already parsed
+    loadConfigLib()